@@ -3,7 +3,8 @@ from django.urls import reverse
 from django.utils.html import format_html
 
 from .models import Club, Event, Member, EventParticipant, ClubFlagDefinition, ParticipantFlag, \
-    MatchSchedule, MatchScheduleDraft, MatchScore, Substitution, AuditLog
+    MatchSchedule, MatchScheduleDraft, MatchScore, Substitution, AuditLog, MemberMatchup, \
+    MatchSlot
 
 # ============================================================
 # Club
@@ -219,6 +220,24 @@ class MatchScoreAdmin(admin.ModelAdmin):
     readonly_fields = ("updated_at",)
 
 
+# ============================================================
+# MatchSlot（schedule_json の正規化コピー・参照専用）
+# ============================================================
+
+@admin.register(MatchSlot)
+class MatchSlotAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "match_schedule",
+        "round_no",
+        "court_no",
+        "team",
+        "slot_index",
+        "event_participant",
+    )
+    list_filter = ("match_schedule", "round_no")
+
+
 # ============================================================
 # Substitution
 # ============================================================
@@ -241,6 +260,27 @@ class SubstitutionAdmin(admin.ModelAdmin):
     readonly_fields = ("updated_at",)
 
 
+# ============================================================
+# MemberMatchup（集計インデックス・参照専用）
+# ============================================================
+
+@admin.register(MemberMatchup)
+class MemberMatchupAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "club",
+        "member",
+        "relation",
+        "other",
+        "matches",
+        "wins",
+        "losses",
+        "draws",
+    )
+    list_filter = ("club", "relation")
+    readonly_fields = ("updated_at",)
+
+
 # ============================================================
 # AuditLog（参照専用推奨）
 # ============================================================
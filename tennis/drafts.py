@@ -0,0 +1,159 @@
+# tennis/drafts.py
+import hashlib
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .models import MatchScheduleDraft, schedule_content_digest
+from .schedule_codec import decode_schedule, encode_schedule
+from .utils import schedule_fairness
+
+
+# ============================================================
+# 生成中の対戦表ドラフト（公開するまで DB に書かない）
+# - キー = (event, 幹事セッション, draft_id)。draft_id は画面に返す draft_generation
+# - 幹事セッションごとに直近 MAX_DRAFT_VARIANTS 案まで保持（見比べて選んだ案を公開できる）
+#   各案は公平さ指標（utils.schedule_fairness）と content_hash を持つ
+# - 公開時は画面が持つ draft_id のドラフトだけ採用（無い / 期限切れなら画面の JSON にフォールバック）
+#   公開したらそのセッションの案はすべて破棄
+# - バックエンドは settings.TENNIS_DRAFT_STORE_BACKEND で差し替え
+#     CacheDraftStore … 既定。Django のキャッシュ（TTL 付き）。ワーカー複数なら共有キャッシュ（REDIS_URL）に
+#                       （locmem はプロセス内のみ：再起動で消え、ワーカー間で見えない）
+#     DbDraftStore    … 明示指定したときだけ。MatchScheduleDraft（イベントにつき1つ・従来の動き：案は最新の1つだけ）
+# ============================================================
+
+MAX_DRAFT_VARIANTS = 5
+
+
+@dataclass(frozen=True)
+class ScheduleDraft:
+    draft_id: str
+    stored: object  # 保存形式（schedule_codec）
+    params: dict  # game_type / num_courts / num_rounds / participant_ids
+    content_hash: str
+    content_size: int
+    metrics: dict  # utils.schedule_fairness
+
+    @property
+    def schedule(self) -> list:
+        return decode_schedule(self.stored)
+
+
+def new_draft(schedule, params: dict) -> ScheduleDraft:
+    stored = encode_schedule(schedule)
+    content_hash, content_size = schedule_content_digest(stored)
+    return ScheduleDraft(
+        uuid.uuid4().hex, stored, params, content_hash, content_size, schedule_fairness(schedule),
+    )
+
+
+def draft_owner(request) -> str:
+    """
+    幹事セッションの識別子（セッション ID そのものはキャッシュキーに出さない）
+    """
+    session_key = request.session.session_key or ""
+    return hashlib.sha1(session_key.encode("utf-8")).hexdigest()[:16]
+
+
+class CacheDraftStore:
+    """
+    セッションごとに MAX_DRAFT_VARIANTS 個の枠（キャッシュキー）を順に使い回す
+    - 枠は連番カウンタの cache.incr（アトミック）で決める：同時に生成しても並び / 追い出しが壊れない
+      （読んで書き戻す index は持たない）
+    - 値に連番と draft_id を持つ。list は連番順、get は枠をまとめて引いて draft_id で探す
+    """
+
+    TTL = MatchScheduleDraft.TTL
+
+    def _slot_keys(self, event_id: int, owner: str) -> list:
+        return [f"tennis:draft:{int(event_id)}:{owner}:{i}" for i in range(MAX_DRAFT_VARIANTS)]
+
+    def _seq_key(self, event_id: int, owner: str) -> str:
+        return f"tennis:drafts:{int(event_id)}:{owner}:seq"
+
+    def _next_seq(self, event_id: int, owner: str, timeout: int) -> int:
+        key = self._seq_key(event_id, owner)
+        for _ in range(2):
+            cache.add(key, 0, timeout=timeout)
+            try:
+                seq = cache.incr(key)
+            except ValueError:  # add と incr の間に期限切れ
+                continue
+            cache.touch(key, timeout=timeout)
+            return seq
+        raise RuntimeError("draft sequence unavailable")
+
+    def _slots(self, event_id: int, owner: str) -> list:
+        hits = cache.get_many(self._slot_keys(event_id, owner))
+        return sorted(hits.values(), key=lambda v: v[0])
+
+    def put(self, event_id: int, owner: str, draft: ScheduleDraft) -> None:
+        timeout = int(self.TTL.total_seconds())
+        seq = self._next_seq(event_id, owner, timeout)
+        cache.set(
+            self._slot_keys(event_id, owner)[seq % MAX_DRAFT_VARIANTS],
+            (seq, draft.draft_id, draft.stored, draft.params, draft.content_hash, draft.content_size, draft.metrics),
+            timeout=timeout,
+        )
+
+    def get(self, event_id: int, owner: str, draft_id: str) -> ScheduleDraft | None:
+        if not draft_id:
+            return None
+        for _seq, i, *rest in self._slots(event_id, owner):
+            if i == draft_id:
+                return ScheduleDraft(i, *rest)
+        return None
+
+    def list(self, event_id: int, owner: str) -> list:
+        """
+        → [ScheduleDraft, ...]（古い順。期限切れの案は抜ける）
+        """
+        return [ScheduleDraft(i, *rest) for _seq, i, *rest in self._slots(event_id, owner)]
+
+    def discard(self, event_id: int, owner: str) -> None:
+        cache.delete_many(self._slot_keys(event_id, owner) + [self._seq_key(event_id, owner)])
+
+
+class DbDraftStore:
+    """
+    イベントにつき1行（新しい生成で上書き）。owner は見ない
+    """
+
+    def put(self, event_id: int, owner: str, draft: ScheduleDraft) -> None:
+        MatchScheduleDraft.objects.update_or_create(
+            event_id=event_id,
+            defaults={
+                "draft_json": draft.stored,
+                "params_json": draft.params,
+                "generation": draft.draft_id,
+            },
+        )
+
+    def _load(self, event_id: int, draft_id: str | None) -> ScheduleDraft | None:
+        row = MatchScheduleDraft.objects.filter(event_id=event_id).first()
+        if row is None or not row.draft_json or not row.is_usable(row.generation if draft_id is None else draft_id):
+            return None
+        params = row.params_json if isinstance(row.params_json, dict) else {}
+        return ScheduleDraft(
+            row.generation, row.draft_json, params, row.content_hash, row.content_size,
+            schedule_fairness(row.schedule),
+        )
+
+    def get(self, event_id: int, owner: str, draft_id: str) -> ScheduleDraft | None:
+        return self._load(event_id, draft_id or "")
+
+    def list(self, event_id: int, owner: str) -> list:
+        draft = self._load(event_id, None)
+        return [draft] if draft else []
+
+    def discard(self, event_id: int, owner: str) -> None:
+        MatchScheduleDraft.objects.filter(event_id=event_id).delete()
+
+
+@lru_cache(maxsize=1)
+def get_draft_store():
+    return import_string(settings.TENNIS_DRAFT_STORE_BACKEND)()
@@ -0,0 +1,57 @@
+# tennis/fragments.py
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from .models import MatchSchedule
+
+
+# ============================================================
+# 公開済み対戦表フラグメントのキャッシュ
+# - キー = (対戦表の内容 hash（保存済みの content_hash）, Event.score_version, 名前表 hash, admin/public)
+# - 書き込み側は「キーが変わる」ことで無効化される（明示的な delete は不要）
+#     スコア保存 / 代打 / 再公開 → bump_event_version(scores=True) / schedule_json 変化
+#     （代打は schedule_json を書き換えない。オーバーレイの変化は score_version で拾う）
+#     名前変更 / ゲスト追加     → 名前表 hash 変化
+# ============================================================
+
+SCHEDULE_BLOCK_TIMEOUT = 60 * 60 * 24
+
+
+def _digest(obj) -> str:
+    raw = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def name_map_digest(name_map: dict) -> str:
+    # int キー（ep_id）と互換の str キーが混在するので文字列化して並べる
+    return _digest(sorted((str(k), v) for k, v in name_map.items()))
+
+
+def schedule_block_key(ms: MatchSchedule, name_map: dict, variant: str) -> str:
+    """
+    ms.event は最新の Event を持たせておくこと（select_related / 読み直し）
+    """
+    return ":".join((
+        "tennis:schedule_block",
+        str(ms.event_id),
+        variant,
+        ms.content_hash,
+        str(ms.event.score_version),
+        name_map_digest(name_map),
+    ))
+
+
+def cached_schedule_block(ms: MatchSchedule, name_map: dict, variant: str, render) -> str:
+    """
+    render: キャッシュミス時だけ呼ばれる（スコア読み込み + テンプレート描画）
+    """
+    key = schedule_block_key(ms, name_map, variant)
+    html = cache.get(key)
+    if html is None:
+        html = str(render())
+        cache.set(key, html, SCHEDULE_BLOCK_TIMEOUT)
+    return mark_safe(html)
+
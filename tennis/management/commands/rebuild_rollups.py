@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tennis.models import Club
+from tennis.rollups import rebuild_club_attendance, rebuild_club_matchups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the maintained rollups from source rows: "
+        "head-to-head / partner index (MemberMatchup) and attendance per month (MemberAttendanceMonth)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--club-id", type=int, default=None)
+
+    def handle(self, *args, **options):
+        clubs = Club.objects.all().order_by("id")
+        if options["club_id"] is not None:
+            clubs = clubs.filter(id=options["club_id"])
+
+        for club in clubs:
+            with transaction.atomic():
+                n_matchups = rebuild_club_matchups(club)
+                n_attendance = rebuild_club_attendance(club)
+            self.stdout.write(self.style.SUCCESS(
+                f"club={club.id} matchups={n_matchups} attendance_months={n_attendance}"
+            ))
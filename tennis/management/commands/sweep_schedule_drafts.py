@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tennis.models import MatchScheduleDraft
+
+
+class Command(BaseCommand):
+    help = "Delete schedule drafts older than MatchScheduleDraft.TTL (run periodically, e.g. from cron)."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - MatchScheduleDraft.TTL
+        n, _ = MatchScheduleDraft.objects.filter(updated_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"deleted drafts: {n}"))
@@ -0,0 +1,513 @@
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.template import Context, Engine
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from tennis.drafts import get_draft_store, new_draft
+from tennis.fragments import cached_schedule_block
+from tennis.models import (
+    Club,
+    ClubFlagDefinition,
+    Event,
+    EventParticipant,
+    GameType,
+    MatchSchedule,
+    MatchScore,
+    Member,
+    ParticipantFlag,
+)
+from tennis.pubsub import InProcessBroker, event_channel
+from tennis.schedule_codec import decode_schedule, encode_schedule
+from tennis.slots import sync_match_slots
+from tennis.snapshot import build_name_map
+from tennis.substitutions import effective_schedule
+from tennis.utils import generate_doubles_schedule, generate_singles_schedule
+from tennis.views import _build_score_map, _merge_scores_into_schedule, _render_schedule_block
+
+# collectstatic 前でも描画できるよう manifest 無しの storage で測る（静的ファイル解決は対象外）
+PLAIN_STATIC = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+# render ベンチの比較用：view model 導入前のテンプレート（dict の対戦表 + ep_name_map|get_item で名前を引く）
+LEGACY_SCHEDULE_TEMPLATES = {
+    "block": """{% if schedule %}
+  <div class="tb-schedule">
+    {% for round in schedule %}
+      {% with r_no=round.round %}
+      <div class="tb-round">
+        <div class="tb-round-header">
+          <span class="tb-round-pill">ラウンド {{ r_no }}</span>
+        </div>
+        {% if round.matches %}
+          <div class="tb-round-body">
+            {% for m in round.matches %}
+              {% include "match" with c_no=forloop.counter %}
+            {% endfor %}
+          </div>
+        {% else %}
+          <p class="tb-no-match">人数不足のため、このラウンドは試合が組めません。</p>
+        {% endif %}
+        {% include "rests" %}
+      </div>
+      {% endwith %}
+    {% endfor %}
+  </div>
+{% endif %}""",
+    "match": """{% load tennis_extras %}
+<div class="tb-court-row" data-round-no="{{ r_no }}" data-court-no="{{ c_no }}">
+  <div class="tb-court-name">
+    {{ m.court|default:c_no }}コート
+  </div>
+  <div class="tb-match-flex">
+    <div class="tb-team">
+      {% for ep_id in m.team1 %}
+        <div class="tb-player-card js-sub-slot"
+            data-round-no="{{ r_no }}"
+            data-court-no="{{ c_no }}"
+            data-team="1"
+            data-slot-index="{{ forloop.counter0 }}"
+            data-ep-id="{{ ep_id }}">
+          {% with nm=ep_name_map|get_item:ep_id %}
+            {% if nm %}{{ nm }}{% else %}{{ ep_id }}{% endif %}
+          {% endwith %}
+        </div>
+      {% endfor %}
+    </div>
+    <div class="tb-score-area" data-revision="{{ m.revision|default:0 }}">
+      <span class="tb-score tb-score-left"
+            data-round-no="{{ r_no }}"
+            data-court-no="{{ c_no }}"
+            data-side="a">
+        {% if m.score1 is not None %}{{ m.score1 }}{% else %}-{% endif %}
+      </span>
+      <span class="tb-vs">vs</span>
+      <span class="tb-score tb-score-right"
+            data-round-no="{{ r_no }}"
+            data-court-no="{{ c_no }}"
+            data-side="b">
+        {% if m.score2 is not None %}{{ m.score2 }}{% else %}-{% endif %}
+      </span>
+    </div>
+    <div class="tb-team">
+      {% for ep_id in m.team2 %}
+        <div class="tb-player-card js-sub-slot"
+            data-round-no="{{ r_no }}"
+            data-court-no="{{ c_no }}"
+            data-team="2"
+            data-slot-index="{{ forloop.counter0 }}"
+            data-ep-id="{{ ep_id }}">
+          {% with nm=ep_name_map|get_item:ep_id %}
+            {% if nm %}{{ nm }}{% else %}{{ ep_id }}{% endif %}
+          {% endwith %}
+        </div>
+      {% endfor %}
+    </div>
+  </div>
+</div>""",
+    "rests": """{% load tennis_extras %}
+<div class="tb-rest-row" data-round-no="{{ r_no }}">
+  <span class="tb-rest-label">休憩：</span>
+  {% if round.rests %}
+    <span class="tb-rest-names">
+      {% for ep_id in round.rests %}
+        {% with nm=ep_name_map|get_item:ep_id %}
+          {% if nm %}{{ nm }}{% else %}{{ ep_id }}{% endif %}
+        {% endwith %}{% if not forloop.last %}, {% endif %}
+      {% endfor %}
+    </span>
+  {% else %}
+    <span class="tb-rest-names">なし（全員出場）</span>
+  {% endif %}
+</div>""",
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def build_fixture(participants: int, guests: int, rounds: int, courts: int, seed: int = 0):
+    """
+    ベンチ用の公開済みイベント（固定メンバー + ゲスト / フラグ2種 / スコア全入力）
+    """
+    rng = random.Random(seed)
+    club = Club.objects.create(name="bench")
+    flags = [
+        ClubFlagDefinition.objects.create(club=club, name="懇親会", display_order=1, input_mode="check"),
+        ClubFlagDefinition.objects.create(club=club, name="車", display_order=2, input_mode="digit"),
+    ]
+    members = [
+        Member.objects.create(club=club, display_name=f"メンバー{i:02d}", member_no=i + 1, is_fixed=i < participants)
+        for i in range(participants + guests)
+    ]
+    event = Event.objects.create(club=club, date="2026-10-01", title="練習")
+    eps = [
+        EventParticipant.objects.create(
+            event=event, member=m, display_name=m.display_name,
+            attendance="yes", participates_match=True, comment=rng.choice(["", "遅れます", "18時まで"]),
+        )
+        for m in members
+    ]
+    ParticipantFlag.objects.bulk_create(
+        [ParticipantFlag(event_participant=ep, flag_definition=flags[0], is_on=True) for ep in eps[::2]]
+        + [ParticipantFlag(event_participant=ep, flag_definition=flags[1], is_on=True, value=3) for ep in eps[::5]]
+    )
+
+    schedule = generate_doubles_schedule([ep.id for ep in eps], rounds, courts)
+    ms = MatchSchedule.objects.create(
+        event=event, schedule=schedule, game_type=GameType.DOUBLES,
+        court_count=courts, round_count=rounds, published=True,
+    )
+    sync_match_slots(ms)
+    MatchScore.objects.bulk_create([
+        MatchScore(match_schedule=ms, round_no=r["round"], court_no=m["court"],
+                   side_a_score=rng.randint(0, 6), side_b_score=rng.randint(0, 6))
+        for r in schedule for m in r["matches"]
+    ])
+    return club, event
+
+
+def measure(fn, repeat: int):
+    """
+    (中央値 ms, 1回あたりクエリ数, レスポンス)
+    """
+    fn()  # warm-up（テンプレート読み込み / フラグメントキャッシュ）
+    times = []
+    with CaptureQueriesContext(connection) as q:
+        resp = fn()
+    n_queries = len(q.captured_queries)
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        resp = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), n_queries, resp
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro benchmarks on a throwaway fixture (rolled back afterwards). "
+        "event_state: full event HTML page vs the JSON state endpoint (size / time / queries). "
+        "sse: SSE fan-out capacity per worker vs the equivalent changes?since polling load. "
+        "scores: concurrent score writers, per-score locking vs the old schedule-wide lock "
+        "(needs committed rows, so its fixture is deleted instead of rolled back). "
+        "schedule_format: v1 vs compact v2 schedule_json size / parse time "
+        "(largest generated schedules + the largest stored ones). "
+        "render: published schedule block render time for a large event: the old dict + get_item "
+        "templates vs the view model (cache miss), plus the fragment cache hit. "
+        "drafts: repeated schedule generation throughput, cache draft store vs the DB draft row."
+    )
+
+    # スレッドから見える必要があるので外側の atomic で包まないベンチ
+    COMMITTED_BENCHES = ("scores",)
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="bench", required=True)
+
+        p = sub.add_parser("event_state")
+        p.add_argument("--participants", type=int, default=20)
+        p.add_argument("--guests", type=int, default=4)
+        p.add_argument("--rounds", type=int, default=8)
+        p.add_argument("--courts", type=int, default=3)
+        p.add_argument("--repeat", type=int, default=30)
+
+        p = sub.add_parser("sse")
+        p.add_argument("--connections", type=int, default=1000)
+        p.add_argument("--messages", type=int, default=20)
+        p.add_argument("--poll-interval", type=float, default=15.0)
+
+        p = sub.add_parser("scores")
+        p.add_argument("--writers", type=int, default=6)
+        p.add_argument("--courts", type=int, default=6)
+        p.add_argument("--rounds", type=int, default=8)
+
+        p = sub.add_parser("schedule_format")
+        p.add_argument("--stored", type=int, default=5, help="largest stored schedules to include")
+        p.add_argument("--repeat", type=int, default=200)
+
+        p = sub.add_parser("render")
+        p.add_argument("--rounds", type=int, default=20)
+        p.add_argument("--courts", type=int, default=12)
+        p.add_argument("--repeat", type=int, default=30)
+
+        p = sub.add_parser("drafts")
+        p.add_argument("--rounds", type=int, default=8)
+        p.add_argument("--courts", type=int, default=3)
+        p.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        bench = getattr(self, f"bench_{options['bench']}")
+        if options["bench"] in self.COMMITTED_BENCHES:
+            with override_settings(STORAGES=PLAIN_STATIC):
+                bench(options)
+            return
+        try:
+            with override_settings(STORAGES=PLAIN_STATIC), transaction.atomic():
+                bench(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _report(self, label, ms, n_queries, body: bytes):
+        self.stdout.write(
+            f"{label:<12} {ms:8.2f} ms  {n_queries:3d} queries  "
+            f"{len(body):8d} B  {len(gzip.compress(body)):7d} B gzip"
+        )
+
+    def bench_event_state(self, options):
+        club, event = build_fixture(
+            options["participants"], options["guests"], options["rounds"], options["courts"],
+        )
+        cache.clear()
+        client = Client(HTTP_HOST="localhost")
+        page_url = reverse("tennis:event_public", args=[club.public_token, event.id])
+        state_url = reverse("tennis:event_state", args=[club.public_token, event.id])
+
+        for label, url in (("html page", page_url), ("json state", state_url)):
+            ms, n_queries, resp = measure(lambda: client.get(url), options["repeat"])
+            self._report(label, ms, n_queries, resp.content)
+
+        etag = client.get(state_url)["ETag"]
+        ms, n_queries, resp = measure(
+            lambda: client.get(state_url, HTTP_IF_NONE_MATCH=etag), options["repeat"],
+        )
+        self._report(f"json {resp.status_code}", ms, n_queries, resp.content)
+
+    def bench_sse(self, options):
+        n = options["connections"]
+        n_messages = options["messages"]
+
+        # ---- push：購読 n 本に n_messages 回ファンアウト（publish は別スレッド = 同期 view 相当）
+        async def run():
+            broker = InProcessBroker()
+            channel = event_channel(1)
+            latencies = []
+            done = asyncio.Event()
+            remaining = [n * n_messages]
+
+            async def consumer():
+                sub = broker.subscribe(channel, heartbeat=3600)
+                try:
+                    async for msg in sub:
+                        latencies.append(time.perf_counter() - msg["t"])
+                        remaining[0] -= 1
+                        if remaining[0] == 0:
+                            done.set()
+                finally:
+                    await sub.aclose()
+
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            tasks = [asyncio.ensure_future(consumer()) for _ in range(n)]
+            await asyncio.sleep(0)
+            mem = sum(st.size_diff for st in tracemalloc.take_snapshot().compare_to(before, "filename"))
+            tracemalloc.stop()
+
+            def publisher():
+                for i in range(n_messages):
+                    broker.publish(channel, {"type": "score", "version": i, "t": time.perf_counter()})
+                    time.sleep(0.01)
+
+            t0 = time.perf_counter()
+            threading.Thread(target=publisher).start()
+            await asyncio.wait_for(done.wait(), timeout=60)
+            elapsed = time.perf_counter() - t0
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return mem, latencies, elapsed
+
+        mem, latencies, elapsed = asyncio.run(run())
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        self.stdout.write(
+            f"sse push    {n} connections: {mem / n / 1024:.1f} KiB/conn, "
+            f"{n * n_messages} deliveries in {elapsed:.2f}s, latency p50 {p50:.2f} ms / p99 {p99:.2f} ms"
+        )
+
+        # ---- polling：同じ人数が changes?since=V（変化なし）を interval ごとに叩いた場合
+        club, event = build_fixture(8, 0, 4, 2)
+        client = Client(HTTP_HOST="localhost")
+        url = reverse("tennis:event_changes", args=[club.public_token, event.id])
+        first = client.get(url).json()
+        params = {"since": first["version"], "club_version": first["club_version"]}
+        ms, n_queries, _resp = measure(lambda: client.get(url, params), 50)
+        rps = n / options["poll_interval"]
+        self.stdout.write(
+            f"polling     {n} clients / {options['poll_interval']:.0f}s: {rps:.1f} req/s x {ms:.2f} ms "
+            f"= {rps * ms / 1000:.2f} worker-seconds per second ({n_queries} query each), "
+            f"changes seen up to {options['poll_interval']:.0f}s late"
+        )
+
+    def bench_scores(self, options):
+        writers = options["writers"]
+        courts = options["courts"]
+        rounds = options["rounds"]
+        club, event = build_fixture(courts * 4, 0, rounds, courts)
+        ms_id = MatchSchedule.objects.get(event=event).id
+        url = reverse("tennis:save_match_score")
+
+        def run(schedule_lock: bool):
+            MatchScore.objects.filter(match_schedule_id=ms_id).delete()
+            barrier = threading.Barrier(writers)
+            latencies = []
+            errors = []
+
+            def writer(i):
+                client = Client(HTTP_HOST="localhost")
+                court = i % courts + 1
+                try:
+                    barrier.wait()
+                    for round_no in range(1, rounds + 1):
+                        for side in ("a", "b"):
+                            data = {
+                                "event_id": event.id, "round_no": round_no, "court_no": court,
+                                "side": side, "value": round_no % 7,
+                            }
+                            t0 = time.perf_counter()
+                            if schedule_lock:
+                                # 旧実装相当：リクエスト全体を対戦表行のロック下で実行
+                                with transaction.atomic():
+                                    MatchSchedule.objects.select_for_update().get(pk=ms_id)
+                                    r = client.post(url, data)
+                            else:
+                                r = client.post(url, data)
+                            latencies.append((time.perf_counter() - t0) * 1000)
+                            if r.status_code != 200:
+                                errors.append(r.status_code)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - t0
+            latencies.sort()
+            return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[-1], errors
+
+        try:
+            for label, schedule_lock in (("schedule lock", True), ("per-score", False)):
+                rate, p50, worst, errors = run(schedule_lock)
+                self.stdout.write(
+                    f"{label:<14} {writers} writers x {rounds * 2} saves: {rate:7.1f} saves/s  "
+                    f"p50 {p50:6.2f} ms  max {worst:7.2f} ms  errors {len(errors)}"
+                )
+            self.stdout.write(f"(database: {connection.vendor})")
+        finally:
+            club.delete()
+
+    def bench_schedule_format(self, options):
+        repeat = options["repeat"]
+
+        # 生成できる最大（20ラウンド x 12面）と、DB 上で大きいもの
+        samples = [
+            ("doubles 20x12", generate_doubles_schedule(list(range(1000, 1052)), 20, 12)),
+            ("doubles 8x3", generate_doubles_schedule(list(range(1000, 1014)), 8, 3)),
+            ("singles 20x12", generate_singles_schedule(list(range(1000, 1026)), 20, 12)),
+        ]
+        stored = (
+            MatchSchedule.objects
+            .order_by("-content_size")
+            .values_list("id", "schedule_json")[:options["stored"]]
+        )
+        samples += [(f"stored #{pk}", decode_schedule(raw)) for pk, raw in stored]
+
+        def parse_ms(raw: str, decode: bool) -> float:
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                obj = json.loads(raw)
+                if decode:
+                    decode_schedule(obj)
+            return (time.perf_counter() - t0) * 1000 / repeat
+
+        self.stdout.write(f"{'schedule':<16} {'v1 B':>8} {'v2 B':>8} {'size':>6}  {'v1 parse':>9} {'v2 parse+decode':>16}")
+        for label, schedule in samples:
+            v2 = encode_schedule(schedule)
+            if not isinstance(v2, dict):
+                self.stdout.write(f"{label:<16} (not encodable, kept as v1)")
+                continue
+            assert decode_schedule(v2) == schedule
+            raw1 = json.dumps(schedule, separators=(",", ":"))
+            raw2 = json.dumps(v2, separators=(",", ":"))
+            t1 = parse_ms(raw1, decode=False)
+            t2 = parse_ms(raw2, decode=True)
+            self.stdout.write(
+                f"{label:<16} {len(raw1):8d} {len(raw2):8d} {len(raw2) / len(raw1):6.1%}  "
+                f"{t1:7.3f}ms {t2:14.3f}ms"
+            )
+
+    def bench_render(self, options):
+        rounds, courts, repeat = options["rounds"], options["courts"], options["repeat"]
+        _club, event = build_fixture(courts * 4 + 4, 0, rounds, courts)
+        ms = MatchSchedule.objects.select_related("event").get(event=event)
+        name_map = build_name_map(EventParticipant.objects.filter(event=event).select_related("member"))
+        request = RequestFactory().get("/")
+
+        legacy = Engine(
+            loaders=[("django.template.loaders.locmem.Loader", LEGACY_SCHEDULE_TEMPLATES)],
+            libraries={"tennis_extras": "tennis.templatetags.tennis_extras"},
+        ).get_template("block")
+
+        def render_legacy():
+            revisions = {}
+            schedule = _merge_scores_into_schedule(effective_schedule(ms), _build_score_map(ms, revisions), revisions)
+            return legacy.render(Context({"event": event, "schedule": schedule, "ep_name_map": name_map}))
+
+        def render_view_model():
+            return _render_schedule_block(request, event, ms, name_map)
+
+        cache.clear()
+        self.stdout.write(f"{rounds} rounds x {courts} courts")
+        for label, fn in (
+            ("get_item", render_legacy),
+            ("view model", render_view_model),
+            ("cache hit", lambda: cached_schedule_block(ms, name_map, "public", render_view_model)),
+        ):
+            ms_med, n_queries, html = measure(fn, repeat)
+            self._report(label, ms_med, n_queries, str(html).encode())
+
+    def bench_drafts(self, options):
+        rounds, courts, repeat = options["rounds"], options["courts"], options["repeat"]
+        _club, event = build_fixture(courts * 4 + 2, 0, rounds, courts)
+        ep_ids = list(EventParticipant.objects.filter(event=event).values_list("id", flat=True))
+        client = Client(HTTP_HOST="localhost")
+        session = client.session
+        session[f"tennis_event_admin:{event.id}"] = True
+        session.save()
+        url = reverse("tennis:ajax_generate_schedule", args=[event.id])
+        data = {
+            "participant_ids": ",".join(map(str, ep_ids)),
+            "game_type": GameType.DOUBLES, "num_rounds": rounds, "num_courts": courts,
+        }
+        draft = new_draft(generate_doubles_schedule(ep_ids, rounds, courts), {"participant_ids": ep_ids})
+
+        self.stdout.write(f"{'store':<8} {'generate':>10} {'req/s':>7} {'queries':>8}  {'store.put':>10}")
+        for label, backend in (("db", "tennis.drafts.DbDraftStore"), ("cache", "tennis.drafts.CacheDraftStore")):
+            with override_settings(TENNIS_DRAFT_STORE_BACKEND=backend):
+                get_draft_store.cache_clear()
+                store = get_draft_store()
+                gen_ms, n_queries, _resp = measure(lambda: client.post(url, data), repeat)
+                put_ms, _n, _ = measure(lambda: store.put(event.id, "bench", draft), repeat)
+            self.stdout.write(
+                f"{label:<8} {gen_ms:8.2f}ms {1000 / gen_ms:7.1f} {n_queries:8d}  {put_ms:8.3f}ms"
+            )
+        get_draft_store.cache_clear()
+        self.stdout.write(f"(database: {connection.vendor}, cache: locmem unless CACHES is set)")
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0007_clubflagdefinition_input_mode_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberMatchup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relation', models.CharField(choices=[('partner', 'パートナー'), ('opponent', '対戦相手')], max_length=10)),
+                ('matches', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('draws', models.IntegerField(default=0)),
+                ('games_for', models.IntegerField(default=0)),
+                ('games_against', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matchups', to='tennis.club')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matchups', to='tennis.member')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tennis.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['club', 'relation'], name='tennis_memb_club_id_124580_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'other', 'relation'), name='uq_member_matchup_member_other_relation')],
+            },
+        ),
+    ]
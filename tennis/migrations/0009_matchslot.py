@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 05:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0008_membermatchup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('round_no', models.PositiveIntegerField()),
+                ('court_no', models.PositiveIntegerField()),
+                ('team', models.PositiveSmallIntegerField()),
+                ('slot_index', models.PositiveSmallIntegerField()),
+                ('event_participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_slots', to='tennis.eventparticipant')),
+                ('match_schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='tennis.matchschedule')),
+            ],
+            options={
+                'ordering': ['round_no', 'court_no', 'team', 'slot_index'],
+                'indexes': [models.Index(fields=['event_participant', 'match_schedule'], name='tennis_matc_event_p_32f44f_idx'), models.Index(fields=['match_schedule', 'round_no', 'court_no'], name='tennis_matc_match_s_90a0c3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('match_schedule', 'round_no', 'court_no', 'team', 'slot_index'), name='uq_match_slot_schedule_position')],
+            },
+        ),
+    ]
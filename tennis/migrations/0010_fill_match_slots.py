@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-19 06:10
+from django.db import migrations
+
+
+def _as_ep_id(p):
+    if isinstance(p, bool):
+        return None
+    if isinstance(p, int):
+        return p
+    if isinstance(p, str) and p.isdigit():
+        return int(p)
+    return None
+
+
+def fill_match_slots(apps, schema_editor):
+    MatchSchedule = apps.get_model("tennis", "MatchSchedule")
+    MatchSlot = apps.get_model("tennis", "MatchSlot")
+    EventParticipant = apps.get_model("tennis", "EventParticipant")
+
+    for ms in MatchSchedule.objects.all().iterator():
+        rows = []
+        for r in (ms.schedule_json or []):
+            if not isinstance(r, dict):
+                continue
+            round_no = int(r.get("round") or 0)
+            for mi, m in enumerate(r.get("matches") or []):
+                court_no = int(m.get("court") or (mi + 1))
+                for team, key in ((1, "team1"), (2, "team2")):
+                    for si, p in enumerate(m.get(key) or []):
+                        ep_id = _as_ep_id(p)
+                        if ep_id is not None:
+                            rows.append((round_no, court_no, team, si, ep_id))
+            for si, p in enumerate(r.get("rests") or []):
+                ep_id = _as_ep_id(p)
+                if ep_id is not None:
+                    rows.append((round_no, 0, 0, si, ep_id))
+
+        valid = set(
+            EventParticipant.objects
+            .filter(event_id=ms.event_id, id__in={x[4] for x in rows})
+            .values_list("id", flat=True)
+        )
+        MatchSlot.objects.filter(match_schedule_id=ms.id).delete()
+        MatchSlot.objects.bulk_create([
+            MatchSlot(
+                match_schedule_id=ms.id,
+                round_no=round_no,
+                court_no=court_no,
+                team=team,
+                slot_index=si,
+                event_participant_id=ep_id,
+            )
+            for round_no, court_no, team, si, ep_id in rows
+            if ep_id in valid
+        ])
+
+
+def unfill_match_slots(apps, schema_editor):
+    MatchSlot = apps.get_model("tennis", "MatchSlot")
+    MatchSlot.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tennis", "0009_matchslot"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_match_slots, unfill_match_slots),
+    ]
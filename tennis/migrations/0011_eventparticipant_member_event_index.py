@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0010_fill_match_slots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventparticipant',
+            index=models.Index(fields=['member', 'event'], name='tennis_even_member__8af08b_idx'),
+        ),
+    ]
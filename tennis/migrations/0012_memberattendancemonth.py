@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 05:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0011_eventparticipant_member_event_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberAttendanceMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('yes', models.IntegerField(default=0)),
+                ('no', models.IntegerField(default=0)),
+                ('maybe', models.IntegerField(default=0)),
+                ('unset', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to='tennis.club')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to='tennis.member')),
+            ],
+            options={
+                'ordering': ['month', 'member_id'],
+                'indexes': [models.Index(fields=['club', 'month'], name='tennis_memb_club_id_35988f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'month'), name='uq_member_attendance_month_member_month')],
+            },
+        ),
+    ]
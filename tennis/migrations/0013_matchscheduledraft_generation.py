@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-19 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0012_memberattendancemonth'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchscheduledraft',
+            name='generation',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='matchscheduledraft',
+            index=models.Index(fields=['updated_at'], name='tennis_matc_updated_a7db0b_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0013_matchscheduledraft_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='club',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
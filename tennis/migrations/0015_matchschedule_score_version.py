@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0014_version_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchschedule',
+            name='score_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-19 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0015_matchschedule_score_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipant',
+            name='change_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchschedule',
+            name='change_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchscore',
+            name='change_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='participantflag',
+            name='change_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='eventparticipant',
+            index=models.Index(fields=['event', 'change_version'], name='tennis_even_event_i_e1ac7a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchscore',
+            index=models.Index(fields=['match_schedule', 'change_version'], name='tennis_matc_match_s_73af05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participantflag',
+            index=models.Index(fields=['event_participant', 'change_version'], name='tennis_part_event_p_4d2c24_idx'),
+        ),
+    ]
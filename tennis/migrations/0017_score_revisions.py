@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0016_change_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='matchschedule',
+            name='score_version',
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='score_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchscore',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 06:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0017_score_revisions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreSyncOp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('op_id', models.CharField(max_length=64)),
+                ('round_no', models.PositiveIntegerField()),
+                ('court_no', models.PositiveIntegerField()),
+                ('side', models.CharField(max_length=1)),
+                ('client_ts', models.BigIntegerField()),
+                ('applied', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('match_schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_ops', to='tennis.matchschedule')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['match_schedule', 'round_no', 'court_no', 'side'], name='tennis_scor_match_s_92ce38_idx')],
+                'constraints': [models.UniqueConstraint(fields=('match_schedule', 'op_id'), name='uq_score_sync_op_schedule_op')],
+            },
+        ),
+    ]
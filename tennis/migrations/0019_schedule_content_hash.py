@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-19 06:16
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def _digest(obj):
+    raw = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest(), len(raw)
+
+
+def fill_content_hash(apps, schema_editor):
+    for model_name, field in (("MatchSchedule", "schedule_json"), ("MatchScheduleDraft", "draft_json")):
+        Model = apps.get_model("tennis", model_name)
+        rows = []
+        for obj in Model.objects.all().iterator():
+            obj.content_hash, obj.content_size = _digest(getattr(obj, field))
+            rows.append(obj)
+        Model.objects.bulk_update(rows, ["content_hash", "content_size"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0018_score_sync_ops'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchschedule',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='matchschedule',
+            name='content_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='matchscheduledraft',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='matchscheduledraft',
+            name='content_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 6.0 on 2026-10-19 06:30
+import hashlib
+import json
+
+from django.db import migrations
+
+
+# ------------------------------------------------------------
+# 変換はこの時点の schedule_codec の写し（以後 codec が変わってもこの移行の結果は変えない）
+# ------------------------------------------------------------
+
+_V2 = 2
+
+_V1_ROUND_KEYS = {"round", "matches", "rests"}
+_V1_MATCH_KEYS = {"court", "team1", "team2", "score1", "score2"}
+
+
+def _is_ep_id(p) -> bool:
+    return isinstance(p, int) and not isinstance(p, bool)
+
+
+def _encode_round(r, team_size: int):
+    if not isinstance(r, dict) or set(r) - _V1_ROUND_KEYS or not _is_ep_id(r.get("round")):
+        return None
+    matches = r.get("matches") or []
+    rests = r.get("rests") or []
+    row = [r["round"], len(matches)]
+    for ci, m in enumerate(matches):
+        if not isinstance(m, dict) or set(m) - _V1_MATCH_KEYS:
+            return None
+        if m.get("court") != ci + 1 or m.get("score1") is not None or m.get("score2") is not None:
+            return None
+        for key in ("team1", "team2"):
+            team = m.get(key) or []
+            if len(team) != team_size or not all(_is_ep_id(p) for p in team):
+                return None
+            row.extend(team)
+    if not all(_is_ep_id(p) for p in rests):
+        return None
+    row.extend(rests)
+    return row
+
+
+def encode_schedule(schedule):
+    if not isinstance(schedule, list) or not schedule:
+        return schedule
+
+    team_size = 0
+    for r in schedule:
+        for m in ((r.get("matches") or []) if isinstance(r, dict) else []):
+            if isinstance(m, dict):
+                team_size = len(m.get("team1") or [])
+                break
+        if team_size:
+            break
+
+    rows = []
+    for r in schedule:
+        row = _encode_round(r, team_size)
+        if row is None:
+            return schedule
+        rows.append(row)
+    return {"v": _V2, "ts": team_size, "r": rows}
+
+
+def decode_schedule(stored) -> list:
+    if stored is None:
+        return []
+    if not isinstance(stored, dict):
+        return stored
+    if stored.get("v") != _V2:
+        raise ValueError(f"unknown schedule format: {stored.get('v')!r}")
+
+    team_size = int(stored.get("ts") or 0)
+    per_match = team_size * 2
+    out = []
+    for row in stored.get("r") or []:
+        round_no, n_matches = row[0], row[1]
+        pos = 2
+        matches = []
+        for ci in range(n_matches):
+            matches.append({
+                "court": ci + 1,
+                "team1": row[pos:pos + team_size],
+                "team2": row[pos + team_size:pos + per_match],
+                "score1": None,
+                "score2": None,
+            })
+            pos += per_match
+        out.append({"round": round_no, "matches": matches, "rests": row[pos:]})
+    return out
+
+
+def _digest(obj):
+    raw = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest(), len(raw)
+
+
+def _convert(apps, convert):
+    for model_name, field in (("MatchSchedule", "schedule_json"), ("MatchScheduleDraft", "draft_json")):
+        Model = apps.get_model("tennis", model_name)
+        rows = []
+        for obj in Model.objects.all().iterator():
+            stored = convert(getattr(obj, field))
+            setattr(obj, field, stored)
+            obj.content_hash, obj.content_size = _digest(stored)
+            rows.append(obj)
+        Model.objects.bulk_update(rows, [field, "content_hash", "content_size"], batch_size=200)
+
+
+def to_v2(apps, schema_editor):
+    _convert(apps, encode_schedule)
+
+
+def to_v1(apps, schema_editor):
+    _convert(apps, lambda stored: decode_schedule(stored) if stored is not None else None)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tennis", "0019_schedule_content_hash"),
+    ]
+
+    operations = [
+        migrations.RunPython(to_v2, to_v1),
+    ]
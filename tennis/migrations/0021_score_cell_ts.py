@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-19 06:35
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def fill_cell_ts(apps, schema_editor):
+    # これまでの後勝ち判定は適用済み op の最新 ts だったので、それを初期値にする
+    MatchScore = apps.get_model("tennis", "MatchScore")
+    ScoreSyncOp = apps.get_model("tennis", "ScoreSyncOp")
+    latest = (
+        ScoreSyncOp.objects.filter(applied=True)
+        .values_list("match_schedule_id", "round_no", "court_no", "side")
+        .annotate(ts=Max("client_ts"))
+    )
+    by_cell = {(ms_id, r, c, side): ts for ms_id, r, c, side, ts in latest}
+    if not by_cell:
+        return
+    rows = []
+    for s in MatchScore.objects.filter(match_schedule_id__in={k[0] for k in by_cell}).iterator():
+        s.side_a_ts = by_cell.get((s.match_schedule_id, s.round_no, s.court_no, "a"))
+        s.side_b_ts = by_cell.get((s.match_schedule_id, s.round_no, s.court_no, "b"))
+        rows.append(s)
+    MatchScore.objects.bulk_update(rows, ["side_a_ts", "side_b_ts"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0020_compact_schedule_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchscore',
+            name='side_a_ts',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='matchscore',
+            name='side_b_ts',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_cell_ts, migrations.RunPython.noop),
+    ]
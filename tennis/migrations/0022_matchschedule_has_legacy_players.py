@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-19 06:40
+
+from django.db import migrations, models
+
+
+def _players(stored):
+    # 保存形式をこの時点の定義で読む（v2: {"v": 2, "r": [[round, 試合数, 選手...], ...]} / v1: list）
+    if isinstance(stored, dict):
+        for row in stored.get("r") or []:
+            yield from row[2:]
+        return
+    for r in (stored or []):
+        if not isinstance(r, dict):
+            continue
+        for m in (r.get("matches") or []):
+            yield from (m.get("team1") or [])
+            yield from (m.get("team2") or [])
+        yield from (r.get("rests") or [])
+
+
+def _as_ep_id(p):
+    if isinstance(p, bool):
+        return None
+    if isinstance(p, int):
+        return p
+    if isinstance(p, str) and p.isdigit():
+        return int(p)
+    return None
+
+
+def fill_has_legacy_players(apps, schema_editor):
+    # 代打はイベント内の EP を入れ替えるだけなので、元の対戦表だけ見ればよい
+    MatchSchedule = apps.get_model("tennis", "MatchSchedule")
+    EventParticipant = apps.get_model("tennis", "EventParticipant")
+    legacy_ids = []
+    for ms in MatchSchedule.objects.all().iterator():
+        ep_ids = [_as_ep_id(p) for p in _players(ms.schedule_json)]
+        if None in ep_ids:
+            legacy_ids.append(ms.id)
+            continue
+        valid = set(
+            EventParticipant.objects
+            .filter(event_id=ms.event_id, id__in=set(ep_ids))
+            .values_list("id", flat=True)
+        )
+        if not valid.issuperset(ep_ids):
+            legacy_ids.append(ms.id)
+    MatchSchedule.objects.filter(id__in=legacy_ids).update(has_legacy_players=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0021_score_cell_ts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchschedule',
+            name='has_legacy_players',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_has_legacy_players, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 06:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_event_date(apps, schema_editor):
+    Event = apps.get_model("tennis", "Event")
+    EventParticipant = apps.get_model("tennis", "EventParticipant")
+    EventParticipant.objects.update(
+        event_date=Subquery(Event.objects.filter(pk=OuterRef("event_id")).values("date")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tennis', '0022_matchschedule_has_legacy_players'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipant',
+            name='event_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_event_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='eventparticipant',
+            name='event_date',
+            field=models.DateField(),
+        ),
+        migrations.RemoveIndex(
+            model_name='eventparticipant',
+            name='tennis_even_member__8af08b_idx',
+        ),
+        migrations.AddIndex(
+            model_name='eventparticipant',
+            index=models.Index(fields=['member', 'event_date', 'event'], name='tennis_even_member__b00954_idx'),
+        ),
+    ]
@@ -1,9 +1,15 @@
 # tennis/models.py
+import hashlib
+import json
 import uuid
+from datetime import timedelta
+
 from django.db import models, transaction
 from django.db.models import Q, Max
 from django.utils import timezone
 
+from .schedule_codec import decode_schedule, encode_schedule
+
 
 # ============================================================
 # Core: Club / Event / Member / EventParticipant
@@ -19,6 +25,10 @@ class Club(models.Model):
 
     is_active = models.BooleanField(default=True)
 
+    # クラブ全体の表示に効く変更（フラグ定義 / メンバー名 / 固定化 等）で +1
+    # → club_home / event ページの ETag に使う
+    version = models.PositiveBigIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -60,6 +70,13 @@ class Event(models.Model):
 
     cancelled = models.BooleanField(default=False)
 
+    # イベント画面に効く書き込み（出欠/フラグ/公開/スコア/代打 等）で +1（ETag 用）
+    version = models.PositiveBigIntegerField(default=0)
+
+    # スコアの追加/変更/削除で +1（対戦表フラグメントキャッシュのキー）
+    # version と同じ UPDATE で進める（対戦表行はスコア入力ごとに書かない）
+    score_version = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -131,6 +148,13 @@ class EventParticipant(models.Model):
     participates_match = models.BooleanField(default=False)  # 幹事のみ操作
     comment = models.TextField(blank=True)
 
+    # 最後に変更したときの Event.version（差分同期 ?since=V 用）
+    change_version = models.PositiveBigIntegerField(default=0)
+
+    # Event.date のコピー（個人ページの (date, event_id) keyset を1インデックスで引く）
+    # ※ Event.date は作成後に変えない前提。save() で未設定なら event から埋める
+    event_date = models.DateField()
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -139,6 +163,8 @@ class EventParticipant(models.Model):
             models.Index(fields=["event", "member"]),
             models.Index(fields=["event", "attendance"]),
             models.Index(fields=["event", "participates_match"]),
+            models.Index(fields=["member", "event_date", "event"]),
+            models.Index(fields=["event", "change_version"]),
         ]
         constraints = [
             # filtered unique: unique(event, member) WHERE member IS NOT NULL
@@ -150,6 +176,11 @@ class EventParticipant(models.Model):
         ]
         ordering = ["id"]
 
+    def save(self, *args, **kwargs):
+        if self.event_date is None:
+            self.event_date = self.event.date
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f"{self.event_id}:{self.display_name}"
 
@@ -215,6 +246,9 @@ class ParticipantFlag(models.Model):
 
     value = models.SmallIntegerField(null=True, blank=True)
 
+    # 最後に変更したときの Event.version（差分同期用）
+    change_version = models.PositiveBigIntegerField(default=0)
+
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -226,6 +260,7 @@ class ParticipantFlag(models.Model):
         ]
         indexes = [
             models.Index(fields=["flag_definition", "is_on"]),
+            models.Index(fields=["event_participant", "change_version"]),
         ]
 
 
@@ -239,6 +274,33 @@ class GameType(models.TextChoices):
     SINGLES = "singles", "Singles"
 
 
+def schedule_content_digest(stored) -> tuple:
+    """
+    保存形式（schedule_codec の v2。表せないものは v1）の JSON 正規形（キー順固定・空白なし）の sha1 と byte 数
+    - v1 形の対戦表と比べるときは encode_schedule してから渡す（v1 のまま渡すと別の hash になる）
+    - 公開状態の判定 / 変更検知 / キャッシュキーは JSON を読まずにこれを比べる
+    """
+    raw = json.dumps(stored, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest(), len(raw)
+
+
+def _decoded(instance, json_field: str) -> list:
+    # 同じ保存値を何度も展開しない（保存値が差し替わったら作り直す）
+    stored = getattr(instance, json_field)
+    cached = instance.__dict__.get("_decoded_schedule")
+    if cached is None or cached[0] is not stored:
+        cached = (stored, decode_schedule(stored))
+        instance.__dict__["_decoded_schedule"] = cached
+    return cached[1]
+
+
+def _with_content_digest(instance, json_field: str, kwargs: dict) -> None:
+    instance.content_hash, instance.content_size = schedule_content_digest(getattr(instance, json_field))
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and json_field in update_fields:
+        kwargs["update_fields"] = {*update_fields, "content_hash", "content_size"}
+
+
 class MatchSchedule(models.Model):
     """
     対戦表（公開版）
@@ -249,7 +311,12 @@ class MatchSchedule(models.Model):
         Event, on_delete=models.CASCADE, related_name="match_schedule"
     )
 
-    schedule_json = models.JSONField()  # 対戦表本体（UI/集計の正）
+    schedule_json = models.JSONField()  # 対戦表本体（UI/集計の正）。保存形式は schedule_codec（読むときは .schedule）
+
+    # schedule_json の正規形 hash / byte 数（save() で更新。QuerySet.update で JSON を書くときは自前で）
+    content_hash = models.CharField(max_length=40, blank=True, default="")
+    content_size = models.PositiveIntegerField(default=0)
+
     game_type = models.CharField(max_length=10, choices=GameType.choices)
     court_count = models.PositiveIntegerField()
     round_count = models.PositiveIntegerField()
@@ -257,6 +324,13 @@ class MatchSchedule(models.Model):
     published = models.BooleanField(default=False)
     locked = models.BooleanField(default=False)
 
+    # 公開/代打で schedule_json を書き換えたときの Event.version（差分同期用）
+    change_version = models.PositiveBigIntegerField(default=0)
+
+    # MatchSlot にできない選手（旧形式の名前文字列 / イベント外の ep_id）が居る
+    # （sync_match_slots が立てる。集計の SQL 版はこの対戦表だけ JSON から数える）
+    has_legacy_players = models.BooleanField(default=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -266,23 +340,73 @@ class MatchSchedule(models.Model):
             models.Index(fields=["locked"]),
         ]
 
+    @property
+    def schedule(self) -> list:
+        """
+        v1 形（[{"round", "matches", "rests"}]）で読む
+        """
+        return _decoded(self, "schedule_json")
+
+    @schedule.setter
+    def schedule(self, value) -> None:
+        self.schedule_json = encode_schedule(value)
+
+    def save(self, *args, **kwargs):
+        _with_content_digest(self, "schedule_json", kwargs)
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f"event={self.event_id} published={self.published} locked={self.locked}"
 
 
 class MatchScheduleDraft(models.Model):
     """
-    生成中ドラフト（イベントにつき1つ）
+    生成中ドラフト（イベントにつき1つ）：TENNIS_DRAFT_STORE_BACKEND = DbDraftStore のときの保存先
+    - 生成のたびに generation を振り直す。公開時はクライアントが持つ generation と一致し、
+      かつ TTL 内のものだけ採用（古いドラフトは GET で消さず、無視 → sweep で掃除）
     """
+    TTL = timedelta(hours=6)
+
     event = models.OneToOneField(
         Event, on_delete=models.CASCADE, related_name="match_schedule_draft"
     )
 
-    draft_json = models.JSONField(null=True, blank=True)
+    draft_json = models.JSONField(null=True, blank=True)  # 保存形式は schedule_codec（読むときは .schedule）
     params_json = models.JSONField(null=True, blank=True)  # game_type/court_count/round_count 等
+    generation = models.CharField(max_length=32, blank=True, default="")
+
+    # draft_json の正規形 hash / byte 数（MatchSchedule と同じ計算。save() で更新）
+    content_hash = models.CharField(max_length=40, blank=True, default="")
+    content_size = models.PositiveIntegerField(default=0)
 
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at"]),
+        ]
+
+    def is_usable(self, generation: str, now=None) -> bool:
+        now = now or timezone.now()
+        return (
+            bool(self.generation)
+            and self.generation == (generation or "")
+            and self.updated_at is not None
+            and now - self.updated_at <= self.TTL
+        )
+
+    @property
+    def schedule(self) -> list:
+        return _decoded(self, "draft_json")
+
+    @schedule.setter
+    def schedule(self, value) -> None:
+        self.draft_json = encode_schedule(value)
+
+    def save(self, *args, **kwargs):
+        _with_content_digest(self, "draft_json", kwargs)
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f"event={self.event_id} draft"
 
@@ -302,6 +426,17 @@ class MatchScore(models.Model):
     side_a_score = models.PositiveIntegerField(null=True, blank=True)
     side_b_score = models.PositiveIntegerField(null=True, blank=True)
 
+    # 楽観的排他用（保存ごとに +1。クライアントは読んだ revision を添えて保存し、食い違えば 409）
+    revision = models.PositiveIntegerField(default=0)
+
+    # 最後に変更したときの Event.version（差分同期用）
+    change_version = models.PositiveBigIntegerField(default=0)
+
+    # マスごとの最終書き込み時刻（epoch ms）：オフライン同期の後勝ち判定に使う
+    # オンライン保存はサーバ時刻、オフライン op はクライアントの ts。値が変わった書き込みだけ更新
+    side_a_ts = models.BigIntegerField(null=True, blank=True)
+    side_b_ts = models.BigIntegerField(null=True, blank=True)
+
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -313,6 +448,7 @@ class MatchScore(models.Model):
         ]
         indexes = [
             models.Index(fields=["match_schedule", "round_no"]),
+            models.Index(fields=["match_schedule", "change_version"]),
         ]
         ordering = ["round_no", "court_no", "id"]
 
@@ -320,9 +456,49 @@ class MatchScore(models.Model):
         return f"sch={self.match_schedule_id} R{self.round_no} C{self.court_no} {self.side_a_score}-{self.side_b_score}"
 
 
+class ScoreSyncOp(models.Model):
+    """
+    オフライン入力の同期で受け付けたスコア操作（op_id はクライアント採番）
+    - 再送された op は op_id で読み飛ばす（冪等）
+    - マス（round/court/side）ごとの後勝ち判定に client_ts を使う
+    """
+    match_schedule = models.ForeignKey(
+        MatchSchedule, on_delete=models.CASCADE, related_name="sync_ops"
+    )
+    op_id = models.CharField(max_length=64)
+
+    round_no = models.PositiveIntegerField()
+    court_no = models.PositiveIntegerField()
+    side = models.CharField(max_length=1)
+
+    # クライアント時刻（epoch ミリ秒）
+    client_ts = models.BigIntegerField()
+
+    # 対戦表に無い試合宛てなどで適用しなかった op も記録する（再送で何度も弾かないため）
+    applied = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["match_schedule", "op_id"],
+                name="uq_score_sync_op_schedule_op",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["match_schedule", "round_no", "court_no", "side"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"sch={self.match_schedule_id} op={self.op_id} R{self.round_no} C{self.court_no} {self.side}"
+
+
 class Substitution(models.Model):
     """
-    代打（現状態のみ）
+    代打オーバーレイ（ラウンドごとの置換 original → substitute）
+    - 公開済み schedule_json は書き換えず、表示・集計時に重ねる（tennis/substitutions.py）
+    - 元に戻った置換は行ごと削除
     """
     match_schedule = models.ForeignKey(
         MatchSchedule, on_delete=models.CASCADE, related_name="substitutions"
@@ -354,6 +530,123 @@ class Substitution(models.Model):
         return f"sch={self.match_schedule_id} R{self.round_no} {self.original_participant_id}->{self.substitute_participant_id}"
 
 
+class MatchSlot(models.Model):
+    """
+    schedule_json の正規化コピー（1人 × 1ラウンド = 1行）
+    - 公開 / 代打のたびに schedule_json と同期（集計・履歴は JSON を開かず SQL で引く）
+    - 休憩は court_no=0 / team=0（slot_index は rests 内の並び）
+    """
+    match_schedule = models.ForeignKey(
+        MatchSchedule, on_delete=models.CASCADE, related_name="slots"
+    )
+
+    round_no = models.PositiveIntegerField()
+    court_no = models.PositiveIntegerField()  # 0 = 休憩
+    team = models.PositiveSmallIntegerField()  # 1 / 2, 0 = 休憩
+    slot_index = models.PositiveSmallIntegerField()
+
+    event_participant = models.ForeignKey(
+        EventParticipant, on_delete=models.CASCADE, related_name="match_slots"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["match_schedule", "round_no", "court_no", "team", "slot_index"],
+                name="uq_match_slot_schedule_position",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["event_participant", "match_schedule"]),
+            models.Index(fields=["match_schedule", "round_no", "court_no"]),
+        ]
+        ordering = ["round_no", "court_no", "team", "slot_index"]
+
+    def __str__(self) -> str:
+        return f"sch={self.match_schedule_id} R{self.round_no} C{self.court_no} T{self.team}-{self.slot_index} ep={self.event_participant_id}"
+
+
+# ============================================================
+# Head-to-head / Partner index（スコア保存時に差分更新）
+# ============================================================
+
+class MatchupRelation(models.TextChoices):
+    PARTNER = "partner", "パートナー"
+    OPPONENT = "opponent", "対戦相手"
+
+
+class MemberMatchup(models.Model):
+    """
+    member から見た other との通算成績（ペア / 対戦相手）
+    - save_match_score 等の書き込み時に差分で更新する（schedule_json を毎回デコードしない）
+    - 両サイドのスコアが揃った試合だけを数える（ランキングと同じ基準）
+    """
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name="matchups")
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="matchups")
+    other = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="+")
+    relation = models.CharField(max_length=10, choices=MatchupRelation.choices)
+
+    matches = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    draws = models.IntegerField(default=0)
+    games_for = models.IntegerField(default=0)
+    games_against = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member", "other", "relation"],
+                name="uq_member_matchup_member_other_relation",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["club", "relation"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.member_id}-{self.relation}-{self.other_id} {self.wins}/{self.matches}"
+
+
+# ============================================================
+# Attendance rollup（member × 月の出欠件数）
+# ============================================================
+
+class MemberAttendanceMonth(models.Model):
+    """
+    member × 月（イベント開催日の月初）の出欠件数
+    - update_attendance / EP 作成（初回入力・ゲスト追加）で差分更新
+    - unset は「EP はあるが出欠未設定」の件数（未登録行は数えない）
+    """
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name="attendance_months")
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="attendance_months")
+    month = models.DateField()  # 月初日
+
+    yes = models.IntegerField(default=0)
+    no = models.IntegerField(default=0)
+    maybe = models.IntegerField(default=0)
+    unset = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["member", "month"],
+                name="uq_member_attendance_month_member_month",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["club", "month"]),
+        ]
+        ordering = ["month", "member_id"]
+
+    def __str__(self) -> str:
+        return f"{self.member_id} {self.month:%Y-%m} yes={self.yes} no={self.no} maybe={self.maybe} unset={self.unset}"
+
+
 # ============================================================
 # Optional: Audit Log (V1は任意)
 # ============================================================
@@ -0,0 +1,350 @@
+# tennis/participant_ops.py
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ClubFlagDefinition, EventParticipant, Member, ParticipantFlag
+from .rollups import CREATED, track_attendance
+from .versioning import bump_event_version
+
+
+# ============================================================
+# 参加者の一括更新（幹事が練習後にまとめて直す用）
+# - ops: [{"op": ..., "ep_id" | "member_id": n, "value": ..., ("flag_id": n)}, ...]
+#     attendance        … "yes" / "no" / "maybe" / ""（A案で participates_match も連動）
+#     participates_match… bool（attendance=yes 以外は強制 OFF）
+#     comment           … 文字列
+#     flag              … bool（check 型フラグ）
+#     flag_value        … 0-9 / None / ""（digit 型フラグ。数字ありで is_on）
+# - 全件検証してから書く（1件でも不正なら何も書かない）
+# - EP / フラグは種類ごとにまとめて読み書き、Event.version は1回だけ進める
+# ============================================================
+
+
+MAX_BULK_OPS = 200
+
+OP_KINDS = ("attendance", "participates_match", "comment", "flag", "flag_value")
+
+# 単発 API で _guard_participant_change を通しているもの
+GUARDED_OPS = ("attendance", "participates_match", "flag_value")
+
+
+class ParticipantOpError(ValueError):
+    def __init__(self, code: str, index: int | None = None):
+        super().__init__(code)
+        self.code = code
+        self.index = index
+
+
+def _as_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value > 0 else None
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip()) or None
+    return None
+
+
+def _as_bool(value):
+    if isinstance(value, bool):
+        return value
+    s = str(value if value is not None else "").strip().lower()
+    if s in ("true", "1", "yes", "on"):
+        return True
+    if s in ("false", "0", "no", "off"):
+        return False
+    return None
+
+
+def parse_participant_ops(raw) -> list:
+    """
+    入力を正規化して返す（DB は見ない）：
+    [{"op", "ep_id", "member_id", "flag_id", "value"}, ...]
+    """
+    if not isinstance(raw, list) or not raw:
+        raise ParticipantOpError("bad_ops")
+    if len(raw) > MAX_BULK_OPS:
+        raise ParticipantOpError("too_many_ops")
+
+    ops = []
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict) or item.get("op") not in OP_KINDS:
+            raise ParticipantOpError("bad_op", i)
+        kind = item["op"]
+
+        ep_id = _as_id(item.get("ep_id"))
+        member_id = _as_id(item.get("member_id"))
+        if ep_id is None and member_id is None:
+            raise ParticipantOpError("missing_target", i)
+
+        flag_id = None
+        if kind in ("flag", "flag_value"):
+            flag_id = _as_id(item.get("flag_id"))
+            if flag_id is None:
+                raise ParticipantOpError("bad_flag", i)
+
+        value = item.get("value")
+        if kind == "attendance":
+            value = (value or "").strip() if isinstance(value, str) or value is None else None
+            if value not in ("yes", "no", "maybe", ""):
+                raise ParticipantOpError("bad_attendance", i)
+        elif kind in ("participates_match", "flag"):
+            value = _as_bool(value)
+            if value is None:
+                raise ParticipantOpError("bad_checked", i)
+        elif kind == "comment":
+            if value is not None and not isinstance(value, str):
+                raise ParticipantOpError("bad_comment", i)
+            value = (value or "").strip()
+        elif kind == "flag_value":
+            if value is None or value == "":
+                value = None
+            elif isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 9:
+                pass
+            elif isinstance(value, str) and value.isdigit() and len(value) == 1:
+                value = int(value)
+            else:
+                raise ParticipantOpError("bad_value", i)
+
+        ops.append({
+            "op": kind, "ep_id": ep_id, "member_id": member_id,
+            "flag_id": flag_id, "value": value,
+        })
+    return ops
+
+
+_EP_RETURNING = (
+    "id", "event_id", "member_id", "display_name",
+    "attendance", "participates_match", "comment", "change_version",
+)
+
+
+def upsert_member_participants(event, rows, version: int) -> dict:
+    """
+    member 付き EP を INSERT ... ON CONFLICT (event_id, member_id) WHERE member_id IS NOT NULL
+    DO UPDATE ... RETURNING の1文で作る（初回入力の同時タップでも IntegrityError にならない）
+    rows: [(member_id, display_name), ...]（member_id の重複なし）
+    → {member_id: (EventParticipant, created, renamed)}
+    - 既存行は display_name だけ合わせる。名前が変わったときだけ change_version=version
+    - 作成されたかは created_at、名前を変えたかは updated_at で判定
+      （DB 方言の xmax 等を使わない：こちらが渡した時刻の行 = 自分の INSERT / UPDATE）
+    - version は仮の値でもよい：created / renamed の行にだけ後から刻み直す
+    """
+    if not rows:
+        return {}
+
+    meta = EventParticipant._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    now = meta.get_field("created_at").get_db_prep_value(timezone.now(), connection)
+
+    event_date = meta.get_field("event_date").get_db_prep_value(event.date, connection)
+
+    columns = (
+        "event_id", "member_id", "display_name", "attendance", "participates_match",
+        "comment", "change_version", "event_date", "created_at", "updated_at",
+    )
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))
+    params = []
+    for member_id, display_name in rows:
+        params.extend([event.id, member_id, display_name, None, False, "", version, event_date, now, now])
+
+    renamed = f"{table}.{qn('display_name')} <> EXCLUDED.{qn('display_name')}"
+    sql = (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) VALUES {placeholders} "
+        f"ON CONFLICT ({qn('event_id')}, {qn('member_id')}) WHERE {qn('member_id')} IS NOT NULL "
+        f"DO UPDATE SET "
+        f"{qn('change_version')} = CASE WHEN {renamed} "
+        f"THEN EXCLUDED.{qn('change_version')} ELSE {table}.{qn('change_version')} END, "
+        f"{qn('updated_at')} = CASE WHEN {renamed} "
+        f"THEN EXCLUDED.{qn('updated_at')} ELSE {table}.{qn('updated_at')} END, "
+        f"{qn('display_name')} = EXCLUDED.{qn('display_name')} "
+        f"RETURNING {', '.join(qn(c) for c in _EP_RETURNING)}, "
+        f"{qn('created_at')} = %s, {qn('updated_at')} = %s"
+    )
+    params.extend([now, now])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        returned = cursor.fetchall()
+
+    out = {}
+    for row in returned:
+        values = list(row[:-2])
+        values[5] = bool(values[5])  # participates_match（SQLite は 0/1）
+        ep = EventParticipant.from_db(connection.alias, _EP_RETURNING, values)
+        created, touched = bool(row[-2]), bool(row[-1])
+        out[ep.member_id] = (ep, created, touched and not created)
+    return out
+
+
+def upsert_participant_flags(flags, *, with_value: bool) -> None:
+    """
+    INSERT ... ON CONFLICT (event_participant, flag_definition) DO UPDATE の1文で書く
+    （uq_participant_flag_ep_flagdef。get_or_create → save の読み直しと競合窓が無い）
+    - with_value=False（check 型）は既存行の value を上書きしない
+    - 同じ (EP, フラグ) を1回の呼び出しに2つ入れないこと
+    """
+    update_fields = ["is_on", "change_version", "updated_at"]
+    if with_value:
+        update_fields.append("value")
+    ParticipantFlag.objects.bulk_create(
+        flags,
+        update_conflicts=True,
+        unique_fields=["event_participant", "flag_definition"],
+        update_fields=update_fields,
+    )
+
+
+def apply_attendance(ep: EventParticipant, attendance: str) -> None:
+    old = ep.attendance or ""
+    new = attendance or ""
+
+    ep.attendance = new or None
+
+    # =========================
+    # A案：出欠が上位
+    # =========================
+    if new != "yes":
+        # no/maybe/空 は強制OFF
+        ep.participates_match = False
+    else:
+        # yes に変わった瞬間はデフォルトON
+        if old != "yes":
+            ep.participates_match = True
+        # old==yes の場合は participates_match を触らない（ユーザーのOFFを尊重）
+
+
+def apply_participant_ops(event, ops: list) -> dict:
+    """
+    parse 済み ops を1トランザクションで適用する
+    クエリ：EP(ロック) / Member / フラグ定義 / EP 作成 / Event.version / EP 更新 / フラグ upsert / 出欠ロールアップ
+    - ロック順は単発 API と同じ（EP → Event）
+    """
+    ep_ids = {op["ep_id"] for op in ops if op["ep_id"] is not None}
+    member_ids = {op["member_id"] for op in ops if op["ep_id"] is None}
+    flag_ids = {op["flag_id"] for op in ops if op["flag_id"] is not None}
+
+    with transaction.atomic():
+        eps = list(
+            EventParticipant.objects
+            .select_for_update()
+            .filter(event=event)
+            .filter(Q(id__in=ep_ids) | Q(member_id__in=member_ids))
+            .order_by("id")
+        )
+        by_id = {ep.id: ep for ep in eps if ep.id in ep_ids}
+        by_member = {ep.member_id: ep for ep in eps if ep.member_id in member_ids}
+
+        members = {
+            m.id: m
+            for m in Member.objects.filter(club_id=event.club_id, id__in=member_ids - set(by_member))
+        } if member_ids - set(by_member) else {}
+        flagdefs = {
+            fd.id: fd
+            for fd in ClubFlagDefinition.objects.filter(club_id=event.club_id, is_active=True, id__in=flag_ids)
+        } if flag_ids else {}
+
+        # ---- 検証（書き込み前に全件） ----
+        for i, op in enumerate(ops):
+            if op["ep_id"] is not None and op["ep_id"] not in by_id:
+                raise ParticipantOpError("participant_not_found", i)
+            if op["ep_id"] is None and op["member_id"] not in by_member and op["member_id"] not in members:
+                raise ParticipantOpError("member_not_found", i)
+            if op["flag_id"] is not None:
+                fd = flagdefs.get(op["flag_id"])
+                if fd is None:
+                    raise ParticipantOpError("flag_not_found", i)
+                if op["op"] == "flag" and fd.input_mode == "digit":
+                    raise ParticipantOpError("digit_flag_use_value_api", i)
+
+        # ---- 未作成の固定/臨時メンバー行を一括作成（出欠ロールアップは「未設定」1件） ----
+        # 並行して作られていた行は upsert が既存として返す
+        # version は仮（0）：作成 / 改名した行は dirty として後の bulk_update で刻む
+        created, renamed_ids = [], set()
+        upserted = upsert_member_participants(
+            event, [(m.id, m.display_name) for m in members.values()], 0,
+        )
+        for member_id, (ep, was_created, was_renamed) in upserted.items():
+            by_member[member_id] = ep
+            (created if was_created else eps).append(ep)
+            if was_renamed:
+                renamed_ids.add(ep.id)
+
+        def target(op):
+            return by_id[op["ep_id"]] if op["ep_id"] is not None else by_member[op["member_id"]]
+
+        # ---- メモリ上で適用 ----
+        originals = {ep.id: (ep.attendance, ep.participates_match, ep.comment) for ep in eps}
+        attendance_before = {}
+        flag_targets = {}
+        for op in ops:
+            ep = target(op)
+            kind = op["op"]
+            if kind == "attendance":
+                attendance_before.setdefault(ep.id, ep.attendance)
+                apply_attendance(ep, op["value"])
+            elif kind == "participates_match":
+                ep.participates_match = bool(op["value"]) and (ep.attendance or "") == "yes"
+            elif kind == "comment":
+                ep.comment = op["value"]
+            elif kind == "flag":
+                # check 型は value を触らない
+                flag_targets.setdefault((ep.id, op["flag_id"]), {})["is_on"] = op["value"]
+            else:
+                flag_targets.setdefault((ep.id, op["flag_id"]), {}).update(
+                    is_on=op["value"] is not None, value=op["value"],
+                )
+
+        touched = {target(op).id: target(op) for op in ops}
+        stamp_ids = {ep.id for ep in created} | renamed_ids
+        dirty_eps = [
+            ep for ep in touched.values()
+            if ep.id in stamp_ids
+            or originals.get(ep.id) != (ep.attendance, ep.participates_match, ep.comment)
+        ]
+
+        version = None
+        if dirty_eps or flag_targets:
+            version = bump_event_version(event.id)
+            now = timezone.now()
+            for ep in dirty_eps:
+                ep.change_version = version
+                ep.updated_at = now
+            if dirty_eps:
+                EventParticipant.objects.bulk_update(
+                    dirty_eps,
+                    ["attendance", "participates_match", "comment", "change_version", "updated_at"],
+                )
+
+            # フラグは読まずに upsert（check 型だけの行は value を残す）
+            check_flags, value_flags = [], []
+            for (ep_id, flag_id), t in flag_targets.items():
+                pf = ParticipantFlag(
+                    event_participant_id=ep_id, flag_definition_id=flag_id,
+                    is_on=t["is_on"], value=t.get("value"), change_version=version,
+                )
+                (value_flags if "value" in t else check_flags).append(pf)
+            if check_flags:
+                upsert_participant_flags(check_flags, with_value=False)
+            if value_flags:
+                upsert_participant_flags(value_flags, with_value=True)
+
+        # ---- 出欠ロールアップ（1回の bump_counters） ----
+        attendance_changes = [(ep.member_id, CREATED, None) for ep in created]
+        for ep_id, before in attendance_before.items():
+            ep = touched[ep_id]
+            if before != ep.attendance:
+                attendance_changes.append((ep.member_id, before, ep.attendance))
+        if attendance_changes:
+            track_attendance(event, attendance_changes)
+
+    return {
+        "version": version,
+        "participants": list(touched.values()),
+        "flags": [
+            {"ep_id": ep_id, "flag_id": flag_id, "checked": t["is_on"], **({"value": t["value"]} if "value" in t else {})}
+            for (ep_id, flag_id), t in flag_targets.items()
+        ],
+    }
@@ -0,0 +1,141 @@
+# tennis/pubsub.py
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Event
+
+
+# ============================================================
+# Pub/Sub（SSE 配信用）
+# - publish は同期 view から呼ぶ（commit 後に on_commit で）
+# - subscribe は async iterator（aclose で解除）：メッセージ dict、または
+#   heartbeat 秒ごとに None を返す
+# - バックエンドは settings.TENNIS_PUBSUB_BACKEND で差し替え
+#     InProcessBroker       … 同一プロセス内のファンアウト（ワーカー1つ向け）
+#     EventVersionBroker    … Event.version を見に行く（ワーカー複数でも届く代替）
+# ============================================================
+
+
+def event_channel(event_id: int) -> str:
+    return f"event:{int(event_id)}"
+
+
+class InProcessBroker:
+    """
+    購読者ごとに asyncio.Queue を持ち、publish はスレッドセーフに各ループへ投げる
+    （同期 view はスレッドプールで動くため、put はループ側で実行させる）
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set] = {}
+
+    def publish(self, channel: str, message: dict) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+            except RuntimeError:
+                pass  # 購読側のループが既に閉じている（切断直後）
+
+    def subscriber_count(self, channel: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def subscribe(self, channel: str, heartbeat: float = 25.0):
+        # 呼んだ時点で登録（最初の __anext__ を待たない：直後の publish を取りこぼさない）
+        sub = _QueueSubscription(self, channel, heartbeat)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def _unsubscribe(self, sub) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+
+class _QueueSubscription:
+    def __init__(self, broker: InProcessBroker, channel: str, heartbeat: float):
+        self.broker = broker
+        self.channel = channel
+        self.heartbeat = heartbeat
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=broker.max_queue)
+
+    def offer(self, message: dict) -> None:
+        if self.queue.full():
+            # 遅い購読者は古いものを捨てる（クライアントは version で差分を取り直せる）
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=self.heartbeat)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self) -> None:
+        self.broker._unsubscribe(self)
+
+
+class EventVersionBroker:
+    """
+    ワーカーを跨ぐ配信の代替：publish は何もせず、購読側が Event.version を
+    interval 秒ごとに PK 1本で確認して、変わっていれば {"type": "change"} を返す
+    （詳細はクライアントが changes?since=V で取り直す。初回は必ず1通返すので
+      購読開始までの取りこぼしも起きない：古い version はクライアント側で無視）
+    """
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+
+    def publish(self, channel: str, message: dict) -> None:
+        return None
+
+    def subscribe(self, channel: str, heartbeat: float = 25.0):
+        return self._poll(int(channel.split(":", 1)[1]), heartbeat)
+
+    async def _poll(self, event_id: int, heartbeat: float):
+        qs = Event.objects.filter(pk=event_id).values_list("version", flat=True)
+        last = None
+        idle = 0.0
+        while True:
+            version = await qs.afirst()
+            if version is None:
+                return
+            if version != last:
+                last = version
+                idle = 0.0
+                yield {"type": "change", "version": version}
+            elif idle >= heartbeat:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(self.interval)
+            idle += self.interval
+
+
+@lru_cache(maxsize=1)
+def get_broker():
+    return import_string(settings.TENNIS_PUBSUB_BACKEND)()
+
+
+def publish_event_change(event_id: int, kind: str, version: int, **data) -> None:
+    """
+    commit 後に配信（ロールバックされた変更は流さない）
+    """
+    message = {"type": kind, "version": version, **data}
+    transaction.on_commit(lambda: get_broker().publish(event_channel(event_id), message))
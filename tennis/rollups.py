@@ -0,0 +1,332 @@
+# tennis/rollups.py
+from django.db import models
+from django.db.models import Case, F, Q, Sum, Value, When
+
+from .models import (
+    EventParticipant,
+    MemberAttendanceMonth,
+    MatchSchedule,
+    MatchScore,
+    MatchupRelation,
+    MemberMatchup,
+)
+from .substitutions import effective_schedule
+
+MATCHUP_COUNTERS = ("matches", "wins", "losses", "draws", "games_for", "games_against")
+ATTENDANCE_COUNTERS = ("yes", "no", "maybe", "unset")
+
+
+# ============================================================
+# Generic counter bump（1 UPDATE で複数行を加算）
+# ============================================================
+
+
+def bump_counters(model, key_fields, deltas: dict, defaults: dict | None = None) -> None:
+    """
+    deltas: {(key values...): {counter: +n/-n}}
+    - 行が無ければ 0 で作成（ignore_conflicts なので並行作成でも落ちない）
+    - 加算は Case/When で 1 UPDATE にまとめる（行ごとに F() 更新しない）
+    """
+    deltas = {
+        k: {c: int(v) for c, v in d.items() if v}
+        for k, d in deltas.items()
+    }
+    deltas = {k: d for k, d in deltas.items() if d}
+    if not deltas:
+        return
+
+    defaults = defaults or {}
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, k)), **defaults) for k in deltas],
+        ignore_conflicts=True,
+    )
+
+    counters = sorted({c for d in deltas.values() for c in d})
+    conds = {k: Q(**dict(zip(key_fields, k))) for k in deltas}
+
+    updates = {}
+    for c in counters:
+        whens = [
+            When(conds[k], then=Value(d[c]))
+            for k, d in deltas.items()
+            if d.get(c)
+        ]
+        updates[c] = F(c) + Case(*whens, default=Value(0), output_field=models.IntegerField())
+
+    where = Q()
+    for q in conds.values():
+        where |= q
+    model.objects.filter(where).update(**updates)
+
+
+# ============================================================
+# Head-to-head / Partner index
+# ============================================================
+
+
+def _find_match_teams(schedule_json, round_no: int, court_no: int):
+    for r in (schedule_json or []):
+        if int(r.get("round") or 0) != int(round_no):
+            continue
+        for m in (r.get("matches") or []):
+            if int(m.get("court") or 0) == int(court_no):
+                return list(m.get("team1") or []), list(m.get("team2") or [])
+    return None
+
+
+def _is_counted(scores) -> bool:
+    return scores is not None and scores[0] is not None and scores[1] is not None
+
+
+def _add_result(acc: dict, key, gf: int, ga: int, sign: int) -> None:
+    d = acc.setdefault(key, dict.fromkeys(MATCHUP_COUNTERS, 0))
+    d["matches"] += sign
+    d["games_for"] += sign * gf
+    d["games_against"] += sign * ga
+    if gf > ga:
+        d["wins"] += sign
+    elif gf < ga:
+        d["losses"] += sign
+    else:
+        d["draws"] += sign
+
+
+def _accumulate_match(acc: dict, team1_members, team2_members, s1: int, s2: int, sign: int) -> None:
+    sides = (
+        (team1_members, team2_members, int(s1), int(s2)),
+        (team2_members, team1_members, int(s2), int(s1)),
+    )
+    for mine, theirs, gf, ga in sides:
+        for p in mine:
+            for q in mine:
+                if q != p:
+                    _add_result(acc, (p, q, MatchupRelation.PARTNER), gf, ga, sign)
+            for o in theirs:
+                _add_result(acc, (p, o, MatchupRelation.OPPONENT), gf, ga, sign)
+
+
+def _ep_member_map(ep_ids) -> dict:
+    ids = set()
+    for p in ep_ids:
+        if isinstance(p, int) or (isinstance(p, str) and p.isdigit()):
+            ids.add(int(p))
+    if not ids:
+        return {}
+    return dict(
+        EventParticipant.objects
+        .filter(id__in=ids, member__isnull=False)
+        .values_list("id", "member_id")
+    )
+
+
+def _members_of(team, ep_member: dict):
+    out = []
+    for p in team:
+        try:
+            mid = ep_member.get(int(p))
+        except (TypeError, ValueError):
+            mid = None
+        if mid is not None:
+            out.append(mid)
+    return out
+
+
+def apply_matchup_deltas(ms: MatchSchedule, changes, club_id: int | None = None, schedule=None) -> None:
+    """
+    changes: [(round_no, court_no, before(s1,s2)|None, after(s1,s2)|None), ...]
+    - before が確定済みなら差し引き、after が確定済みなら加算
+    - member の無い EP（旧データ）は集計対象外
+    - teams は代打反映後の対戦表（schedule 省略時は DB の現状態）で解決するので、差し替え前に呼ぶこと
+    """
+    changes = [
+        c for c in changes
+        if (_is_counted(c[2]) or _is_counted(c[3])) and c[2] != c[3]
+    ]
+    if not changes:
+        return
+
+    if schedule is None:
+        schedule = effective_schedule(ms)
+
+    teams_by_match = {}
+    ep_ids = []
+    for round_no, court_no, _b, _a in changes:
+        teams = _find_match_teams(schedule, round_no, court_no)
+        if teams:
+            teams_by_match[(round_no, court_no)] = teams
+            ep_ids.extend(teams[0])
+            ep_ids.extend(teams[1])
+
+    ep_member = _ep_member_map(ep_ids)
+
+    acc = {}
+    for round_no, court_no, before, after in changes:
+        teams = teams_by_match.get((round_no, court_no))
+        if not teams:
+            continue
+        t1 = _members_of(teams[0], ep_member)
+        t2 = _members_of(teams[1], ep_member)
+        if _is_counted(before):
+            _accumulate_match(acc, t1, t2, before[0], before[1], -1)
+        if _is_counted(after):
+            _accumulate_match(acc, t1, t2, after[0], after[1], +1)
+
+    bump_counters(
+        MemberMatchup,
+        ("member_id", "other_id", "relation"),
+        acc,
+        defaults={"club_id": club_id if club_id is not None else ms.event.club_id},
+    )
+
+
+def discard_matchup_scores(ms: MatchSchedule, score_qs=None, club_id: int | None = None, schedule=None) -> None:
+    """
+    スコア削除（再公開 force / 代打によるスコア破棄 / イベント削除）の直前に呼び、集計から差し引く
+    """
+    if score_qs is None:
+        score_qs = MatchScore.objects.filter(match_schedule=ms)
+    changes = [
+        (s.round_no, s.court_no, (s.side_a_score, s.side_b_score), None)
+        for s in score_qs
+    ]
+    apply_matchup_deltas(ms, changes, club_id=club_id, schedule=schedule)
+
+
+def rebuild_club_matchups(club) -> int:
+    """
+    公開済み対戦表＋スコアからクラブ分のインデックスを作り直す（初回バックフィル / 保険）
+    """
+    MemberMatchup.objects.filter(club=club).delete()
+
+    schedules = list(
+        MatchSchedule.objects
+        .filter(event__club=club, published=True)
+        .select_related("event")
+        .prefetch_related("substitutions")
+    )
+    for ms in schedules:
+        changes = [
+            (s.round_no, s.court_no, None, (s.side_a_score, s.side_b_score))
+            for s in MatchScore.objects.filter(match_schedule=ms)
+        ]
+        apply_matchup_deltas(ms, changes, club_id=club.id)
+
+    return MemberMatchup.objects.filter(club=club).count()
+
+
+def head_to_head_rows(club, relation: str, member_id: int | None = None):
+    """
+    マトリクス用：1クエリで (member, other) の成績を返す
+    """
+    qs = MemberMatchup.objects.filter(club=club, relation=relation, matches__gt=0)
+    if member_id is not None:
+        qs = qs.filter(member_id=member_id)
+    return (
+        qs.annotate(
+            member_name=F("member__display_name"),
+            other_name=F("other__display_name"),
+        )
+        .order_by("member__member_no", "other__member_no")
+        .values(
+            "member_id", "other_id", "member_name", "other_name",
+            *MATCHUP_COUNTERS,
+        )
+    )
+
+
+# ============================================================
+# Attendance rollup（member × 月）
+# ============================================================
+
+
+# track_attendance の before / after に渡す目印（EP 新規作成 / 削除）
+CREATED = object()
+DELETED = object()
+
+
+def _attendance_counter(value) -> str:
+    return value if value in ("yes", "no", "maybe") else "unset"
+
+
+def _month_of(d):
+    return d.replace(day=1)
+
+
+def track_attendance(event, changes) -> None:
+    """
+    changes: [(member_id, before, after), ...]
+    - before / after は attendance 値（None = 未設定）
+    - EP 新規作成は before=CREATED、削除は after=DELETED
+    """
+    acc = {}
+    month = _month_of(event.date)
+    for member_id, before, after in changes:
+        if member_id is None:
+            continue
+        d = acc.setdefault((member_id, month), dict.fromkeys(ATTENDANCE_COUNTERS, 0))
+        if before is not CREATED:
+            d[_attendance_counter(before)] -= 1
+        if after is not DELETED:
+            d[_attendance_counter(after)] += 1
+
+    bump_counters(
+        MemberAttendanceMonth,
+        ("member_id", "month"),
+        acc,
+        defaults={"club_id": event.club_id},
+    )
+
+
+def discard_event_attendance(event) -> None:
+    """
+    イベント削除の直前に呼び、そのイベントの EP 分を差し引く
+    """
+    track_attendance(event, [
+        (member_id, attendance, DELETED)
+        for member_id, attendance in (
+            EventParticipant.objects
+            .filter(event=event, member__isnull=False)
+            .values_list("member_id", "attendance")
+        )
+    ])
+
+
+def rebuild_club_attendance(club) -> int:
+    MemberAttendanceMonth.objects.filter(club=club).delete()
+
+    acc = {}
+    rows = (
+        EventParticipant.objects
+        .filter(event__club=club, member__isnull=False)
+        .values_list("member_id", "event__date", "attendance")
+    )
+    for member_id, d, attendance in rows:
+        c = acc.setdefault((member_id, _month_of(d)), dict.fromkeys(ATTENDANCE_COUNTERS, 0))
+        c[_attendance_counter(attendance)] += 1
+
+    MemberAttendanceMonth.objects.bulk_create([
+        MemberAttendanceMonth(club=club, member_id=member_id, month=month, **c)
+        for (member_id, month), c in acc.items()
+    ])
+    return len(acc)
+
+
+def attendance_rate_rows(club, first_month, last_month):
+    """
+    期間（月初日で指定）の member ごとの出欠件数（1クエリ・(club, month) インデックス）
+    """
+    return (
+        MemberAttendanceMonth.objects
+        .filter(club=club, month__gte=first_month, month__lte=last_month)
+        .values("member_id")
+        .annotate(
+            name=F("member__display_name"),
+            member_no=F("member__member_no"),
+            is_fixed=F("member__is_fixed"),
+            yes_n=Sum("yes"),
+            no_n=Sum("no"),
+            maybe_n=Sum("maybe"),
+            unset_n=Sum("unset"),
+        )
+        .order_by("member_no")
+    )
@@ -0,0 +1,100 @@
+# tennis/schedule_codec.py
+
+
+# ============================================================
+# 対戦表の保存形式（schedule_json / draft_json）
+# - v1: [{"round", "matches": [{"court", "team1", "team2", "score1", "score2"}], "rests"}]
+#       （画面 / 生成 / 集計が使う形。score1/score2 は常に null：スコアは MatchScore）
+# - v2: {"v": 2, "ts": チーム人数, "r": [[round, 試合数, 選手..., 休憩...], ...]}
+#       1ラウンド = int の平坦な配列。選手は試合順に team1 → team2、コートは 1..試合数
+#       game_type / court_count は MatchSchedule の列にあるのでここには持たない
+# - 読む側は decode_schedule（v1 / v2 どちらでも v1 形を返す）。
+#   v2 で表せないもの（名前文字列の旧データ・飛び番コート等）は v1 のまま保存する
+# ============================================================
+
+SCHEDULE_FORMAT_VERSION = 2
+
+_V1_ROUND_KEYS = {"round", "matches", "rests"}
+_V1_MATCH_KEYS = {"court", "team1", "team2", "score1", "score2"}
+
+
+def _is_ep_id(p) -> bool:
+    return isinstance(p, int) and not isinstance(p, bool)
+
+
+def _encode_round(r, team_size: int):
+    if not isinstance(r, dict) or set(r) - _V1_ROUND_KEYS or not _is_ep_id(r.get("round")):
+        return None
+    matches = r.get("matches") or []
+    rests = r.get("rests") or []
+    row = [r["round"], len(matches)]
+    for ci, m in enumerate(matches):
+        if not isinstance(m, dict) or set(m) - _V1_MATCH_KEYS:
+            return None
+        if m.get("court") != ci + 1 or m.get("score1") is not None or m.get("score2") is not None:
+            return None
+        for key in ("team1", "team2"):
+            team = m.get(key) or []
+            if len(team) != team_size or not all(_is_ep_id(p) for p in team):
+                return None
+            row.extend(team)
+    if not all(_is_ep_id(p) for p in rests):
+        return None
+    row.extend(rests)
+    return row
+
+
+def encode_schedule(schedule):
+    """
+    v1 → v2（表せなければ v1 のまま返す）
+    """
+    if not isinstance(schedule, list) or not schedule:
+        return schedule
+
+    team_size = 0
+    for r in schedule:
+        for m in ((r.get("matches") or []) if isinstance(r, dict) else []):
+            if isinstance(m, dict):
+                team_size = len(m.get("team1") or [])
+                break
+        if team_size:
+            break
+
+    rows = []
+    for r in schedule:
+        row = _encode_round(r, team_size)
+        if row is None:
+            return schedule
+        rows.append(row)
+    return {"v": SCHEDULE_FORMAT_VERSION, "ts": team_size, "r": rows}
+
+
+def decode_schedule(stored) -> list:
+    """
+    保存形式（v1 / v2 / None）→ v1 形
+    """
+    if stored is None:
+        return []
+    if not isinstance(stored, dict):
+        return stored
+    if stored.get("v") != SCHEDULE_FORMAT_VERSION:
+        raise ValueError(f"unknown schedule format: {stored.get('v')!r}")
+
+    team_size = int(stored.get("ts") or 0)
+    per_match = team_size * 2
+    out = []
+    for row in stored.get("r") or []:
+        round_no, n_matches = row[0], row[1]
+        pos = 2
+        matches = []
+        for ci in range(n_matches):
+            matches.append({
+                "court": ci + 1,
+                "team1": row[pos:pos + team_size],
+                "team2": row[pos + team_size:pos + per_match],
+                "score1": None,
+                "score2": None,
+            })
+            pos += per_match
+        out.append({"round": round_no, "matches": matches, "rests": row[pos:]})
+    return out
@@ -0,0 +1,118 @@
+# tennis/schedule_view.py
+
+
+# ============================================================
+# 対戦表の表示用ビューモデル（_schedule_block / _schedule_match / _schedule_rests 用）
+# - 対戦表 + スコア + 名前表から1パスで組み立てる（試合ごとの dict / list の作り直しをしない）
+# - 選手名は解決済み：テンプレートは p.name / p.ep_id を読むだけ（get_item フィルタを引かない）
+# - 選手セルは ep ごとに1個だけ作り、全ラウンドで共有する
+# - 番号・スコアは表示用の文字列で持つ：テンプレートが int を出すたびに
+#   数値ローカライズ（number_format）を通るのが描画時間の大半だったため
+# - JSON（event_state / changes）は従来どおり dict 形（_merge_scores_into_schedule）
+# ============================================================
+
+
+class _View:
+    """
+    テンプレートの変数解決は「添字 → 属性」の順に試すので、添字で即返す（例外を投げさせない）
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class PlayerCell(_View):
+    __slots__ = ("ep_id", "name")
+
+    def __init__(self, ep_id: str, name: str):
+        self.ep_id = ep_id
+        self.name = name
+
+
+class MatchView(_View):
+    __slots__ = ("court", "team1", "team2", "score1", "score2", "revision")
+
+    def __init__(self, court: str, team1: tuple, team2: tuple, score1, score2, revision: str):
+        self.court = court
+        self.team1 = team1
+        self.team2 = team2
+        self.score1 = score1
+        self.score2 = score2
+        self.revision = revision
+
+
+class RoundView(_View):
+    __slots__ = ("round", "matches", "rests")
+
+    def __init__(self, round_no: str, matches: list, rests: tuple):
+        self.round = round_no
+        self.matches = matches
+        self.rests = rests
+
+
+def _text(v):
+    return None if v is None else str(v)
+
+
+class PlayerCells:
+    """
+    ep_id（旧データは名前文字列）→ PlayerCell。名前表に無ければ ep_id をそのまま表示
+    """
+
+    __slots__ = ("_name_map", "_cells")
+
+    def __init__(self, name_map: dict | None):
+        self._name_map = name_map or {}
+        self._cells = {}
+
+    def __call__(self, p) -> PlayerCell:
+        cell = self._cells.get(p)
+        if cell is None:
+            cell = self._cells[p] = PlayerCell(str(p), self._name_map.get(p) or str(p))
+        return cell
+
+    def team(self, ps) -> tuple:
+        return tuple(map(self, ps or ()))
+
+
+def build_match_view(cells: PlayerCells, court_no: int, team1, team2,
+                     score=(None, None), revision: int = 0) -> MatchView:
+    return MatchView(
+        str(court_no), cells.team(team1), cells.team(team2),
+        _text(score[0]), _text(score[1]), str(revision),
+    )
+
+
+def build_round_view(round_no: int, matches: list, rests: tuple) -> RoundView:
+    return RoundView(str(round_no), matches, rests)
+
+
+def build_schedule_view(schedule, name_map: dict | None, score_map: dict | None = None,
+                        revisions: dict | None = None) -> list:
+    """
+    v1 形の対戦表 → [RoundView, ...]
+    - score_map: {(round_no, court_no): (a, b)} / revisions: {(round_no, court_no): revision}
+    - コート番号が無い試合は並び順（1始まり）
+    """
+    if not schedule:
+        return []
+
+    cells = PlayerCells(name_map)
+    score_map = score_map or {}
+    revisions = revisions or {}
+    no_score = (None, None)
+
+    out = []
+    for r in schedule:
+        round_no = int(r.get("round") or 0)
+        matches = []
+        for mi, m in enumerate(r.get("matches") or []):
+            key = (round_no, int(m.get("court") or (mi + 1)))
+            matches.append(build_match_view(
+                cells, key[1], m.get("team1"), m.get("team2"),
+                score_map.get(key, no_score), revisions.get(key, 0),
+            ))
+        out.append(build_round_view(round_no, matches, cells.team(r.get("rests"))))
+    return out
@@ -0,0 +1,347 @@
+# tennis/scoring.py
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MatchSchedule, MatchScore, ScoreSyncOp
+from .pubsub import publish_event_change
+from .rollups import apply_matchup_deltas
+from .versioning import bump_event_version
+
+
+# ============================================================
+# スコア書き込み（1マス保存 / ラウンド一括 共通）
+# - edits: [{"round_no", "court_no", "side": "a"|"b", "value": int|None,
+#            ("revision": int|None, "has_prev": bool, "prev": int|None, "ts": epoch ms)}, ...]
+# - 書いたマスは最終書き込み時刻（side_a_ts / side_b_ts）を max(既存, ts) に進める
+#   （同じ値の書き込みでも進める：後から届いたそれより古い op を後勝ちで弾くため）
+#   ts はオフライン op のクライアント時刻。無ければサーバ時刻（オンライン保存）
+# - ロック順は publish / 代打と同じ：MatchSchedule（locked 遷移時のみ）→ MatchScore → 集計 → Event
+#   Event（版の採番）を最後にして、別コートの保存が Event 行ロックで待つ区間を短くする
+# - locked / Event.version / 成績インデックス / SSE 通知は一括ごとに1回
+# ============================================================
+
+
+MAX_BATCH_SCORES = 400
+MAX_SYNC_OPS = 1000
+SCORE_MAX = 99
+
+
+class ScoreWriteError(ValueError):
+    def __init__(self, code: str, index: int | None = None, status: int = 400, **extra):
+        super().__init__(code)
+        self.code = code
+        self.index = index
+        self.status = status
+        self.extra = extra
+
+    def payload(self) -> dict:
+        out = {"ok": False, "error": self.code, **self.extra}
+        if self.index is not None:
+            out["index"] = self.index
+        return out
+
+
+def parse_score_value(raw):
+    """
+    空欄は None（クリア）、それ以外は 0..SCORE_MAX の整数
+    """
+    if raw is None:
+        return None
+    s = str(raw).strip()
+    if s == "":
+        return None
+    try:
+        v = int(s)
+    except ValueError:
+        raise ScoreWriteError("bad_score")
+    if v < 0 or v > SCORE_MAX:
+        raise ScoreWriteError("out_of_range")
+    return v
+
+
+def schedule_match_keys(schedule_json) -> set:
+    keys = set()
+    for r in (schedule_json or []):
+        if not isinstance(r, dict):
+            continue
+        round_no = int(r.get("round") or 0)
+        for mi, m in enumerate(r.get("matches") or []):
+            keys.add((round_no, int(m.get("court") or (mi + 1))))
+    return keys
+
+
+def now_ms() -> int:
+    return int(timezone.now().timestamp() * 1000)
+
+
+def _lock_scores(ms: MatchSchedule, keys: set) -> dict:
+    qs = MatchScore.objects.select_for_update().filter(
+        match_schedule=ms,
+        round_no__in={k[0] for k in keys},
+        court_no__in={k[1] for k in keys},
+    )
+    return {(s.round_no, s.court_no): s for s in qs if (s.round_no, s.court_no) in keys}
+
+
+def apply_score_edits(event, ms: MatchSchedule, edits: list) -> dict:
+    """
+    edits を順に適用（同じマスは後勝ち）。1件でも不正 / 食い違いがあれば何も書かない
+    → {"version", "scores": [MatchScore, ...]}（触った試合のみ）
+    """
+    valid = schedule_match_keys(ms.schedule)
+    for i, e in enumerate(edits):
+        if (e["round_no"], e["court_no"]) not in valid:
+            raise ScoreWriteError("no_match", i, status=404)
+    keys = {(e["round_no"], e["court_no"]) for e in edits}
+
+    with transaction.atomic():
+        # 1件でも入力されたら locked=True（初回だけ対戦表行を書く）
+        if (not ms.locked) and any(e["value"] is not None for e in edits):
+            MatchSchedule.objects.filter(pk=ms.pk, locked=False).update(
+                locked=True, updated_at=timezone.now(),
+            )
+
+        rows = _lock_scores(ms, keys)
+        missing = keys - set(rows)
+        if missing:
+            MatchScore.objects.bulk_create(
+                [MatchScore(match_schedule=ms, round_no=r, court_no=c) for r, c in missing],
+                ignore_conflicts=True,
+            )
+            rows.update(_lock_scores(ms, missing))
+
+        before = {k: (s.side_a_score, s.side_b_score) for k, s in rows.items()}
+        before_ts = {k: (s.side_a_ts, s.side_b_ts) for k, s in rows.items()}
+        read_revision = {k: s.revision for k, s in rows.items()}
+
+        # 読んだ後に同じマスを他の人が書き換えていたら上書きしない（もう片方のマスだけの変更は通す）
+        conflicts = []
+        for i, e in enumerate(edits):
+            k = (e["round_no"], e["court_no"])
+            if e.get("revision") is None or read_revision[k] == e["revision"]:
+                continue
+            current = before[k][0] if e["side"] == "a" else before[k][1]
+            if not e.get("has_prev") or current != e.get("prev"):
+                a, b = before[k]
+                conflicts.append({
+                    "index": i, "round_no": k[0], "court_no": k[1],
+                    "a": a, "b": b, "revision": read_revision[k],
+                })
+        if conflicts:
+            raise ScoreWriteError("conflict", status=409, conflicts=conflicts)
+
+        server_ts = now_ms()
+        for e in edits:
+            s = rows[(e["round_no"], e["court_no"])]
+            ts = e.get("ts", server_ts)
+            if e["side"] == "a":
+                s.side_a_ts = ts if s.side_a_ts is None else max(s.side_a_ts, ts)
+                s.side_a_score = e["value"]
+            else:
+                s.side_b_ts = ts if s.side_b_ts is None else max(s.side_b_ts, ts)
+                s.side_b_score = e["value"]
+
+        changed = [
+            s for k, s in sorted(rows.items())
+            if (s.side_a_score, s.side_b_score) != before[k] or k in missing
+        ]
+
+        # 値は同じで時刻だけ進んだマス：版・revision・通知は触らず ts だけ書く
+        changed_keys = {(s.round_no, s.court_no) for s in changed}
+        ts_only = [
+            s for k, s in sorted(rows.items())
+            if k not in changed_keys and (s.side_a_ts, s.side_b_ts) != before_ts[k]
+        ]
+        if ts_only:
+            MatchScore.objects.bulk_update(ts_only, ["side_a_ts", "side_b_ts"])
+
+        if not changed:
+            return {"version": None, "scores": [rows[k] for k in sorted(rows)]}
+
+        # 対戦/ペア成績インデックスを差分更新（1回の bump_counters）
+        # Event 行ロックより前：別コートの保存どうしは、版の採番〜コミットの間だけ直列になる
+        apply_matchup_deltas(
+            ms,
+            [
+                (s.round_no, s.court_no, before[(s.round_no, s.court_no)], (s.side_a_score, s.side_b_score))
+                for s in changed
+            ],
+            club_id=event.club_id,
+        )
+
+        # 版の採番（Event 行ロック）は最後
+        version = bump_event_version(event.id, scores=True)
+
+        # 読んだ後に代打/再公開で組み合わせが変わっていたら、古い組で集計しない
+        # （Event 行ロックの後に読む：同時の代打/再公開のコミットを待ってから確かめる。弾けば集計ごと巻き戻る）
+        schedule_version = (
+            MatchSchedule.objects.filter(pk=ms.pk).values_list("change_version", flat=True).first()
+        )
+        if schedule_version != ms.change_version:
+            raise ScoreWriteError("schedule_changed", status=409)
+
+        now = timezone.now()
+        for s in changed:
+            s.revision += 1
+            s.change_version = version
+            s.updated_at = now
+        # 1文 upsert（pk を持たせると主キー側の衝突になるので、キーと値だけの行で送る）
+        MatchScore.objects.bulk_create(
+            [
+                MatchScore(
+                    match_schedule_id=ms.id, round_no=s.round_no, court_no=s.court_no,
+                    side_a_score=s.side_a_score, side_b_score=s.side_b_score,
+                    side_a_ts=s.side_a_ts, side_b_ts=s.side_b_ts,
+                    revision=s.revision, change_version=version, updated_at=now,
+                )
+                for s in changed
+            ],
+            update_conflicts=True,
+            unique_fields=["match_schedule", "round_no", "court_no"],
+            update_fields=[
+                "side_a_score", "side_b_score", "side_a_ts", "side_b_ts",
+                "revision", "change_version", "updated_at",
+            ],
+        )
+
+        publish_event_change(
+            event.id, "score", version,
+            scores=[
+                {"round_no": s.round_no, "court_no": s.court_no,
+                 "a": s.side_a_score, "b": s.side_b_score, "revision": s.revision}
+                for s in changed
+            ],
+        )
+
+    return {"version": version, "scores": [rows[k] for k in sorted(rows)]}
+
+
+# ============================================================
+# オフライン入力の同期（クライアント採番の op ログ）
+# - ops: [{"op_id", "ts"(epoch ms), "round_no", "court_no", "side", "value"}, ...]
+# - op_id で重複排除（再送しても同じ結果）、マス（round/court/side）ごとに ts の後勝ち
+#   比べる相手は MatchScore のマスごとの最終書き込み時刻（オンライン保存も含む）
+# - 書き込み自体は apply_score_edits に1回で渡す（locked / 版 / 集計 / 通知は1回）
+# ============================================================
+
+
+def _as_positive_int(raw, index: int, min_v: int = 1) -> int:
+    if isinstance(raw, bool):
+        raise ScoreWriteError("bad_number", index)
+    try:
+        v = int(raw)
+    except (TypeError, ValueError):
+        raise ScoreWriteError("bad_number", index)
+    if v < min_v:
+        raise ScoreWriteError("bad_number", index)
+    return v
+
+
+def parse_score_ops(raw) -> list:
+    if not isinstance(raw, list) or not raw:
+        raise ScoreWriteError("bad_ops")
+    if len(raw) > MAX_SYNC_OPS:
+        raise ScoreWriteError("too_many_ops")
+
+    ops = []
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise ScoreWriteError("bad_op", i)
+        op_id = item.get("op_id")
+        if not isinstance(op_id, str) or not op_id.strip() or len(op_id) > 64:
+            raise ScoreWriteError("bad_op_id", i)
+        side = item.get("side")
+        if side not in ("a", "b"):
+            raise ScoreWriteError("bad_side", i)
+        try:
+            value = parse_score_value(item.get("value"))
+        except ScoreWriteError as e:
+            raise ScoreWriteError(e.code, i)
+        ops.append({
+            "op_id": op_id.strip(),
+            "ts": _as_positive_int(item.get("ts"), i, min_v=0),
+            "round_no": _as_positive_int(item.get("round_no"), i),
+            "court_no": _as_positive_int(item.get("court_no"), i),
+            "side": side,
+            "value": value,
+        })
+    return ops
+
+
+def sync_score_ops(event, ms: MatchSchedule, ops: list) -> dict:
+    """
+    → {"version", "applied", "duplicate", "stale", "rejected"（op_id のリスト）, "scores": [MatchScore, ...]}
+    - duplicate: 以前の同期で受け付け済み（または同じ送信内で2回目）
+    - stale: 同じマスが、より新しい時刻に（オンライン保存 / 別の op で）書き込み済み
+    - rejected: 公開中の対戦表に無い試合宛て（再送で何度も弾かないよう記録だけする）
+    """
+    with transaction.atomic():
+        # 同じ対戦表への同期は直列に（対戦表行はロック順の先頭なので、他の書き込みとも順序が揃う）
+        ms = MatchSchedule.objects.select_for_update().get(pk=ms.pk)
+
+        seen = set(
+            ScoreSyncOp.objects
+            .filter(match_schedule=ms, op_id__in={o["op_id"] for o in ops})
+            .values_list("op_id", flat=True)
+        )
+        duplicate, fresh = [], []
+        for o in ops:
+            if o["op_id"] in seen:
+                duplicate.append(o["op_id"])
+                continue
+            seen.add(o["op_id"])
+            fresh.append(o)
+
+        valid = schedule_match_keys(ms.schedule)
+        rejected = [o for o in fresh if (o["round_no"], o["court_no"]) not in valid]
+        candidates = [o for o in fresh if (o["round_no"], o["court_no"]) in valid]
+
+        # マスごとの最終書き込み時刻：スコア行をロックして読む（適用まで他の保存を待たせる）
+        latest = {}
+        if candidates:
+            for (r, c), s in _lock_scores(ms, {(o["round_no"], o["court_no"]) for o in candidates}).items():
+                latest[(r, c, "a")] = s.side_a_ts
+                latest[(r, c, "b")] = s.side_b_ts
+
+        # ts 順に適用（同じ ts は送信順）。同じマスは最後の1件だけ書けば結果は同じ
+        applied, stale, winners = [], [], {}
+        for o in sorted(candidates, key=lambda o: o["ts"]):
+            cell = (o["round_no"], o["court_no"], o["side"])
+            if latest.get(cell) is not None and o["ts"] < latest[cell]:
+                stale.append(o["op_id"])
+                continue
+            applied.append(o["op_id"])
+            winners[cell] = o
+
+        version = None
+        if winners:
+            result = apply_score_edits(event, ms, [
+                {"round_no": o["round_no"], "court_no": o["court_no"], "side": o["side"],
+                 "value": o["value"], "ts": o["ts"]}
+                for o in winners.values()
+            ])
+            version = result["version"]
+
+        applied_ids = set(applied)
+        ScoreSyncOp.objects.bulk_create(
+            [
+                ScoreSyncOp(
+                    match_schedule=ms, op_id=o["op_id"],
+                    round_no=o["round_no"], court_no=o["court_no"], side=o["side"],
+                    client_ts=o["ts"], applied=o["op_id"] in applied_ids,
+                )
+                for o in fresh
+            ],
+            ignore_conflicts=True,
+        )
+
+        scores = list(MatchScore.objects.filter(match_schedule=ms))
+
+    return {
+        "version": version,
+        "applied": applied,
+        "duplicate": duplicate,
+        "stale": stale,
+        "rejected": [o["op_id"] for o in rejected],
+        "scores": scores,
+    }
@@ -0,0 +1,138 @@
+# tennis/slots.py
+from dataclasses import dataclass
+
+from .models import EventParticipant, MatchSlot
+from .substitutions import effective_schedule
+
+
+# ============================================================
+# MatchSlot（代打反映後の対戦表の正規化コピー）
+# ============================================================
+
+
+def _as_ep_id(p):
+    if isinstance(p, bool):
+        return None
+    if isinstance(p, int):
+        return p
+    if isinstance(p, str) and p.isdigit():
+        return int(p)
+    return None  # 旧形式（名前文字列）は正規化対象外
+
+
+def iter_schedule_slots(schedule_json, round_nos=None):
+    """
+    schedule_json → (round_no, court_no, team, slot_index, ep_id)
+    - court_no/team = 0 は休憩
+    """
+    for r in (schedule_json or []):
+        if not isinstance(r, dict):
+            continue
+        round_no = int(r.get("round") or 0)
+        if round_nos is not None and round_no not in round_nos:
+            continue
+        for mi, m in enumerate(r.get("matches") or []):
+            court_no = int(m.get("court") or (mi + 1))
+            for team, key in ((1, "team1"), (2, "team2")):
+                for si, p in enumerate(m.get(key) or []):
+                    ep_id = _as_ep_id(p)
+                    if ep_id is not None:
+                        yield round_no, court_no, team, si, ep_id
+        for si, p in enumerate(r.get("rests") or []):
+            ep_id = _as_ep_id(p)
+            if ep_id is not None:
+                yield round_no, 0, 0, si, ep_id
+
+
+def count_schedule_players(schedule_json) -> int:
+    """
+    対戦表に出てくる選手の延べ数（試合 + 休憩。ep_id かどうかは問わない）
+    """
+    n = 0
+    for r in (schedule_json or []):
+        if not isinstance(r, dict):
+            continue
+        for m in (r.get("matches") or []):
+            n += len(m.get("team1") or []) + len(m.get("team2") or [])
+        n += len(r.get("rests") or [])
+    return n
+
+
+def sync_match_slots(ms, round_nos=None, schedule=None) -> int:
+    """
+    代打反映後の対戦表（schedule_json + Substitution）で MatchSlot を作り直す
+    - round_nos 指定時はそのラウンドだけ（代打）
+    - schedule: 呼び出し側で組み立て済みなら渡す（Substitution を読み直さない）
+    - イベント外の ep_id は捨てる（POST フォールバック公開の保険）
+    - 全体同期では MatchSlot にできなかった選手の有無を ms.has_legacy_players に書く
+      （代打はイベント内の EP を入れ替えるだけなので、ラウンド単位の同期では変わらない）
+    """
+    round_nos = set(int(x) for x in round_nos) if round_nos is not None else None
+
+    if schedule is None:
+        schedule = effective_schedule(ms)
+    rows = list(iter_schedule_slots(schedule, round_nos))
+    valid = set(
+        EventParticipant.objects
+        .filter(event_id=ms.event_id, id__in={r[4] for r in rows})
+        .values_list("id", flat=True)
+    ) if rows else set()
+
+    qs = MatchSlot.objects.filter(match_schedule=ms)
+    if round_nos is not None:
+        qs = qs.filter(round_no__in=round_nos)
+    qs.delete()
+
+    MatchSlot.objects.bulk_create([
+        MatchSlot(
+            match_schedule=ms,
+            round_no=round_no,
+            court_no=court_no,
+            team=team,
+            slot_index=si,
+            event_participant_id=ep_id,
+        )
+        for round_no, court_no, team, si, ep_id in rows
+        if ep_id in valid
+    ])
+
+    if round_nos is None:
+        has_legacy = count_schedule_players(schedule) != sum(1 for r in rows if r[4] in valid)
+        if ms.has_legacy_players != has_legacy:
+            ms.has_legacy_players = has_legacy
+            type(ms).objects.filter(pk=ms.pk).update(has_legacy_players=has_legacy)
+    return len(rows)
+
+
+# ============================================================
+# 1ラウンド分の位置索引（代打：位置 → ep / ep → 位置 を O(1) で引く）
+# ============================================================
+
+
+@dataclass
+class RoundSlots:
+    round_no: int
+    by_pos: dict  # {(court_no, team, slot_index): MatchSlot}
+    by_ep: dict   # {ep_id: MatchSlot}
+
+    def teams(self, court_no: int) -> tuple:
+        t = {1: [], 2: []}
+        for (c, team, _si), s in sorted(self.by_pos.items()):
+            if c == court_no and team in t:
+                t[team].append(s.event_participant_id)
+        return t[1], t[2]
+
+    def rests(self) -> list:
+        return [s.event_participant_id for (c, _t, _si), s in sorted(self.by_pos.items()) if c == 0]
+
+
+def load_round_slots(ms, round_no: int) -> RoundSlots:
+    """
+    (match_schedule, round_no) インデックスで1クエリ（JSON は開かない）
+    """
+    rows = list(MatchSlot.objects.filter(match_schedule=ms, round_no=round_no))
+    return RoundSlots(
+        round_no=round_no,
+        by_pos={(s.court_no, s.team, s.slot_index): s for s in rows},
+        by_ep={s.event_participant_id: s for s in rows},
+    )
@@ -0,0 +1,178 @@
+# tennis/snapshot.py
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from .models import (
+    ClubFlagDefinition,
+    Event,
+    EventParticipant,
+    MatchSchedule,
+    MatchScore,
+    Member,
+    ParticipantFlag,
+)
+
+
+# ============================================================
+# Event snapshot（event_view / API 共通の一括ローダ）
+# - EventParticipant はイベント分を1回だけ読み、固定行/ゲスト行/代打候補/人数/名前表を
+#   メモリ上で組み立てる（同じ EP 行を何度も引き直さない）
+# ============================================================
+
+
+def ep_display_name(ep: EventParticipant) -> str:
+    if ep.member_id and ep.member:
+        return ep.member.display_name
+    return ep.display_name or ""
+
+
+@dataclass
+class EventSnapshot:
+    event: Event
+    flags: list
+    fixed_members: list
+    participants: list
+    flag_values: list
+    match_schedule: MatchSchedule | None
+    score_map: dict = field(default_factory=dict)
+    score_revisions: dict = field(default_factory=dict)
+
+    # ---- derived（すべてメモリ上） ----
+
+    @property
+    def fixed_member_ids(self) -> set:
+        return {m.id for m in self.fixed_members}
+
+    @property
+    def eps_by_member(self) -> dict:
+        return {ep.member_id: ep for ep in self.participants if ep.member_id is not None}
+
+    @property
+    def fixed_rows(self) -> list:
+        eps_by_member = self.eps_by_member
+        rows = []
+        for m in self.fixed_members:
+            ep = eps_by_member.get(m.id)
+            rows.append(
+                {
+                    "member_id": m.id,
+                    "ep_id": ep.id if ep else None,
+                    "display_name": ep_display_name(ep) if ep else m.display_name,
+                    "attendance": ep.attendance if ep else None,
+                    "comment": ep.comment if ep else "",
+                    "participates_match": bool(ep.participates_match) if ep else False,
+                }
+            )
+        return rows
+
+    @property
+    def guest_rows(self) -> list:
+        # 固定メンバー以外はゲスト枠へ（非固定メンバー・member なし含む）
+        fixed_ids = self.fixed_member_ids
+        return [
+            {
+                "ep_id": ep.id,
+                "member_id": ep.member_id,  # None の可能性あり
+                "display_name": ep_display_name(ep),
+                "attendance": ep.attendance,
+                "comment": ep.comment or "",
+                "participates_match": bool(ep.participates_match),
+            }
+            for ep in self.participants
+            if ep.member_id not in fixed_ids
+        ]
+
+    @property
+    def sub_candidates(self) -> list:
+        # 代打候補（仕様：attendance=yes のみ / participates_match は無視）
+        return [
+            {"ep_id": ep.id, "name": ep_display_name(ep) or str(ep.id)}
+            for ep in self.participants
+            if ep.attendance == "yes"
+        ]
+
+    @property
+    def match_count(self) -> int:
+        return sum(1 for ep in self.participants if ep.participates_match)
+
+    @property
+    def name_map(self) -> dict:
+        return build_name_map(self.participants)
+
+    @property
+    def flag_states(self):
+        flag_states_on = defaultdict(dict)
+        flag_states_val = defaultdict(dict)
+        for pf in self.flag_values:
+            ep_id = pf["event_participant_id"]
+            fd_id = pf["flag_definition_id"]
+            flag_states_on[ep_id][fd_id] = bool(pf["is_on"])
+            flag_states_val[ep_id][fd_id] = pf["value"]  # None or int
+        return (
+            {k: dict(v) for k, v in flag_states_on.items()},
+            {k: dict(v) for k, v in flag_states_val.items()},
+        )
+
+
+def build_name_map(participants) -> dict:
+    m = {}
+    for ep in participants:
+        name = ep_display_name(ep)
+        if ep.id is not None:
+            m[int(ep.id)] = name
+        if name:
+            m[str(name)] = name  # 互換キー
+    return m
+
+
+def load_event_snapshot(event: Event, *, with_scores: bool = True) -> EventSnapshot:
+    """
+    クエリ：flags / 固定メンバー / EP(+member) / フラグ状態 / 公開済み対戦表 / スコア（公開時のみ）
+    - event を select_related("match_schedule") 済みで渡せば対戦表の1本は省ける
+    """
+    club_id = event.club_id
+
+    flags = list(
+        ClubFlagDefinition.objects.filter(club_id=club_id, is_active=True)
+        .order_by("display_order", "id")
+    )
+    fixed_members = list(
+        Member.objects.filter(club_id=club_id, is_fixed=True)
+        .order_by("member_no", "id")
+    )
+    participants = list(
+        EventParticipant.objects.filter(event=event)
+        .select_related("member")
+        .order_by("id")
+    )
+    flag_values = list(
+        ParticipantFlag.objects.filter(
+            event_participant__event=event,
+            flag_definition__club_id=club_id,
+        ).values("event_participant_id", "flag_definition_id", "is_on", "value")
+    )
+
+    try:
+        ms = event.match_schedule
+    except MatchSchedule.DoesNotExist:
+        ms = None
+    if ms is not None and not ms.published:
+        ms = None
+
+    score_map = {}
+    score_revisions = {}
+    if ms is not None and with_scores:
+        for s in MatchScore.objects.filter(match_schedule=ms):
+            score_map[(int(s.round_no), int(s.court_no))] = (s.side_a_score, s.side_b_score)
+            score_revisions[(int(s.round_no), int(s.court_no))] = s.revision
+
+    return EventSnapshot(
+        event=event,
+        flags=flags,
+        fixed_members=fixed_members,
+        participants=participants,
+        flag_values=flag_values,
+        match_schedule=ms,
+        score_map=score_map,
+        score_revisions=score_revisions,
+    )
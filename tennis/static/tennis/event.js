@@ -222,6 +222,8 @@
       addGuest: participantsTable.dataset.addGuestUrl,
       publish: participantsTable.dataset.publishUrl,
       saveScore: participantsTable.dataset.saveScoreUrl,
+      syncScores: participantsTable.dataset.syncScoresUrl,
+      eventState: participantsTable.dataset.eventStateUrl,
     };
 
 
@@ -306,6 +308,28 @@
     }
 
 
+    function setAttendanceButton(btn, attendance) {
+      let html = `<span class="attendance-icon attendance-none">&nbsp;</span>`;
+      if (attendance === "yes")
+        html = `<span class="attendance-icon attendance-yes">✓</span>`;
+      else if (attendance === "no")
+        html = `<span class="attendance-icon attendance-no">×</span>`;
+      else if (attendance === "maybe")
+        html = `<span class="attendance-icon attendance-maybe">?</span>`;
+
+      btn.innerHTML = html;
+      btn.dataset.attendance = attendance; // "" のままでもOK
+    }
+
+    function setCheckButton(btn, on) {
+      btn.classList.toggle("is-on", on);
+      const icon = btn.querySelector(".check-icon");
+      if (icon) {
+        icon.classList.toggle("check-on", on);
+        icon.classList.toggle("check-off", !on);
+      }
+    }
+
     function setMatchVisible(row, visible) {
       if (!row) return;
       const btn = row.querySelector(".match-toggle");
@@ -410,50 +434,52 @@
     // ============================================================
     // [COMMON] コメント保存（blur + debounce）
     // ============================================================
-    if (urls.updateComment) {
-      qsa(".comment-editable", participantsTable).forEach((div) => {
-        let timer = null;
-        let lastSent = null;
-
-        const post = async () => {
-          const row = getRowFromEl(div);
-          const ids = getIdsFromEl(div);
-          const comment = (div.textContent || "").trim();
-          const key = `${ids.epId || ids.memberId}:${comment}`;
-          if (key === lastSent) return;
+    // ★行追加（ゲスト）時にも同じハンドラを付けられるよう関数化
+    function bindCommentEditable(div) {
+      if (!urls.updateComment) return;
+      let timer = null;
+      let lastSent = null;
+
+      const post = async () => {
+        const row = getRowFromEl(div);
+        const ids = getIdsFromEl(div);
+        const comment = (div.textContent || "").trim();
+        const key = `${ids.epId || ids.memberId}:${comment}`;
+        if (key === lastSent) return;
 
-          const fd = new FormData();
-          fd.append("event_id", eventId);
-          appendParticipant(fd, ids, row);
-          fd.append("comment", comment);
+        const fd = new FormData();
+        fd.append("event_id", eventId);
+        appendParticipant(fd, ids, row);
+        fd.append("comment", comment);
 
-          lastSent = key;
+        lastSent = key;
 
-          try {
-            const r = await fetch(urls.updateComment, {
-              method: "POST",
-              headers: { "X-CSRFToken": csrftoken },
-              body: fd,
-            });
-            const data = await r.json().catch(() => ({}));
-            if (!r.ok || !data.ok) {
-              lastSent = null;
-              return;
-            }
-            if (data.ep_id) applyEpIdToRow(row, data.ep_id);
-          } catch {
+        try {
+          const r = await fetch(urls.updateComment, {
+            method: "POST",
+            headers: { "X-CSRFToken": csrftoken },
+            body: fd,
+          });
+          const data = await r.json().catch(() => ({}));
+          if (!r.ok || !data.ok) {
             lastSent = null;
+            return;
           }
-        };
+          if (data.ep_id) applyEpIdToRow(row, data.ep_id);
+        } catch {
+          lastSent = null;
+        }
+      };
 
-        div.addEventListener("blur", post);
-        div.addEventListener("input", () => {
-          if (timer) clearTimeout(timer);
-          timer = setTimeout(post, 600);
-        });
+      div.addEventListener("blur", post);
+      div.addEventListener("input", () => {
+        if (timer) clearTimeout(timer);
+        timer = setTimeout(post, 600);
       });
     }
 
+    qsa(".comment-editable", participantsTable).forEach(bindCommentEditable);
+
     // ============================================================
     // [COMMON] フラグON/OFF（保存）
     // ============================================================
@@ -512,73 +538,73 @@
       });
     }
 
-    if (urls.setFlagValue) {
-      qsa('.flag-digit-input[data-input-mode="digit"]', participantsTable)
-        .forEach((input) => {
-        let lastSent = null;
+    function bindFlagDigitInput(input) {
+      if (!urls.setFlagValue) return;
+      let lastSent = null;
 
-        const normalize = (v) => {
-          const s = String(v || "").trim();
-          if (s === "") return "";
-          if (!/^\d$/.test(s)) return "";
-          return s;
-        };
+      const normalize = (v) => {
+        const s = String(v || "").trim();
+        if (s === "") return "";
+        if (!/^\d$/.test(s)) return "";
+        return s;
+      };
 
-        const post = async () => {
-          const row = getRowFromEl(input);
-          const ids = getIdsFromEl(input);
-          const flagId = (input.dataset.flagId || "").trim();
-          if (!flagId) return;
+      const post = async () => {
+        const row = getRowFromEl(input);
+        const ids = getIdsFromEl(input);
+        const flagId = (input.dataset.flagId || "").trim();
+        if (!flagId) return;
 
-          const v = normalize(input.value);
-          input.value = v;
+        const v = normalize(input.value);
+        input.value = v;
 
-          const key = `${ids.epId || ids.memberId}:${flagId}:${v}`;
-          if (key === lastSent) return;
-          lastSent = key;
+        const key = `${ids.epId || ids.memberId}:${flagId}:${v}`;
+        if (key === lastSent) return;
+        lastSent = key;
 
-          const fd = new FormData();
-          fd.append("event_id", eventId);
-          appendParticipant(fd, ids, row);
-          fd.append("flag_id", flagId);
-          fd.append("value", v); // "" = クリア
+        const fd = new FormData();
+        fd.append("event_id", eventId);
+        appendParticipant(fd, ids, row);
+        fd.append("flag_id", flagId);
+        fd.append("value", v); // "" = クリア
 
-          const adminToken = participantsTable.dataset.adminToken;
-          if (adminToken) fd.append("admin_token", adminToken);
+        const adminToken = participantsTable.dataset.adminToken;
+        if (adminToken) fd.append("admin_token", adminToken);
 
-          try {
-            const r = await fetch(urls.setFlagValue, {
-              method: "POST",
-              headers: { "X-CSRFToken": csrftoken },
-              body: fd,
-            });
-            const data = await r.json().catch(() => ({}));
-            if (!r.ok || !data.ok) throw new Error("not ok");
-            if (data.ep_id) applyEpIdToRow(row, data.ep_id);
-          } catch (e) {
-            console.error(e);
-            lastSent = null;
-            safeShowMessage("フラグ更新に失敗しました", 2600);
-          }
-        };
+        try {
+          const r = await fetch(urls.setFlagValue, {
+            method: "POST",
+            headers: { "X-CSRFToken": csrftoken },
+            body: fd,
+          });
+          const data = await r.json().catch(() => ({}));
+          if (!r.ok || !data.ok) throw new Error("not ok");
+          if (data.ep_id) applyEpIdToRow(row, data.ep_id);
+        } catch (e) {
+          console.error(e);
+          lastSent = null;
+          safeShowMessage("フラグ更新に失敗しました", 2600);
+        }
+      };
 
-        input.addEventListener("input", () => {
-          input.value = normalize(input.value).slice(0, 1);
-        });
-        input.addEventListener("blur", post);
-        input.addEventListener("keydown", (ev) => {
-          if (ev.key === "Enter") {
-            ev.preventDefault();
-            input.blur();
-          } else if (ev.key === "Escape") {
-            ev.preventDefault();
-            input.value = "";
-            input.blur();
-          }
-        });
+      input.addEventListener("input", () => {
+        input.value = normalize(input.value).slice(0, 1);
+      });
+      input.addEventListener("blur", post);
+      input.addEventListener("keydown", (ev) => {
+        if (ev.key === "Enter") {
+          ev.preventDefault();
+          input.blur();
+        } else if (ev.key === "Escape") {
+          ev.preventDefault();
+          input.value = "";
+          input.blur();
+        }
       });
     }
 
+    qsa('.flag-digit-input[data-input-mode="digit"]', participantsTable).forEach(bindFlagDigitInput);
+
 
     // ============================================================
     // [COMMON] 出欠モーダル + 保存（admin/public 共通）
@@ -664,16 +690,7 @@
 
               if (data.ep_id) applyEpIdToRow(row, data.ep_id);
 
-              let html = `<span class="attendance-icon attendance-none">&nbsp;</span>`;
-              if (attendance === "yes")
-                html = `<span class="attendance-icon attendance-yes">✓</span>`;
-              else if (attendance === "no")
-                html = `<span class="attendance-icon attendance-no">×</span>`;
-              else if (attendance === "maybe")
-                html = `<span class="attendance-icon attendance-maybe">?</span>`;
-
-              currentBtn.innerHTML = html;
-              currentBtn.dataset.attendance = attendance; // "" のままでもOK
+              setAttendanceButton(currentBtn, attendance);
 
               if (isAdmin) {
                 const willShowMatch = attendance === "yes";
@@ -698,6 +715,211 @@
       }
     }
 
+    // ============================================================
+    // [COMMON] 状態 JSON から行を追加（他端末で追加された分もまとめて反映）
+    //  - <template id="guest-row-template"> を複製して ep_id / 名前を埋める
+    // ============================================================
+    function buildGuestRow(row) {
+      const tpl = document.getElementById("guest-row-template");
+      const tr = tpl?.content?.querySelector("tr.participant-row")?.cloneNode(true);
+      if (!tr) return null;
+
+      const epId = String(row.ep_id ?? "");
+      const memberId = String(row.member_id ?? "");
+      tr.setAttribute("data-member-id", memberId);
+      qsa("[data-member-id]", tr).forEach((n) => n.setAttribute("data-member-id", memberId));
+      applyEpIdToRow(tr, epId);
+
+      const nameEl = tr.querySelector(".tb-player-card-sm");
+      if (nameEl) nameEl.textContent = row.name || "";
+
+      const comment = tr.querySelector(".comment-editable");
+      if (comment) comment.textContent = row.comment || "";
+
+      Object.entries(row.flags || {}).forEach(([flagId, v]) => {
+        const digit = tr.querySelector(`.flag-digit-input[data-flag-id="${flagId}"]`);
+        if (digit) {
+          digit.value = String(v);
+          return;
+        }
+        const btn = tr.querySelector(`.toggle-check[data-flag-id="${flagId}"]`);
+        btn?.classList.add("is-on");
+        btn?.querySelector(".check-icon")?.classList.replace("check-off", "check-on");
+      });
+
+      qsa(".comment-editable", tr).forEach(bindCommentEditable);
+      qsa('.flag-digit-input[data-input-mode="digit"]', tr).forEach(bindFlagDigitInput);
+      return tr;
+    }
+
+    async function refreshGuestRowsFromState() {
+      if (!urls.eventState) {
+        window.location.reload();
+        return;
+      }
+      const r = await fetch(urls.eventState, { headers: { Accept: "application/json" } });
+      const state = await r.json().catch(() => ({}));
+      if (!r.ok || !state.ok) throw new Error("state not ok");
+
+      const tbody = participantsTable.querySelector("tbody");
+      const known = new Set(
+        qsa("tr.participant-row", participantsTable).map((tr) => String(tr.dataset.epId || ""))
+      );
+      let added = 0;
+      (state.rows || []).forEach((row) => {
+        if (row.kind !== "guest" || known.has(String(row.ep_id))) return;
+        const tr = buildGuestRow(row);
+        if (!tr || !tbody) return;
+        tr.dataset.origIndex = String(tbody.children.length);
+        tbody.appendChild(tr);
+        added += 1;
+      });
+
+      if (added) {
+        document.querySelector(".participant-empty")?.remove();
+        sortParticipantsByAttendance();
+      }
+    }
+
+    // ============================================================
+    // [COMMON] 差分同期（他の端末の出欠/フラグ/スコアを反映）
+    //  - changes?since=V を定期的に引く。変化なしは version を読むだけ
+    //  - 全量（名前/フラグ定義の変更）や対戦表の作り直しは再読込に任せる
+    // ============================================================
+    const changesUrl = (participantsTable.dataset.eventChangesUrl || "").trim();
+    let syncVersion = (participantsTable.dataset.stateVersion || "").trim();
+    let syncClubVersion = (participantsTable.dataset.clubVersion || "").trim();
+    const SYNC_INTERVAL_MS = 15000;
+
+    function isEditing(el) {
+      return !!el && (el === document.activeElement || el.contains(document.activeElement));
+    }
+
+    function findRow(p) {
+      let tr = participantsTable.querySelector(`tr.participant-row[data-ep-id="${p.ep_id}"]`);
+      if (!tr && p.member_id) {
+        // 固定メンバーの未登録行（ep_id 空）→ 他端末で EP が作られた
+        tr = participantsTable.querySelector(
+          `tr.participant-row[data-ep-id=""][data-member-id="${p.member_id}"]`
+        );
+        if (tr) applyEpIdToRow(tr, p.ep_id);
+      }
+      return tr;
+    }
+
+    function applyParticipantDelta(p) {
+      let tr = findRow(p);
+      if (!tr) {
+        if (p.kind !== "guest") return false;
+        const tbody = participantsTable.querySelector("tbody");
+        tr = buildGuestRow(p);
+        if (!tr || !tbody) return false;
+        tr.dataset.origIndex = String(tbody.children.length);
+        tbody.appendChild(tr);
+        document.querySelector(".participant-empty")?.remove();
+      }
+
+      const nameEl = tr.querySelector(".tb-player-card-sm");
+      if (nameEl) nameEl.textContent = p.name || "";
+
+      const attBtn = tr.querySelector(".attendance-btn");
+      if (attBtn) setAttendanceButton(attBtn, p.attendance || "");
+
+      const matchBtn = tr.querySelector('.toggle-check[data-kind="match"]');
+      if (matchBtn) {
+        setCheckButton(matchBtn, !!p.match);
+        setMatchVisible(tr, p.attendance === "yes");
+      }
+
+      const comment = tr.querySelector(".comment-editable");
+      if (comment && !isEditing(comment)) comment.textContent = p.comment || "";
+      return true;
+    }
+
+    function applyFlagDelta(f) {
+      const sel = `[data-ep-id="${f.ep_id}"][data-flag-id="${f.flag_id}"]`;
+      const digit = participantsTable.querySelector(`.flag-digit-input${sel}`);
+      if (digit) {
+        if (!isEditing(digit)) digit.value = f.value === null ? "" : String(f.value);
+        return;
+      }
+      const btn = participantsTable.querySelector(`.toggle-check${sel}`);
+      if (btn) setCheckButton(btn, !!f.on);
+    }
+
+    function applyScoreDelta(sc) {
+      let editing = false;
+      [["a", sc.a], ["b", sc.b]].forEach(([side, v]) => {
+        const el = document.querySelector(
+          `.tb-score[data-round-no="${sc.round_no}"][data-court-no="${sc.court_no}"][data-side="${side}"]`
+        );
+        if (!el) return;
+        if (el.querySelector("input")) editing = true;
+        else el.textContent = v === null ? "-" : String(v);
+      });
+      // 入力中の試合は revision を進めない（保存時に食い違いとして検出させる）
+      const area = document.querySelector(
+        `.tb-score[data-round-no="${sc.round_no}"][data-court-no="${sc.court_no}"]`
+      )?.closest(".tb-score-area");
+      if (area && !editing && sc.revision !== undefined) area.dataset.revision = String(sc.revision);
+    }
+
+    async function pollChanges() {
+      if (!changesUrl || document.visibilityState !== "visible") return;
+
+      const q = new URLSearchParams({ since: syncVersion, club_version: syncClubVersion });
+      const r = await fetch(`${changesUrl}?${q}`, { headers: { Accept: "application/json" } });
+      const data = await r.json().catch(() => ({}));
+      if (!r.ok || !data.ok || !data.changed) return;
+
+      if (data.full || data.schedule) {
+        // 構造ごと変わった：入力中でなければページを取り直す
+        if (!document.querySelector(".comment-editable:focus, input:focus")) window.location.reload();
+        return;
+      }
+
+      (data.participants || []).forEach(applyParticipantDelta);
+      (data.flags || []).forEach(applyFlagDelta);
+      (data.scores || []).forEach(applyScoreDelta);
+      if ((data.participants || []).length) {
+        sortParticipantsByAttendance();
+        if (isAdmin) updateSettingsPillsLive();
+      }
+
+      syncVersion = String(data.version);
+      syncClubVersion = String(data.club_version);
+    }
+
+    // SSE：スコア/代打/出欠は push で即時に取りに行く。接続中はポーリングを 1/4 に間引く
+    const streamUrl = (participantsTable.dataset.eventStreamUrl || "").trim();
+    let streamOpen = false;
+    let pollTick = 0;
+
+    function syncNow() {
+      pollChanges().catch((e) => console.warn("[sync] failed", e));
+    }
+
+    if (changesUrl && syncVersion) {
+      if (streamUrl && window.EventSource) {
+        const es = new EventSource(streamUrl);
+        es.onopen = () => { streamOpen = true; };
+        es.onerror = () => { streamOpen = false; }; // 再接続はブラウザ任せ（retry: 3000）
+        ["score", "attendance", "substitute", "change"].forEach((kind) => {
+          es.addEventListener(kind, (ev) => {
+            let msg = {};
+            try { msg = JSON.parse(ev.data || "{}"); } catch { return; }
+            if (Number(msg.version || 0) > Number(syncVersion || 0)) syncNow();
+          });
+        });
+      }
+
+      setInterval(() => {
+        pollTick += 1;
+        if (streamOpen && pollTick % 4 !== 0) return;
+        syncNow();
+      }, SYNC_INTERVAL_MS);
+    }
+
     // ============================================================
     // [COMMON] 参加登録（モーダルで名前入力 → 保存）
     // ============================================================
@@ -769,7 +991,8 @@
             if (!r.ok || !data.ok) throw new Error("not ok");
 
             close();
-            window.location.reload();
+            // ★ページ再読込はしない：状態 JSON を引いて足りない行だけ追加
+            await refreshGuestRowsFromState();
           } catch (err) {
             console.error(err);
             safeShowMessage("参加登録に失敗しました", 2600);
@@ -897,6 +1120,65 @@
       return ids;
     }
 
+    // 生成 / 案の切り替え 共通：対戦表・pill・公開用 JSON・案の表を差し替える
+    function applyDraftResponse(data) {
+      const scheduleArea2 = document.getElementById("schedule-area");
+      const statsArea2 = document.getElementById("stats-area");
+      if (scheduleArea2 && typeof data.schedule_html === "string") scheduleArea2.innerHTML = data.schedule_html;
+      if (statsArea2 && typeof data.stats_html === "string") statsArea2.innerHTML = data.stats_html;
+
+      // ===== ★追加：publish 用 JSON をDOMに保存 =====
+      if (typeof data.schedule_json === "string" && data.schedule_json.trim()) {
+        let st = document.getElementById("current-schedule-json");
+        if (!st) {
+          st = document.createElement("script");
+          st.id = "current-schedule-json";
+          st.type = "application/json";
+          document.body.appendChild(st);
+        }
+        st.textContent = data.schedule_json;
+        // 公開時に「この画面で生成した Draft」を指定するための世代トークン
+        st.dataset.draftGeneration = data.draft_generation || "";
+      }
+
+      renderDraftVariants(data.variants_html);
+
+      // ★成功したら「生成済み」にする（ここが肝）
+      hasScheduleEverGenerated = true;
+
+      // ★初回生成直後：公開ボタンを有効化
+      //  - 既に published なら changed（再公開）へ
+      //  - それ以外は ready（公開可能）へ
+      const cur = getPublishState();
+      if (cur === "published") setPublishStateUI("changed");
+      else setPublishStateUI("ready");
+
+      const pillGameType = document.getElementById("pill-game-type");
+      const pillNumCourts = document.getElementById("pill-num-courts");
+      const pillMatchCount = document.getElementById("pill-match-count");
+      const pillNumRounds = document.getElementById("pill-num-rounds");
+
+      if (pillGameType && data.game_type) {
+        pillGameType.classList.remove("pill-singles", "pill-doubles");
+        if (data.game_type === "singles") {
+          pillGameType.classList.add("pill-singles");
+          pillGameType.textContent = "シングルス";
+        } else {
+          pillGameType.classList.add("pill-doubles");
+          pillGameType.textContent = "ダブルス";
+        }
+      }
+      if (pillNumCourts && data.num_courts !== undefined) pillNumCourts.textContent = `${data.num_courts} 面`;
+      if (pillMatchCount && data.match_count !== undefined) pillMatchCount.textContent = `${data.match_count} 人`;
+      if (pillNumRounds && data.num_rounds !== undefined) pillNumRounds.textContent = `${data.num_rounds} ラウンド`;
+
+      const modalCountPill = document.querySelector("#match-settings-modal .count-pill");
+      if (modalCountPill && data.match_count !== undefined) modalCountPill.textContent = String(data.match_count);
+
+      markChangedIfPublishedExists();
+      syncCourtsLimitByCurrentState();
+    }
+
     async function ajaxGenerateSchedule(force = false) {
       // ★初回生成前は「手動（force=true）」以外は生成しない
       if (!force && !hasScheduleEverGenerated) return;
@@ -925,58 +1207,7 @@
           return;
         }
 
-        const scheduleArea2 = document.getElementById("schedule-area");
-        const statsArea2 = document.getElementById("stats-area");
-        if (scheduleArea2 && typeof data.schedule_html === "string") scheduleArea2.innerHTML = data.schedule_html;
-        if (statsArea2 && typeof data.stats_html === "string") statsArea2.innerHTML = data.stats_html;
-
-        // ===== ★追加：publish 用 JSON をDOMに保存 =====
-        if (typeof data.schedule_json === "string" && data.schedule_json.trim()) {
-          let st = document.getElementById("current-schedule-json");
-          if (!st) {
-            st = document.createElement("script");
-            st.id = "current-schedule-json";
-            st.type = "application/json";
-            document.body.appendChild(st);
-          }
-          st.textContent = data.schedule_json;
-        }
-
-
-        // ★成功したら「生成済み」にする（ここが肝）
-        hasScheduleEverGenerated = true;
-
-        // ★初回生成直後：公開ボタンを有効化
-        //  - 既に published なら changed（再公開）へ
-        //  - それ以外は ready（公開可能）へ
-        const cur = getPublishState();
-        if (cur === "published") setPublishStateUI("changed");
-        else setPublishStateUI("ready");
-
-        const pillGameType = document.getElementById("pill-game-type");
-        const pillNumCourts = document.getElementById("pill-num-courts");
-        const pillMatchCount = document.getElementById("pill-match-count");
-        const pillNumRounds = document.getElementById("pill-num-rounds");
-
-        if (pillGameType && data.game_type) {
-          pillGameType.classList.remove("pill-singles", "pill-doubles");
-          if (data.game_type === "singles") {
-            pillGameType.classList.add("pill-singles");
-            pillGameType.textContent = "シングルス";
-          } else {
-            pillGameType.classList.add("pill-doubles");
-            pillGameType.textContent = "ダブルス";
-          }
-        }
-        if (pillNumCourts && data.num_courts !== undefined) pillNumCourts.textContent = `${data.num_courts} 面`;
-        if (pillMatchCount && data.match_count !== undefined) pillMatchCount.textContent = `${data.match_count} 人`;
-        if (pillNumRounds && data.num_rounds !== undefined) pillNumRounds.textContent = `${data.num_rounds} ラウンド`;
-
-        const modalCountPill = document.querySelector("#match-settings-modal .count-pill");
-        if (modalCountPill && data.match_count !== undefined) modalCountPill.textContent = String(data.match_count);
-
-        markChangedIfPublishedExists();
-        syncCourtsLimitByCurrentState();
+        applyDraftResponse(data);
       } catch (err) {
         console.error(err);
         safeShowMessage("対戦表の再生成に失敗しました（ネットワーク）", 2600);
@@ -1142,6 +1373,79 @@
     //  - iOS 対策：click ではなく pointerup/touchend を優先して
     //    “1タップでテンキー” を出す
     // ============================================================
+    // ============================================================
+    // [COMMON] スコアのオフライン送信キュー
+    //  - 送信がネットワークで失敗したら op（op_id / ts 付き）を localStorage に貯める
+    //  - online 復帰 / 画面復帰 / 読み込み時に sync_scores へまとめて送る（op_id で冪等）
+    // ============================================================
+    const scoreQueueKey = `tb-score-ops:${eventId}`;
+
+    function loadScoreQueue() {
+      try {
+        const q = JSON.parse(localStorage.getItem(scoreQueueKey) || "[]");
+        return Array.isArray(q) ? q : [];
+      } catch {
+        return [];
+      }
+    }
+
+    function storeScoreQueue(q) {
+      try {
+        if (q.length) localStorage.setItem(scoreQueueKey, JSON.stringify(q));
+        else localStorage.removeItem(scoreQueueKey);
+      } catch {}
+    }
+
+    function queueScoreOp(roundNo, courtNo, side, value) {
+      const q = loadScoreQueue();
+      q.push({
+        op_id: window.crypto?.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`,
+        ts: Date.now(),
+        round_no: Number(roundNo),
+        court_no: Number(courtNo),
+        side,
+        value: value === "" ? null : Number(value),
+      });
+      storeScoreQueue(q);
+    }
+
+    let scoreFlushing = false;
+    async function flushScoreQueue() {
+      const syncUrl = (urls.syncScores || "").trim();
+      const ops = loadScoreQueue();
+      if (!syncUrl || !ops.length || scoreFlushing || !csrftoken || navigator.onLine === false) return;
+
+      scoreFlushing = true;
+      try {
+        const fd = new FormData();
+        fd.append("event_id", eventId);
+        fd.append("ops", JSON.stringify(ops));
+        const r = await fetch(syncUrl, { method: "POST", headers: { "X-CSRFToken": csrftoken }, body: fd });
+        const data = await r.json().catch(() => ({}));
+        if (!r.ok || !data.ok) {
+          // 対戦表が無くなった / 壊れた op：送り直しても通らないので捨てる
+          if (r.status === 400 || r.status === 409) storeScoreQueue([]);
+          return;
+        }
+
+        // 送信中に積まれた分は残す
+        const done = new Set([...data.applied, ...data.duplicate, ...data.stale, ...data.rejected]);
+        storeScoreQueue(loadScoreQueue().filter((op) => !done.has(op.op_id)));
+        (data.scores || []).forEach(applyScoreDelta);
+        if (data.applied.length) safeShowMessage("オフライン中のスコアを送信しました", 2200);
+      } catch {
+        // まだ繋がらない：次の機会に
+      } finally {
+        scoreFlushing = false;
+      }
+    }
+
+    window.addEventListener("online", () => flushScoreQueue());
+    document.addEventListener("visibilitychange", () => {
+      if (document.visibilityState === "visible") flushScoreQueue();
+    });
+    flushScoreQueue();
+
     if (urls.saveScore) {
       const isIOS = /iP(hone|od|ad)/.test(navigator.userAgent);
 
@@ -1258,6 +1562,13 @@
             fd.append("score_value", nextVal);
             fd.append("team_no", side === "a" ? "1" : "2");
 
+            // 楽観的排他：読んだ revision と、編集前に見えていた値
+            const area = scoreSpan.closest(".tb-score-area");
+            if (area && area.dataset.revision !== undefined) {
+              fd.append("revision", area.dataset.revision);
+              fd.append("prev", currentValue);
+            }
+
             const r = await fetch(saveUrl, {
               method: "POST",
               headers: { "X-CSRFToken": csrftoken },
@@ -1265,6 +1576,12 @@
             });
 
             const data = await r.json().catch(() => ({}));
+            if (r.status === 409 && data.error === "conflict") {
+              // 他の人が先に同じマスを更新：最新値を表示して入力し直してもらう
+              applyScoreDelta({ round_no: roundNo, court_no: courtNo, a: data.a, b: data.b, revision: data.revision });
+              safeShowMessage("他の人が先にスコアを更新しました（最新の値を表示）", 3000);
+              return;
+            }
             if (!r.ok || !data.ok) {
               console.error("save_score failed:", r.status, data);
               safeShowMessage("スコア保存に失敗しました", 2600);
@@ -1274,8 +1591,15 @@
 
             if (data.value !== undefined) renderSpan(data.value);
             if (data.score !== undefined) renderSpan(data.score);
+            if (area && data.revision !== undefined) area.dataset.revision = String(data.revision);
           } catch (err) {
             console.error(err);
+            if (urls.syncScores) {
+              // 電波が無い：表示はそのまま、復帰後にまとめて送る
+              queueScoreOp(roundNo, courtNo, side, nextVal);
+              safeShowMessage("オフラインのため後で送信します", 2600);
+              return;
+            }
             safeShowMessage("スコア保存に失敗しました（ネットワーク）", 2600);
             renderSpan(currentValue);
           }
@@ -1332,6 +1656,7 @@
         const fd = new FormData();
         fd.append("event_id", eventId);
         fd.append("schedule_json", scheduleJson);
+        fd.append("draft_generation", scriptTag.dataset.draftGeneration || "");
         if (force) fd.append("force", "1");
 
         const r = await fetch(publishUrl, {
@@ -1343,6 +1668,11 @@
         return { r, data };
       };
 
+      runPublish(postPublish);
+    };
+
+    // 公開の共通フロー（スコアがあれば確認してから force で再送）
+    function runPublish(postPublish) {
       const applyPublishedUI = () => {
         setPublishStateUI("published");
         window.hasShownChangedNotice = false;
@@ -1393,7 +1723,69 @@
           safeShowMessage("公開に失敗しました（ネットワーク）。", 2600);
         }
       })();
-    };
+    }
+
+    // ============================================================
+    // [ADMIN] 生成した案の見比べ（表示の切り替え / 案を指定して公開）
+    //  - 案はセッションごとにサーバ側で保持（直近数件）。再読み込み後も表を出す
+    // ============================================================
+    function renderDraftVariants(html) {
+      const box = document.getElementById("draft-variants");
+      if (box && typeof html === "string") box.innerHTML = html;
+    }
+
+    const draftVariants = document.getElementById("draft-variants");
+    if (draftVariants) {
+      draftVariants.addEventListener("click", async (e) => {
+        const showBtn = e.target.closest(".js-draft-show");
+        if (showBtn) {
+          try {
+            const r = await fetch(showBtn.dataset.url, { credentials: "same-origin" });
+            const data = await r.json().catch(() => ({}));
+            if (!r.ok || data.error) {
+              safeShowMessage("この案はもう残っていません。再生成してください。", 2600);
+              console.error(data);
+              return;
+            }
+            applyDraftResponse(data);
+          } catch (err) {
+            console.error(err);
+            safeShowMessage("案の切り替えに失敗しました（ネットワーク）", 2600);
+          }
+          return;
+        }
+
+        const publishBtn = e.target.closest(".js-draft-publish");
+        if (publishBtn) {
+          const publishDraftUrl = (draftVariants.dataset.publishDraftUrl || "").trim();
+          if (!publishDraftUrl) return;
+          runPublish(async (force) => {
+            const fd = new FormData();
+            fd.append("event_id", eventId);
+            fd.append("draft_id", publishBtn.dataset.draftId || "");
+            if (force) fd.append("force", "1");
+
+            const r = await fetch(publishDraftUrl, {
+              method: "POST",
+              headers: { "X-CSRFToken": csrftoken },
+              body: fd,
+            });
+            const data = await r.json().catch(() => ({}));
+            return { r, data };
+          });
+        }
+      });
+
+      const draftsUrl = (draftVariants.dataset.draftsUrl || "").trim();
+      if (draftsUrl) {
+        fetch(draftsUrl, { credentials: "same-origin" })
+          .then((r) => r.json())
+          .then((data) => {
+            if (data && data.ok) renderDraftVariants(data.variants_html);
+          })
+          .catch(() => {});
+      }
+    }
 
     // ============================================================
     // [ADMIN] イベントメタ編集：club-event-modal を流用（完成版 / 修正版）
@@ -1900,17 +2292,37 @@
         });
 
         const data = await r.json().catch(() => ({}));
+        if (r.status === 409 && data.error === "slot_changed") {
+          // 他の端末が先に代打した：最新の対戦表を取り直す
+          safeShowMessage("他の人が先に代打を設定しました（最新の対戦表を表示）", 2600);
+          closeSub();
+          window.location.reload();
+          return;
+        }
         if (!r.ok || !data.ok) {
           console.error("substitute failed:", r.status, data);
           safeShowMessage("代打の反映に失敗しました", 2600);
           return;
         }
 
-        // schedule 差し替え
+        // 変わった試合（最大2つ）と休憩行だけ差し替え。見つからなければ全体を取り直す
         const scheduleArea = document.getElementById("schedule-area");
-        if (scheduleArea && typeof data.schedule_html === "string") {
-          scheduleArea.innerHTML = data.schedule_html;
+        const replaceNode = (selector, html) => {
+          const node = scheduleArea?.querySelector(selector);
+          if (!node) return false;
+          node.outerHTML = html;
+          return true;
+        };
+        let replaced = true;
+        (data.matches || []).forEach((m) => {
+          replaced = replaceNode(
+            `.tb-court-row[data-round-no="${data.round_no}"][data-court-no="${m.court_no}"]`, m.html
+          ) && replaced;
+        });
+        if (typeof data.rests_html === "string") {
+          replaced = replaceNode(`.tb-rest-row[data-round-no="${data.round_no}"]`, data.rests_html) && replaced;
         }
+        if (!replaced) window.location.reload();
 
         // 公開済み対戦表が変更された（幹事なら再公開導線へ）
         if (isAdmin) markChangedIfPublishedExists();
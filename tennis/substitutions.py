@@ -0,0 +1,127 @@
+# tennis/substitutions.py
+from .models import Substitution
+
+
+# ============================================================
+# 代打オーバーレイ（公開済み schedule_json は書き換えない）
+# - Substitution 1行 = そのラウンドでの置換 original → substitute（ラウンドごとに順列）
+# - 元の対戦表で original がいた位置に substitute が入る
+# - 元のラウンドにいない original（外から入った代打に押し出された人）は休憩の末尾へ
+#   （仮想の休憩位置。並びは行の作成順）
+# - 代打1回 = 順列に互換（old ⇔ new）を合成するだけ → 変わるのは最大2行
+# ============================================================
+
+
+def _as_ep_id(p):
+    if isinstance(p, bool):
+        return None
+    if isinstance(p, int):
+        return p
+    if isinstance(p, str) and p.isdigit():
+        return int(p)
+    return None
+
+
+def load_overlay(ms) -> dict:
+    """
+    → {round_no: {original_id: substitute_id}}
+    - ms.substitutions を prefetch_related 済みなら追加クエリなし
+    """
+    overlay = {}
+    for s in sorted(ms.substitutions.all(), key=lambda s: s.id):
+        overlay.setdefault(int(s.round_no), {})[s.original_participant_id] = s.substitute_participant_id
+    return overlay
+
+
+def load_round_overlay(ms, round_no: int) -> dict:
+    """
+    → {original_id: substitute_id}（1ラウンド分・作成順）
+    """
+    return dict(
+        Substitution.objects
+        .filter(match_schedule=ms, round_no=round_no)
+        .order_by("id")
+        .values_list("original_participant_id", "substitute_participant_id")
+    )
+
+
+def _apply_round(r: dict, perm: dict) -> dict:
+    seen = set()
+
+    def sub(p):
+        ep_id = _as_ep_id(p)
+        if ep_id is None:
+            return p
+        seen.add(ep_id)
+        return perm.get(ep_id, p)
+
+    matches = [
+        {
+            **m,
+            "team1": [sub(p) for p in (m.get("team1") or [])],
+            "team2": [sub(p) for p in (m.get("team2") or [])],
+        }
+        for m in (r.get("matches") or [])
+    ]
+    rests = [sub(p) for p in (r.get("rests") or [])]
+    rests += [new for orig, new in perm.items() if orig not in seen]
+    return {**r, "matches": matches, "rests": rests}
+
+
+def apply_overlay(schedule_json, overlay: dict):
+    """
+    代打の無いラウンドは元の dict をそのまま返す（コピーは代打のあるラウンドだけ）
+    """
+    if not overlay:
+        return schedule_json
+    out = []
+    for r in (schedule_json or []):
+        perm = overlay.get(int(r.get("round") or 0)) if isinstance(r, dict) else None
+        out.append(_apply_round(r, perm) if perm else r)
+    return out
+
+
+def effective_schedule(ms):
+    """
+    表示 / 集計 / MatchSlot が使う「代打反映後」の対戦表
+    """
+    return apply_overlay(ms.schedule, load_overlay(ms))
+
+
+def compose_swap(perm: dict, old_ep_id: int, new_ep_id: int) -> dict:
+    """
+    いま old が見えている位置に new を入れる（new がラウンド内にいれば old と入れ替え、
+    いなければ old は休憩へ）。恒等（original == substitute）は含めない
+    """
+    inverse = {v: k for k, v in perm.items()}
+    x = inverse.get(old_ep_id, old_ep_id)
+    y = inverse.get(new_ep_id, new_ep_id)
+    out = dict(perm)
+    out[x] = new_ep_id
+    out[y] = old_ep_id
+    return {k: v for k, v in out.items() if k != v}
+
+
+def save_round_overlay(ms, round_no: int, before: dict, after: dict) -> None:
+    """
+    変わった行だけ upsert / 恒等に戻った行は削除
+    """
+    changed = {k: v for k, v in after.items() if before.get(k) != v}
+    if changed:
+        Substitution.objects.bulk_create(
+            [
+                Substitution(
+                    match_schedule=ms, round_no=round_no,
+                    original_participant_id=k, substitute_participant_id=v,
+                )
+                for k, v in changed.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["match_schedule", "round_no", "original_participant"],
+            update_fields=["substitute_participant", "updated_at"],
+        )
+    removed = [k for k in before if k not in after]
+    if removed:
+        Substitution.objects.filter(
+            match_schedule=ms, round_no=round_no, original_participant_id__in=removed,
+        ).delete()
@@ -1,3 +1,1739 @@
-from django.test import TestCase
+import asyncio
+import datetime as dt
+import json
+import random
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (
+    Club,
+    ClubFlagDefinition,
+    Event,
+    EventParticipant,
+    GameType,
+    MatchSchedule,
+    MatchScheduleDraft,
+    MatchScore,
+    Member,
+    MemberAttendanceMonth,
+    MemberMatchup,
+    MatchSlot,
+    ParticipantFlag,
+    ScoreSyncOp,
+    Substitution,
+    schedule_content_digest,
+)
+from .drafts import MAX_DRAFT_VARIANTS, CacheDraftStore, get_draft_store, new_draft
+from .pubsub import InProcessBroker, event_channel
+from .rollups import rebuild_club_attendance, rebuild_club_matchups
+from .schedule_codec import decode_schedule, encode_schedule
+from .schedule_view import build_schedule_view
+from .slots import sync_match_slots
+from .substitutions import effective_schedule
+from .utils import generate_doubles_schedule, generate_singles_schedule, schedule_fairness
+from .views import PROFILE_PAGE_SIZE, _compute_publish_state, build_month_ranking, build_month_ranking_sql
+
+
+# テストでは collectstatic しないので manifest 無しの storage で描画する
+PLAIN_STATIC = override_settings(STORAGES={
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+})
+
+
+def make_club_with_members(n: int = 8, name: str = "club"):
+    club = Club.objects.create(name=name)
+    members = [
+        Member.objects.create(club=club, display_name=f"m{i:02d}", member_no=i + 1, is_fixed=True)
+        for i in range(n)
+    ]
+    return club, members
+
+
+def make_event(club, members, date=dt.date(2026, 10, 1), guests=()):
+    event = Event.objects.create(club=club, date=date, title="練習")
+    eps = [
+        EventParticipant.objects.create(
+            event=event, member=m, display_name=m.display_name,
+            attendance="yes", participates_match=True,
+        )
+        for m in members
+    ]
+    for g in guests:
+        eps.append(EventParticipant.objects.create(
+            event=event, member=None, display_name=g,
+            attendance="yes", participates_match=True,
+        ))
+    return event, eps
+
+
+def publish(event, eps, game_type=GameType.DOUBLES, rounds=6, courts=2, rng=None):
+    ep_ids = [ep.id for ep in eps]
+    if game_type == GameType.SINGLES:
+        schedule = generate_singles_schedule(ep_ids, rounds, courts)
+    else:
+        schedule = generate_doubles_schedule(ep_ids, rounds, courts)
+    ms = MatchSchedule.objects.create(
+        event=event,
+        schedule=schedule,
+        game_type=game_type,
+        court_count=courts,
+        round_count=rounds,
+        published=True,
+    )
+    sync_match_slots(ms)
+
+    rng = rng or random.Random(0)
+    for r in schedule:
+        for m in r["matches"]:
+            # 一部は未入力 / 片側のみ入力で残す（集計対象外）
+            roll = rng.random()
+            a = rng.randint(0, 6) if roll > 0.1 else None
+            b = rng.randint(0, 6) if roll > 0.2 else None
+            MatchScore.objects.create(
+                match_schedule=ms, round_no=r["round"], court_no=m["court"],
+                side_a_score=a, side_b_score=b,
+            )
+    return ms
+
+
+class MonthRankingSqlTests(TestCase):
+    """
+    build_month_ranking_sql（DB集計 + ROW_NUMBER() の順位付け）を Python 版（オラクル）と突き合わせる
+    """
+
+    def setUp(self):
+        random.seed(1234)
+        rng = random.Random(42)
+        self.club, members = make_club_with_members(10)
+        for day in (3, 10, 17):
+            event, eps = make_event(
+                self.club, members[: 8 + day % 3],
+                date=dt.date(2026, 10, day),
+                guests=("ゲストA",) if day == 10 else (),
+            )
+            publish(event, eps, GameType.DOUBLES, rounds=6, courts=2, rng=rng)
+        event, eps = make_event(self.club, members[:5], date=dt.date(2026, 10, 24))
+        publish(event, eps, GameType.SINGLES, rounds=5, courts=2, rng=rng)
+
+    def _assert_same(self, game_type, min_matches):
+        events = Event.objects.filter(club=self.club)
+        expected = build_month_ranking(events, game_type, min_matches)
+        actual = build_month_ranking_sql(events, game_type, min_matches)
+
+        self.assertEqual(expected["ranked"], actual["ranked"])
+        key = lambda r: r["name"]
+        self.assertEqual(sorted(expected["others"], key=key), sorted(actual["others"], key=key))
+
+    def test_doubles_matches_python_ranking(self):
+        self._assert_same(GameType.DOUBLES, 3)
+
+    def test_singles_matches_python_ranking(self):
+        self._assert_same(GameType.SINGLES, 3)
+
+    def test_min_matches_split(self):
+        self._assert_same(GameType.DOUBLES, 12)
+
+    def test_query_count_is_constant(self):
+        # 集計1 + 旧形式の対戦表の有無1（旧形式が無ければ JSON は開かない）
+        events = Event.objects.filter(club=self.club)
+        with self.assertNumQueries(2):
+            build_month_ranking_sql(events, GameType.DOUBLES)
+
+    def test_empty_month(self):
+        events = Event.objects.filter(club=self.club, date__year=2000)
+        self.assertEqual(build_month_ranking_sql(events, GameType.DOUBLES), {"ranked": [], "others": []})
+
+
+class MonthRankingParityTests(TestCase):
+    """
+    SQL 版と Python 版の端の一致：同率の並び / 率の丸め（x.x5）/ 旧形式（名前文字列）の対戦表 / 空白だけのゲスト名
+    """
+
+    def setUp(self):
+        self.club, self.members = make_club_with_members(4)
+        Member.objects.filter(pk__in=[m.pk for m in self.members[:2]]).update(display_name="同名")
+        self.event, self.eps = make_event(self.club, self.members, date=dt.date(2026, 10, 5))
+
+    def _publish(self, schedule, scores):
+        ms = MatchSchedule.objects.create(
+            event=self.event, schedule=schedule, game_type=GameType.SINGLES,
+            court_count=2, round_count=len(schedule), published=True,
+        )
+        sync_match_slots(ms)
+        for (r, c), (a, b) in scores.items():
+            MatchScore.objects.create(match_schedule=ms, round_no=r, court_no=c, side_a_score=a, side_b_score=b)
+        return ms
+
+    def _assert_same(self):
+        events = Event.objects.filter(club=self.club)
+        expected = build_month_ranking(events, GameType.SINGLES, 1)
+        actual = build_month_ranking_sql(events, GameType.SINGLES, 1)
+        self.assertEqual(expected["ranked"], actual["ranked"])
+        self.assertEqual([r["rank"] for r in actual["ranked"]], list(range(1, len(actual["ranked"]) + 1)))
+        return actual["ranked"]
+
+    def test_full_ties_break_by_member_id(self):
+        a, b, c, d = (ep.id for ep in self.eps)
+        schedule = [
+            {"round": r, "matches": [
+                {"court": 1, "team1": [a], "team2": [c]},
+                {"court": 2, "team1": [b], "team2": [d]},
+            ], "rests": []}
+            for r in (1, 2, 3)
+        ]
+        scores = {}
+        for r, score in zip((1, 2, 3), ((6, 3), (2, 6), (6, 4))):
+            scores[(r, 1)] = scores[(r, 2)] = score
+        ms = self._publish(schedule, scores)
+        self.assertFalse(ms.has_legacy_players)
+
+        ranked = self._assert_same()
+        same_name = [r["member_id"] for r in ranked if r["name"] == "同名"]
+        self.assertEqual(same_name, sorted(m.id for m in self.members[:2]))
+
+    def test_pct_rounds_like_python(self):
+        a, b, c, d = (ep.id for ep in self.eps)
+        self._publish(
+            [{"round": 1, "matches": [
+                {"court": 1, "team1": [a], "team2": [c]},
+                {"court": 2, "team1": [b], "team2": [d]},
+            ], "rests": []}],
+            {(1, 1): (1, 15), (1, 2): (15, 1)},
+        )
+        ranked = self._assert_same()
+        # 6.25 / 93.75 は Python の round では 6.2 / 93.8
+        self.assertEqual(sorted(r["gp_pct"] for r in ranked), [6.2, 6.2, 93.8, 93.8])
+
+    def test_legacy_name_entries_are_counted(self):
+        a, b, c, d = (ep.id for ep in self.eps)
+        ms = self._publish(
+            [
+                {"round": 1, "matches": [
+                    {"court": 1, "team1": [a], "team2": ["旧メンバー"]},
+                    {"court": 2, "team1": [b], "team2": [c]},
+                ], "rests": [d]},
+                {"round": 2, "matches": [
+                    {"court": 1, "team1": ["旧メンバー"], "team2": [d]},
+                    {"court": 2, "team1": [a], "team2": [b]},
+                ], "rests": [c]},
+            ],
+            {(1, 1): (6, 2), (1, 2): (3, 6), (2, 1): (6, 6), (2, 2): (1, 6)},
+        )
+        self.assertTrue(MatchSchedule.objects.get(pk=ms.pk).has_legacy_players)
+
+        ranked = self._assert_same()
+        legacy = next(r for r in ranked if r["name"] == "旧メンバー")
+        self.assertEqual((legacy["matches"], legacy["draws"], legacy["losses"]), (2, 1, 1))
+
+    def test_blank_guest_name_falls_back_to_guest_id(self):
+        a, b = (ep.id for ep in self.eps[:2])
+        guest = EventParticipant.objects.create(
+            event=self.event, member=None, display_name="   ",
+            attendance="yes", participates_match=True,
+        )
+        self._publish(
+            [{"round": 1, "matches": [
+                {"court": 1, "team1": [a], "team2": [guest.id]},
+                {"court": 2, "team1": [b], "team2": [self.eps[2].id]},
+            ], "rests": []}],
+            {(1, 1): (2, 6), (1, 2): (6, 1)},
+        )
+        ranked = self._assert_same()
+        self.assertIn(f"Guest#{guest.id}", [r["name"] for r in ranked])
+
+
+@PLAIN_STATIC
+class MemberProfileTests(TestCase):
+    """
+    個人ページの keyset ページング：(event_date, event_id) で漏れ・重複なく辿れる
+    """
+
+    def setUp(self):
+        self.club, members = make_club_with_members(1)
+        self.member = members[0]
+        # 3件ずつ同じ日付（ページ境界が同日の途中に来る）
+        for i in range(2 * PROFILE_PAGE_SIZE + 5):
+            make_event(self.club, [self.member], date=dt.date(2026, 1, 1) + dt.timedelta(days=i // 3))
+        self.url = reverse("tennis:member_profile", args=[self.club.public_token, self.member.id])
+
+    def _page(self, before=None):
+        r = self.client.get(self.url, {"before": before} if before is not None else {})
+        self.assertEqual(r.status_code, 200)
+        return [h["event"].id for h in r.context["history"]], r.context["next_cursor"]
+
+    def test_cursor_walks_all_events_in_order(self):
+        expected = list(
+            Event.objects.filter(club=self.club).order_by("-date", "-id").values_list("id", flat=True)
+        )
+        seen, cursor, pages = [], None, 0
+        while True:
+            ids, cursor = self._page(cursor)
+            seen.extend(ids)
+            pages += 1
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, expected)
+
+    def test_page_boundary_inside_same_date(self):
+        first, cursor = self._page()
+        second, _ = self._page(cursor)
+        last, nxt = Event.objects.get(pk=first[-1]), Event.objects.get(pk=second[0])
+        self.assertEqual(last.date, nxt.date)
+        self.assertLess(nxt.id, last.id)
+        self.assertEqual(cursor, f"{last.date:%Y-%m-%d}:{last.id}")
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        first, _ = self._page()
+        for bad in ("garbage", "2026-13-01:5", "2026-01-05:x", ":"):
+            r = self.client.get(self.url, {"before": bad})
+            self.assertEqual(r.status_code, 200)
+            self.assertTrue(r.context["is_first_page"])
+            self.assertEqual([h["event"].id for h in r.context["history"]], first)
+
+    def test_get_only(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+
+@PLAIN_STATIC
+class EventViewQueryBudgetTests(TestCase):
+    """
+    event_view は一括ローダ経由：EP は1回だけ読む（参加者数に比例してクエリが増えない）
+    """
+
+    def setUp(self):
+        cache.clear()  # 対戦表フラグメントのキャッシュを持ち越さない
+        self.club, members = make_club_with_members(8)
+        self.event, eps = make_event(self.club, members[:6], guests=("ゲストA", "ゲストB"))
+        publish(self.event, eps, GameType.DOUBLES, rounds=4, courts=2)
+        self.public_url = reverse("tennis:event_public", args=[self.club.public_token, self.event.id])
+
+    def test_public_event_view_query_budget(self):
+        # ETag / club / event(+schedule) / flags / 固定メンバー / EP / フラグ状態 / スコア / 代打（書き込みなし）
+        # （スコア / 代打は対戦表フラグメントのキャッシュミス時だけ）
+        with self.assertNumQueries(9):
+            r = self.client.get(self.public_url)
+        self.assertEqual(r.status_code, 200)
+
+    def test_query_count_does_not_grow_with_participants(self):
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(self.public_url)
+
+        for i in range(10):
+            EventParticipant.objects.create(
+                event=self.event, member=None, display_name=f"追加{i}", attendance="yes",
+            )
+
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(self.public_url)
+
+        self.assertEqual(len(before.captured_queries), len(after.captured_queries))
+
+    def test_not_modified_skips_rendering(self):
+        etag = self.client.get(self.public_url)["ETag"]
+
+        # ETag 照合の1クエリだけで 304
+        with self.assertNumQueries(1):
+            r = self.client.get(self.public_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+
+        ep = EventParticipant.objects.filter(event=self.event).first()
+        self.client.post(reverse("tennis:update_comment"), {
+            "event_id": self.event.id, "ep_id": ep.id, "comment": "遅れます",
+        })
+        r = self.client.get(self.public_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+
+@PLAIN_STATIC
+class ScheduleBlockCacheTests(TestCase):
+    """
+    対戦表フラグメントのキャッシュ：スコア保存 / 代打 / 名前変更のたびに描画し直す（古い HTML を返さない）
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.club, members = make_club_with_members(9)
+        self.event, self.eps = make_event(self.club, members)
+        self.ms = publish(self.event, self.eps, GameType.DOUBLES, rounds=2, courts=2)
+        MatchScore.objects.filter(match_schedule=self.ms).delete()
+        MatchSchedule.objects.filter(pk=self.ms.pk).update(locked=False)
+        self.public_url = reverse("tennis:event_public", args=[self.club.public_token, self.event.id])
+
+    def _block(self):
+        r = self.client.get(self.public_url)
+        self.assertEqual(r.status_code, 200)
+        return str(r.context["schedule_block_html"])
+
+    def test_writes_change_block(self):
+        block = self._block()
+        self.assertEqual(self._block(), block)
+
+        self.client.post(reverse("tennis:save_match_score"), {
+            "event_id": self.event.id, "round_no": 1, "court_no": 1, "side": "a", "value": 6,
+        })
+        after_score = self._block()
+        self.assertNotEqual(after_score, block)
+        self.assertIn('data-revision="1"', after_score)
+
+        r1 = self.ms.schedule[0]
+        moved = r1["matches"][1]["team2"][0]
+        self.client.post(reverse("tennis:substitute_slot"), {
+            "event_id": self.event.id, "round_no": 1, "court_no": 1, "team": 1, "slot_index": 0,
+            "new_ep_id": moved,
+        })
+        after_sub = self._block()
+        self.assertNotEqual(after_sub, after_score)
+
+        ep = EventParticipant.objects.get(pk=moved)
+        self.client.post(reverse("tennis:club_rename_member"), {
+            "club_id": self.club.id, "admin_token": self.club.admin_token,
+            "member_id": ep.member_id, "display_name": "改名後",
+        })
+        after_rename = self._block()
+        self.assertNotEqual(after_rename, after_sub)
+        self.assertIn(f'data-ep-id="{moved}">改名後</div>', after_rename)
+
+
+class EventStateTests(TestCase):
+    """
+    event_state：画面と同じ内容の JSON。ETag で 304、トークン違いは 404
+    """
+
+    def setUp(self):
+        self.club, members = make_club_with_members(8)
+        self.event, self.eps = make_event(self.club, members[:6], guests=("ゲストA",))
+        self.flag = ClubFlagDefinition.objects.create(club=self.club, name="車", display_order=1)
+        self.ms = publish(self.event, self.eps, GameType.DOUBLES, rounds=2, courts=2)
+        self.url = reverse("tennis:event_state", args=[self.club.public_token, self.event.id])
+
+    def test_payload_shape(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertTrue(data["ok"])
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual((data["version"], data["club_version"]), (event.version, self.club.version))
+        self.assertEqual(data["event"]["id"], self.event.id)
+        self.assertEqual(data["event"]["date"], self.event.date.strftime("%Y-%m-%d"))
+        self.assertEqual(data["flags"], [{"id": self.flag.id, "name": "車", "input_mode": "check"}])
+        self.assertEqual(data["publish_state"], "published")
+
+        guests = [row for row in data["rows"] if row["kind"] == "guest"]
+        self.assertEqual([row["name"] for row in guests], ["ゲストA"])
+        fixed = {row["member_id"]: row for row in data["rows"] if row["kind"] == "fixed"}
+        self.assertEqual(len(fixed), 8)  # EP の無い固定メンバーも未登録行で載る
+        self.assertEqual(
+            set(fixed[self.eps[0].member_id]),
+            {"kind", "ep_id", "member_id", "name", "attendance", "comment", "match", "flags"},
+        )
+
+        schedule = data["schedule"]
+        self.assertEqual(
+            (schedule["game_type"], schedule["court_count"], schedule["round_count"]),
+            (GameType.DOUBLES, 2, 2),
+        )
+        self.assertEqual(len(schedule["rounds"]), 2)
+        self.assertEqual(set(data["name_map"]), {str(ep.id) for ep in self.eps})
+
+    def test_etag_round_trip(self):
+        r = self.client.get(self.url)
+        etag = r["ETag"]
+        self.assertTrue(etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse("tennis:update_comment"), {
+            "event_id": self.event.id, "ep_id": self.eps[0].id, "comment": "遅れます",
+        })
+        r = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+        row = next(row for row in r.json()["rows"] if row["ep_id"] == self.eps[0].id)
+        self.assertEqual(row["comment"], "遅れます")
+
+    def test_public_token_is_checked(self):
+        other, _ = make_club_with_members(1, name="other")
+        for token in ("wrong", other.public_token):
+            r = self.client.get(reverse("tennis:event_state", args=[token, self.event.id]))
+            self.assertEqual(r.status_code, 404)
+
+
+class EventChangesTests(TestCase):
+    """
+    ?since=V の差分同期：変化なしは1クエリ、変化分だけ返す
+    """
+
+    def setUp(self):
+        self.club, members = make_club_with_members(8)
+        self.event, self.eps = make_event(self.club, members[:4])
+        self.url = reverse("tennis:event_changes", args=[self.club.public_token, self.event.id])
+
+    def _sync(self):
+        r = self.client.get(self.url).json()
+        self.assertTrue(r["full"])
+        return r["version"], r["club_version"]
+
+    def test_no_change_is_single_lookup(self):
+        version, club_version = self._sync()
+        with self.assertNumQueries(1):
+            r = self.client.get(self.url, {"since": version, "club_version": club_version}).json()
+        self.assertFalse(r["changed"])
+
+    def test_returns_only_changed_rows(self):
+        version, club_version = self._sync()
+        ep = self.eps[1]
+        self.client.post(reverse("tennis:update_comment"), {
+            "event_id": self.event.id, "ep_id": ep.id, "comment": "遅れます",
+        })
+
+        r = self.client.get(self.url, {"since": version, "club_version": club_version}).json()
+        self.assertTrue(r["changed"])
+        self.assertFalse(r["full"])
+        self.assertEqual([p["ep_id"] for p in r["participants"]], [ep.id])
+        self.assertEqual(r["participants"][0]["comment"], "遅れます")
+        self.assertGreater(r["version"], version)
+
+        r2 = self.client.get(self.url, {"since": r["version"], "club_version": club_version}).json()
+        self.assertFalse(r2["changed"])
+
+    def test_club_change_forces_full_resync(self):
+        version, club_version = self._sync()
+        Club.objects.filter(pk=self.club.pk).update(version=club_version + 1)
+        r = self.client.get(self.url, {"since": version, "club_version": club_version}).json()
+        self.assertTrue(r["full"])
+        self.assertEqual(len(r["rows"]), 8)
+
+
+class InProcessBrokerTests(TestCase):
+    """
+    SSE 用ファンアウト：購読直後の publish も届き、aclose で購読が外れる
+    """
+
+    def test_fan_out_and_unsubscribe(self):
+        broker = InProcessBroker()
+        channel = event_channel(1)
+
+        async def run():
+            subs = [broker.subscribe(channel, heartbeat=1) for _ in range(3)]
+            broker.publish(channel, {"type": "score", "version": 2})
+            broker.publish(event_channel(2), {"type": "score", "version": 9})
+            got = [await sub.__anext__() for sub in subs]
+            for sub in subs:
+                await sub.aclose()
+            return got
+
+        got = asyncio.run(run())
+        self.assertEqual([m["version"] for m in got], [2, 2, 2])
+        self.assertEqual(broker.subscriber_count(channel), 0)
+
+    def test_stream_checks_token_before_subscribing(self):
+        club, members = make_club_with_members(2)
+        event, _eps = make_event(club, members)
+        broker = InProcessBroker()
+
+        with mock.patch("tennis.views.get_broker", return_value=broker), \
+                mock.patch.object(broker, "subscribe", wraps=broker.subscribe) as subscribe:
+            r = async_to_sync(AsyncClient().get)(
+                reverse("tennis:event_stream", args=["wrong-token", event.id]),
+            )
+        self.assertEqual(r.status_code, 404)
+        subscribe.assert_not_called()
+
+
+class AttendanceRollupTests(TestCase):
+    """
+    出欠ロールアップ（MemberAttendanceMonth）：出欠変更 / EP 作成 / イベント削除の差分更新は作り直した結果と一致する
+    """
+
+    def setUp(self):
+        self.club, self.members = make_club_with_members(3)
+        self.nov = Event.objects.create(club=self.club, date=dt.date(2026, 11, 7), title="練習")
+        self.dec = Event.objects.create(club=self.club, date=dt.date(2026, 12, 5), title="練習")
+        self.dec2 = Event.objects.create(club=self.club, date=dt.date(2026, 12, 19), title="練習")
+
+    def _attend(self, event, member, value):
+        r = self.client.post(reverse("tennis:update_attendance"), {
+            "event_id": event.id, "member_id": member.id, "attendance": value,
+        })
+        self.assertEqual(r.status_code, 200)
+
+    def _rows(self):
+        # 0件だけの行は作り直しでは出ないので除く
+        return sorted(
+            row for row in MemberAttendanceMonth.objects.values_list("member_id", "month", "yes", "no", "maybe", "unset")
+            if any(row[2:])
+        )
+
+    def _assert_matches_rebuild(self):
+        incremental = self._rows()
+        rebuild_club_attendance(self.club)
+        self.assertEqual(incremental, self._rows())
+
+    def test_changes_creation_and_deletion(self):
+        m0, m1, m2 = self.members
+        # 初回入力で EP 作成
+        self._attend(self.nov, m0, "yes")
+        self._attend(self.nov, m1, "no")
+        self._attend(self.dec, m0, "maybe")
+        self._attend(self.dec2, m0, "yes")
+        self._attend(self.dec2, m2, "yes")
+        self._assert_matches_rebuild()
+
+        # 変更 / 未設定に戻す
+        self._attend(self.nov, m1, "yes")
+        self._attend(self.dec, m0, "")
+        self._assert_matches_rebuild()
+
+        # 幹事画面からの追加（出欠は未設定）
+        from .views import _get_or_create_ep
+        _get_or_create_ep(self.dec, m1, m1.display_name)
+        self._assert_matches_rebuild()
+
+        # イベント削除で月の件数から抜ける
+        r = self.client.post(reverse("tennis:club_delete_event"), {"event_id": self.dec2.id})
+        self.assertEqual(r.status_code, 200)
+        self._assert_matches_rebuild()
+        self.assertFalse([row for row in self._rows() if row[0] == m2.id])
+
+    def test_stats_rates(self):
+        m0, m1, m2 = self.members
+        self._attend(self.nov, m0, "yes")
+        self._attend(self.dec, m0, "no")
+        self._attend(self.dec2, m0, "yes")
+        self._attend(self.nov, m1, "maybe")
+        self._attend(self.dec, m1, "")
+
+        url = reverse("tennis:club_attendance_stats", args=[self.club.public_token])
+        data = self.client.get(url, {"from": "2026-11", "to": "2026-12"}).json()
+        self.assertEqual((data["ok"], data["from"], data["to"]), (True, "2026-11", "2026-12"))
+        by_id = {m["member_id"]: m for m in data["members"]}
+        self.assertEqual(
+            {k: by_id[m0.id][k] for k in ("yes", "no", "maybe", "unset", "total", "rate")},
+            {"yes": 2, "no": 1, "maybe": 0, "unset": 0, "total": 3, "rate": 66.7},
+        )
+        self.assertEqual((by_id[m1.id]["total"], by_id[m1.id]["rate"]), (2, 0.0))
+
+        # 期間を12月だけに
+        data = self.client.get(url, {"from": "2026-12", "to": "2026-12"}).json()
+        self.assertEqual({m["member_id"]: m["rate"] for m in data["members"]}.get(m0.id), 50.0)
+
+        r = self.client.get(url, {"from": "2026-12", "to": "2026-11"})
+        self.assertEqual((r.status_code, r.json()["error"]), (400, "bad_range"))
+
+
+class BulkUpdateParticipantsTests(TestCase):
+    """
+    一括更新：クエリ数は op 数に比例しない / 不正が1件でもあれば何も書かない
+    """
+
+    def setUp(self):
+        self.club, self.members = make_club_with_members(20)
+        self.event, self.eps = make_event(
+            self.club, self.members[:4], date=dt.date.today() + dt.timedelta(days=30),
+        )
+        self.check_flag = ClubFlagDefinition.objects.create(club=self.club, name="車", display_order=1)
+        self.digit_flag = ClubFlagDefinition.objects.create(
+            club=self.club, name="球", display_order=2, input_mode="digit",
+        )
+        rebuild_club_attendance(self.club)  # fixture は ORM 直作成なのでロールアップを合わせておく
+        self.url = reverse("tennis:bulk_update_participants")
+
+    def _post(self, ops):
+        return self.client.post(self.url, {"event_id": self.event.id, "ops": json.dumps(ops)})
+
+    def _ops(self, members):
+        ops = []
+        for m in members:
+            ops.append({"op": "attendance", "member_id": m.id, "value": "yes"})
+            ops.append({"op": "flag", "member_id": m.id, "flag_id": self.check_flag.id, "value": True})
+            ops.append({"op": "flag_value", "member_id": m.id, "flag_id": self.digit_flag.id, "value": 3})
+        return ops
+
+    def test_applies_ops_with_single_version_bump(self):
+        before = Event.objects.get(pk=self.event.pk).version
+        r = self._post(self._ops(self.members[4:6]) + [
+            {"op": "attendance", "ep_id": self.eps[0].id, "value": "no"},
+            {"op": "comment", "ep_id": self.eps[1].id, "value": "遅れます"},
+        ]).json()
+        self.assertTrue(r["ok"])
+
+        version = Event.objects.get(pk=self.event.pk).version
+        self.assertEqual(version, before + 1)
+        self.assertEqual(r["version"], version)
+
+        ep = EventParticipant.objects.get(event=self.event, member=self.members[5])
+        self.assertEqual((ep.attendance, ep.participates_match, ep.change_version), ("yes", True, version))
+        self.assertEqual(
+            EventParticipant.objects.get(pk=self.eps[0].pk).participates_match, False,
+        )
+        self.assertEqual(
+            ParticipantFlag.objects.get(event_participant=ep, flag_definition=self.digit_flag).value, 3,
+        )
+        self.assertEqual(ParticipantFlag.objects.filter(change_version=version).count(), 4)
+
+        # 出欠ロールアップは作り直した結果と一致する
+        incremental = sorted(MemberAttendanceMonth.objects.values_list("member_id", "yes", "no", "unset"))
+        rebuild_club_attendance(self.club)
+        self.assertEqual(
+            incremental,
+            sorted(MemberAttendanceMonth.objects.values_list("member_id", "yes", "no", "unset")),
+        )
+
+    def test_query_count_does_not_grow_with_ops(self):
+        with CaptureQueriesContext(connection) as small:
+            self._post(self._ops(self.members[4:6]))
+        with CaptureQueriesContext(connection) as large:
+            self._post(self._ops(self.members[6:20]))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_invalid_op_writes_nothing(self):
+        before = Event.objects.get(pk=self.event.pk).version
+        r = self._post(self._ops(self.members[4:6]) + [
+            {"op": "flag", "ep_id": self.eps[0].id, "flag_id": self.digit_flag.id, "value": True},
+        ])
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()["index"], 6)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, before)
+        self.assertEqual(EventParticipant.objects.filter(event=self.event).count(), 4)
+
+
+def run_in_threads(n: int, fn):
+    """
+    n スレッドで fn(i) を同時に走らせ、結果（例外ならその例外）を返す
+    """
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        try:
+            barrier.wait()
+            results[i] = fn(i)
+        except Exception as e:  # noqa: BLE001 - 呼び出し側で検査する
+            results[i] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class ParticipantFlagUpsertTests(TransactionTestCase):
+    """
+    フラグ書き込みは1文 upsert：同じ (EP, フラグ) への並行トグルでも一意制約違反にならない / 変化の無いトグルは版を進めない
+    """
+
+    def setUp(self):
+        self.club, members = make_club_with_members(2)
+        self.event, self.eps = make_event(self.club, members, date=dt.date.today() + dt.timedelta(days=30))
+        self.flag = ClubFlagDefinition.objects.create(club=self.club, name="車", display_order=1)
+
+    def test_parallel_toggles_keep_one_row(self):
+        url = reverse("tennis:toggle_participant_flag")
+        ep = self.eps[0]
+
+        def toggle(i):
+            return Client().post(url, {
+                "event_id": self.event.id, "ep_id": ep.id,
+                "flag_id": self.flag.id, "checked": "true" if i % 2 else "false",
+            }).status_code
+
+        results = run_in_threads(8, toggle)
+        self.assertEqual(results, [200] * 8)
+        self.assertEqual(
+            ParticipantFlag.objects.filter(event_participant=ep, flag_definition=self.flag).count(), 1,
+        )
+
+    def test_check_toggle_keeps_digit_value(self):
+        ep = self.eps[1]
+        self.client.post(reverse("tennis:set_participant_flag_value"), {
+            "event_id": self.event.id, "ep_id": ep.id, "flag_id": self.flag.id, "value": "4",
+        })
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse("tennis:toggle_participant_flag"), {
+                "event_id": self.event.id, "ep_id": ep.id, "flag_id": self.flag.id, "checked": "false",
+            })
+        # フラグ行への書き込みは upsert 1文だけ（get_or_create なし。読むのは変化の判定1回）
+        flag_writes = [
+            q["sql"] for q in ctx.captured_queries
+            if "tennis_participantflag" in q["sql"] and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(len(flag_writes), 1)
+        self.assertIn("ON CONFLICT", flag_writes[0])
+
+        pf = ParticipantFlag.objects.get(event_participant=ep, flag_definition=self.flag)
+        self.assertEqual((pf.is_on, pf.value), (False, 4))
+
+    def test_unchanged_toggle_keeps_version(self):
+        ep = self.eps[0]
+
+        def toggle(checked):
+            r = self.client.post(reverse("tennis:toggle_participant_flag"), {
+                "event_id": self.event.id, "ep_id": ep.id, "flag_id": self.flag.id, "checked": checked,
+            })
+            self.assertEqual(r.status_code, 200)
+            return Event.objects.get(pk=self.event.pk).version
+
+        start = Event.objects.get(pk=self.event.pk).version
+        # 行が無い = OFF：OFF のトグルは何も書かない
+        self.assertEqual(toggle("false"), start)
+        self.assertFalse(ParticipantFlag.objects.filter(event_participant=ep).exists())
+        self.assertEqual(toggle("true"), start + 1)
+        self.assertEqual(toggle("true"), start + 1)
+        self.assertEqual(toggle("false"), start + 2)
+
+
+class FirstTouchParticipantTests(TransactionTestCase):
+    """
+    未登録行（固定メンバー・EP なし）への同時初回入力：EP は1行だけ、出欠ロールアップも二重計上しない
+    """
+
+    def setUp(self):
+        self.club, self.members = make_club_with_members(3)
+        self.event = Event.objects.create(
+            club=self.club, date=dt.date.today() + dt.timedelta(days=30), title="練習",
+        )
+
+    def test_parallel_first_touch_creates_one_row(self):
+        url = reverse("tennis:update_attendance")
+        targets = self.members[:2]
+
+        def first_touch(i):
+            return Client().post(url, {
+                "event_id": self.event.id,
+                "member_id": targets[i % 2].id,
+                "attendance": "yes" if i < 8 else "no",
+            }).status_code
+
+        results = run_in_threads(12, first_touch)
+        self.assertEqual(results, [200] * 12)
+
+        for m in targets:
+            self.assertEqual(EventParticipant.objects.filter(event=self.event, member=m).count(), 1)
+        self.assertFalse(EventParticipant.objects.filter(event=self.event, member=self.members[2]).exists())
+
+        incremental = sorted(MemberAttendanceMonth.objects.values_list("member_id", "yes", "no", "maybe", "unset"))
+        rebuild_club_attendance(self.club)
+        self.assertEqual(
+            incremental,
+            sorted(MemberAttendanceMonth.objects.values_list("member_id", "yes", "no", "maybe", "unset")),
+        )
+
+    def test_rename_stamps_version_only_when_changed(self):
+        from .views import _get_or_create_ep
+
+        m = self.members[0]
+        ep = _get_or_create_ep(self.event, m, m.display_name)
+        first = ep.change_version
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, first)
+
+        # 名前が同じなら Event.version も進めない
+        self.assertEqual(_get_or_create_ep(self.event, m, m.display_name).change_version, first)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, first)
+
+        renamed = _get_or_create_ep(self.event, m, "別名")
+        self.assertEqual(renamed.id, ep.id)
+        self.assertGreater(renamed.change_version, first)
+        row = EventParticipant.objects.get(pk=ep.pk)
+        self.assertEqual((row.display_name, row.change_version), ("別名", renamed.change_version))
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, renamed.change_version)
+
+    def test_bulk_ops_stamp_row_renamed_by_upsert(self):
+        from . import participant_ops
+
+        m = self.members[1]
+        real_upsert = participant_ops.upsert_member_participants
+
+        def racing_upsert(event, rows, version):
+            # ロック後・upsert 前に別リクエストが旧名で作った行
+            EventParticipant.objects.create(event=event, member=m, display_name="旧名", change_version=1)
+            return real_upsert(event, rows, version)
+
+        with mock.patch.object(participant_ops, "upsert_member_participants", racing_upsert):
+            result = participant_ops.apply_participant_ops(
+                self.event, [{"op": "comment", "ep_id": None, "member_id": m.id, "flag_id": None, "value": ""}],
+            )
+
+        ep = EventParticipant.objects.get(event=self.event, member=m)
+        self.assertEqual(ep.display_name, m.display_name)
+        self.assertIsNotNone(result["version"])
+        self.assertEqual(ep.change_version, result["version"])
+
+
+class ScoreRevisionTests(TestCase):
+    """
+    スコア保存の楽観的排他：同じマスが読んだ後に変わっていたら 409、別のマスなら通す / Event の版の採番は最後
+    """
+
+    def setUp(self):
+        club, members = make_club_with_members(8)
+        self.event, eps = make_event(club, members)
+        self.ms = publish(self.event, eps, GameType.DOUBLES, rounds=2, courts=2)
+        MatchScore.objects.filter(match_schedule=self.ms).delete()
+        MatchSchedule.objects.filter(pk=self.ms.pk).update(locked=False)
+        self.url = reverse("tennis:save_match_score")
+
+    def _save(self, side, value, **extra):
+        return self.client.post(self.url, {
+            "event_id": self.event.id, "round_no": 1, "court_no": 1, "side": side, "value": value, **extra,
+        })
+
+    def test_stale_revision_on_same_cell_conflicts(self):
+        r = self._save("a", 6, revision=0, prev="").json()
+        self.assertEqual(r["revision"], 1)
+
+        r = self._save("a", 4, revision=0, prev="")
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual((r.json()["error"], r.json()["a"], r.json()["revision"]), ("conflict", 6, 1))
+
+        # もう片方のマスは読んだ後に変わっていないので通す
+        r = self._save("b", 3, revision=0, prev="")
+        self.assertEqual(r.status_code, 200)
+        score = MatchScore.objects.get(match_schedule=self.ms, round_no=1, court_no=1)
+        self.assertEqual((score.side_a_score, score.side_b_score, score.revision), (6, 3, 2))
+
+    def test_schedule_row_written_only_on_lock_transition(self):
+        with CaptureQueriesContext(connection) as first:
+            self._save("a", 6)
+        with CaptureQueriesContext(connection) as second:
+            self._save("b", 2)
+
+        def ms_writes(ctx):
+            return [
+                q["sql"] for q in ctx.captured_queries
+                if q["sql"].startswith("UPDATE") and "tennis_matchschedule" in q["sql"].split(" SET ")[0]
+            ]
+
+        self.assertEqual(len(ms_writes(first)), 1)
+        self.assertEqual(ms_writes(second), [])
+        self.assertTrue(MatchSchedule.objects.get(pk=self.ms.pk).locked)
+
+    def test_event_version_is_bumped_after_rollups(self):
+        self._save("a", 6)
+        version = Event.objects.get(pk=self.event.pk).version
+        with CaptureQueriesContext(connection) as ctx:
+            self._save("b", 2)
+
+        sqls = [q["sql"] for q in ctx.captured_queries]
+        event_writes = [
+            i for i, sql in enumerate(sqls)
+            if sql.startswith("UPDATE") and sql.split(" SET ")[0].endswith('"tennis_event"')
+        ]
+        rollup_writes = [i for i, sql in enumerate(sqls) if "tennis_membermatchup" in sql]
+        # Event 行ロック（版の採番）は1文で、成績集計の書き込みより後
+        self.assertEqual(len(event_writes), 1)
+        self.assertTrue(rollup_writes)
+        self.assertLess(max(rollup_writes), event_writes[0])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, version + 1)
+
+
+class MatchupRollupTests(TestCase):
+    """
+    対戦 / ペア成績（MemberMatchup）：保存・修正・取り消し・代打の差分更新は作り直した結果と一致する
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.club, members = make_club_with_members(11)
+        self.event, eps = make_event(self.club, members[:10])
+        self.ms = publish(self.event, eps, GameType.DOUBLES, rounds=2, courts=2)
+        MatchScore.objects.filter(match_schedule=self.ms).delete()
+        MatchSchedule.objects.filter(pk=self.ms.pk).update(locked=False)
+        rebuild_club_matchups(self.club)
+        self.outsider = EventParticipant.objects.create(
+            event=self.event, member=members[10], display_name="m10", attendance="yes",
+        )
+        self.r1 = self.ms.schedule[0]
+
+    def _save(self, court_no, side, value, round_no=1):
+        r = self.client.post(reverse("tennis:save_match_score"), {
+            "event_id": self.event.id, "round_no": round_no, "court_no": court_no, "side": side, "value": value,
+        })
+        self.assertEqual(r.status_code, 200)
+
+    def _sub(self, court_no, team, slot_index, new_ep_id):
+        r = self.client.post(reverse("tennis:substitute_slot"), {
+            "event_id": self.event.id, "round_no": 1, "court_no": court_no,
+            "team": team, "slot_index": slot_index, "new_ep_id": new_ep_id,
+        })
+        self.assertEqual(r.status_code, 200)
+
+    def _rows(self):
+        return sorted(
+            MemberMatchup.objects.filter(matches__gt=0).values_list(
+                "member_id", "other_id", "relation", "matches", "wins", "losses", "draws",
+                "games_for", "games_against",
+            )
+        )
+
+    def _assert_matches_rebuild(self):
+        incremental = self._rows()
+        rebuild_club_matchups(self.club)
+        self.assertEqual(incremental, self._rows())
+
+    def test_save_edit_clear_and_substitute(self):
+        self._save(1, "a", 6)
+        self._save(1, "b", 3)
+        self._save(2, "a", 2)
+        self._save(2, "b", 6)
+        self._save(1, "a", 6, round_no=2)
+        self._save(1, "b", 6, round_no=2)
+        self._assert_matches_rebuild()
+        self.assertTrue(self._rows())
+
+        # 修正（勝敗が入れ替わる）
+        self._save(1, "b", 7)
+        self._assert_matches_rebuild()
+
+        # 取り消し（片側だけ残る試合は集計外）
+        self._save(2, "a", "")
+        self._assert_matches_rebuild()
+        self._save(2, "a", 4)
+
+        # 試合どうしの入れ替え：コート1 のスコアは破棄、コート2 は組み合わせを変えて残る
+        self._sub(1, 1, 0, self.r1["matches"][1]["team2"][0])
+        self._assert_matches_rebuild()
+
+        # 外からの代打
+        self._save(1, "a", 6)
+        self._save(1, "b", 1)
+        self._sub(2, 2, 1, self.outsider.id)
+        self._assert_matches_rebuild()
+
+    def test_head_to_head_response(self):
+        self._save(1, "a", 6)
+        self._save(1, "b", 3)
+        team1 = [EventParticipant.objects.get(pk=p).member_id for p in self.r1["matches"][0]["team1"]]
+        team2 = [EventParticipant.objects.get(pk=p).member_id for p in self.r1["matches"][0]["team2"]]
+        url = reverse("tennis:club_head_to_head", args=[self.club.public_token])
+
+        data = self.client.get(url, {"member_id": team1[0]}).json()
+        self.assertTrue(data["ok"])
+        self.assertEqual(data["relation"], "opponent")
+        cells = data["matrix"][str(team1[0])]
+        self.assertEqual(set(cells), {str(m) for m in team2})
+        self.assertEqual(cells[str(team2[0])], {
+            "matches": 1, "wins": 1, "losses": 0, "draws": 0, "gf": 6, "ga": 3,
+            "win_pct": 100.0, "gp_pct": 66.7,
+        })
+        self.assertEqual({m["id"] for m in data["members"]}, {team1[0], *team2})
+
+        data = self.client.get(url, {"relation": "partner", "member_id": team1[0]}).json()
+        self.assertEqual(list(data["matrix"][str(team1[0])]), [str(team1[1])])
+
+        r = self.client.get(url, {"relation": "rival"})
+        self.assertEqual((r.status_code, r.json()["error"]), (400, "bad_relation"))
+
+
+class BatchScoreTests(TestCase):
+    """
+    ラウンド一括のスコア保存：照合・locked・版・集計は1回、クエリ数は試合数に比例しない
+    """
+
+    def setUp(self):
+        self.club, members = make_club_with_members(16)
+        self.event, eps = make_event(self.club, members)
+        self.ms = publish(self.event, eps, GameType.DOUBLES, rounds=3, courts=4)
+        MatchScore.objects.filter(match_schedule=self.ms).delete()
+        MatchSchedule.objects.filter(pk=self.ms.pk).update(locked=False)
+        MemberMatchup.objects.all().delete()
+        self.url = reverse("tennis:save_match_scores")
+
+    def _post(self, scores):
+        return self.client.post(self.url, {"event_id": self.event.id, "scores": json.dumps(scores)})
+
+    def _round(self, round_no, courts):
+        return [
+            {"round_no": round_no, "court_no": c, "side": side, "value": v}
+            for c in courts
+            for side, v in (("a", 6), ("b", c))
+        ]
+
+    def test_query_count_independent_of_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self._post(self._round(1, [1])).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            r = self._post(self._round(2, [1, 2, 3, 4]) + self._round(3, [1, 2, 3, 4]))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()["scores"]), 8)
+        # 1回目は locked 遷移の UPDATE が1本多い
+        self.assertLessEqual(len(large), len(small))
+
+        ms = MatchSchedule.objects.get(pk=self.ms.pk)
+        self.assertTrue(ms.locked)
+        self.assertEqual(MatchScore.objects.filter(match_schedule=ms).count(), 9)
+
+        key = lambda: sorted(MemberMatchup.objects.values_list("member_id", "other_id", "relation", "matches", "wins"))
+        incremental = key()
+        rebuild_club_matchups(self.club)
+        self.assertEqual(incremental, key())
+
+    def test_unknown_court_rejects_whole_batch(self):
+        version = Event.objects.get(pk=self.event.pk).version
+        r = self._post(self._round(1, [1, 2]) + [{"round_no": 1, "court_no": 9, "side": "a", "value": 6}])
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual((r.json()["error"], r.json()["index"]), ("no_match", 4))
+
+        self.assertFalse(MatchScore.objects.filter(match_schedule=self.ms).exists())
+        self.assertFalse(MatchSchedule.objects.get(pk=self.ms.pk).locked)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, version)
+
+
+class ScoreSyncTests(TestCase):
+    """
+    オフライン op ログの同期：op_id で冪等、マスごとに ts の後勝ち
+    """
+
+    def setUp(self):
+        club, members = make_club_with_members(8)
+        self.event, eps = make_event(club, members)
+        self.ms = publish(self.event, eps, GameType.DOUBLES, rounds=2, courts=2)
+        MatchScore.objects.filter(match_schedule=self.ms).delete()
+        self.url = reverse("tennis:sync_match_scores")
+
+    def _sync(self, ops):
+        return self.client.post(self.url, {"event_id": self.event.id, "ops": json.dumps(ops)})
+
+    def _op(self, op_id, ts, value, side="a", round_no=1, court_no=1):
+        return {"op_id": op_id, "ts": ts, "round_no": round_no, "court_no": court_no, "side": side, "value": value}
+
+    def _score(self):
+        s = MatchScore.objects.get(match_schedule=self.ms, round_no=1, court_no=1)
+        return (s.side_a_score, s.side_b_score)
+
+    def test_resend_is_idempotent(self):
+        ops = [self._op("o1", 100, 6), self._op("o2", 110, 4, side="b")]
+        r = self._sync(ops).json()
+        self.assertEqual(r["applied"], ["o1", "o2"])
+        self.assertEqual(self._score(), (6, 4))
+
+        version = Event.objects.get(pk=self.event.pk).version
+        r = self._sync(ops).json()
+        self.assertEqual((r["applied"], r["duplicate"]), ([], ["o1", "o2"]))
+        self.assertEqual(Event.objects.get(pk=self.event.pk).version, version)
+        self.assertEqual({(x["round_no"], x["court_no"], x["a"], x["b"]) for x in r["scores"]}, {(1, 1, 6, 4)})
+
+    def test_last_writer_wins_per_cell(self):
+        # 同じ送信内：送信順ではなく ts 順
+        self._sync([self._op("o2", 200, 5), self._op("o1", 100, 3)])
+        self.assertEqual(self._score(), (5, None))
+
+        # 後から届いた古い op は適用しない（もう片方のマスは通す）
+        r = self._sync([self._op("o0", 150, 1), self._op("o3", 50, 2, side="b")]).json()
+        self.assertEqual((r["stale"], r["applied"]), (["o0"], ["o3"]))
+        self.assertEqual(self._score(), (5, 2))
+
+    def test_online_save_newer_than_offline_op_wins(self):
+        self.client.post(reverse("tennis:save_match_scores"), {
+            "event_id": self.event.id,
+            "scores": json.dumps([{"round_no": 1, "court_no": 1, "side": "a", "value": 6}]),
+        })
+        online_ts = MatchScore.objects.get(match_schedule=self.ms, round_no=1, court_no=1).side_a_ts
+        self.assertIsNotNone(online_ts)
+
+        # オフライン中に入力した古い値は、後からのオンライン保存を上書きしない
+        r = self._sync([self._op("o1", online_ts - 1000, 3), self._op("o2", online_ts - 1000, 2, side="b")]).json()
+        self.assertEqual((r["stale"], r["applied"]), (["o1"], ["o2"]))
+        self.assertEqual(self._score(), (6, 2))
+
+        r = self._sync([self._op("o3", online_ts + 1000, 4)]).json()
+        self.assertEqual(r["applied"], ["o3"])
+        self.assertEqual(self._score(), (4, 2))
+
+    def test_same_value_write_advances_cell_ts(self):
+        self._sync([self._op("o1", 100, 5)])
+        # 同じ値でも新しい書き込みの時刻は残る
+        r = self._sync([self._op("o2", 300, 5)]).json()
+        self.assertEqual(r["applied"], ["o2"])
+        self.assertEqual(MatchScore.objects.get(match_schedule=self.ms, round_no=1, court_no=1).side_a_ts, 300)
+
+        # 後から届いた ts=200 は最新（ts=300 の 5）より古い
+        r = self._sync([self._op("o3", 200, 3)]).json()
+        self.assertEqual((r["stale"], r["applied"]), (["o3"], []))
+        self.assertEqual(self._score(), (5, None))
+
+    def test_republish_resets_op_log(self):
+        self._sync([self._op("o1", 100, 6), self._op("o2", 5_000_000_000_000, 4, side="b")])
+        session = self.client.session
+        session[f"tennis_event_admin:{self.event.id}"] = True
+        session.save()
+        r = self.client.post(reverse("tennis:publish_schedule"), {
+            "event_id": self.event.id, "schedule_json": json.dumps(self.ms.schedule), "force": "1",
+        })
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(ScoreSyncOp.objects.filter(match_schedule=self.ms).exists())
+
+        # 同じ op_id / 古い ts でも、新しい対戦表への入力として適用される
+        r = self._sync([self._op("o1", 100, 3), self._op("o2", 200, 1, side="b")]).json()
+        self.assertEqual((r["applied"], r["duplicate"], r["stale"]), (["o1", "o2"], [], []))
+        self.assertEqual(self._score(), (3, 1))
+
+    def test_unknown_match_is_recorded_not_retried(self):
+        ops = [self._op("x1", 100, 6, court_no=9), self._op("o1", 100, 6)]
+        r = self._sync(ops).json()
+        self.assertEqual((r["rejected"], r["applied"]), (["x1"], ["o1"]))
+        r = self._sync(ops).json()
+        self.assertEqual(r["duplicate"], ["x1", "o1"])
+
+
+class ParallelScoreEntryTests(TransactionTestCase):
+    """
+    コートごとの並行入力：全件保存され、対戦成績インデックスも作り直した結果と一致する
+    """
+
+    def test_parallel_writers_on_different_courts(self):
+        club, members = make_club_with_members(16)
+        event, eps = make_event(club, members, date=dt.date.today() + dt.timedelta(days=30))
+        ms = publish(event, eps, GameType.DOUBLES, rounds=3, courts=4)
+        MatchScore.objects.filter(match_schedule=ms).delete()
+        url = reverse("tennis:save_match_score")
+
+        def enter_court(i):
+            client = Client()
+            court = i % 4 + 1
+            for round_no in (1, 2, 3):
+                for side, value in (("a", 6), ("b", court)):
+                    r = client.post(url, {
+                        "event_id": event.id, "round_no": round_no, "court_no": court,
+                        "side": side, "value": value,
+                    })
+                    if r.status_code != 200:
+                        return r.status_code
+            return 200
+
+        self.assertEqual(run_in_threads(4, enter_court), [200] * 4)
+        self.assertEqual(
+            sorted(MatchScore.objects.filter(match_schedule=ms).values_list("court_no", "side_a_score", "side_b_score")),
+            sorted((c, 6, c) for c in range(1, 5) for _ in range(3)),
+        )
+
+        key = lambda: sorted(MemberMatchup.objects.values_list("member_id", "other_id", "relation", "matches", "wins"))
+        incremental = key()
+        rebuild_club_matchups(club)
+        self.assertEqual(incremental, key())
+
+
+class SubstitutionOverlayTests(TestCase):
+    """
+    代打はオーバーレイ行：公開済み schedule_json は変わらず、表示 / MatchSlot / 成績は代打反映後
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.club, members = make_club_with_members(11)
+        self.event, eps = make_event(self.club, members[:10])
+        self.ms = publish(self.event, eps, GameType.DOUBLES, rounds=2, courts=2)
+        rebuild_club_matchups(self.club)
+        # 対戦表に出てこない出席者（外からの代打）
+        self.outsider = EventParticipant.objects.create(
+            event=self.event, member=members[10], display_name="m10", attendance="yes",
+        )
+        self.base = MatchSchedule.objects.get(pk=self.ms.pk).schedule
+        self.url = reverse("tennis:substitute_slot")
+
+    def _sub(self, court_no, team, slot_index, new_ep_id, round_no=1):
+        return self.client.post(self.url, {
+            "event_id": self.event.id, "round_no": round_no, "court_no": court_no,
+            "team": team, "slot_index": slot_index, "new_ep_id": new_ep_id,
+        })
+
+    def _round(self):
+        ms = MatchSchedule.objects.get(pk=self.ms.pk)
+        return effective_schedule(ms)[0]
+
+    def _slots(self):
+        return sorted(
+            (s.court_no, s.team, s.slot_index, s.event_participant_id)
+            for s in MatchSlot.objects.filter(match_schedule=self.ms, round_no=1)
+        )
+
+    def _expected_slots(self, r):
+        return sorted(
+            [(m["court"], t, i, p) for m in r["matches"] for t, k in ((1, "team1"), (2, "team2")) for i, p in enumerate(m[k])]
+            + [(0, 0, i, p) for i, p in enumerate(r["rests"])]
+        )
+
+    def test_swap_is_overlay_only(self):
+        r0 = self.base[0]
+        a = r0["matches"][0]["team1"][0]
+        b = r0["matches"][1]["team2"][1]
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._sub(1, 1, 0, b).status_code, 200)
+        self.assertFalse([
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("UPDATE") and "schedule_json" in q["sql"]
+        ])
+
+        self.assertEqual(MatchSchedule.objects.get(pk=self.ms.pk).schedule, self.base)
+        self.assertEqual(Substitution.objects.filter(match_schedule=self.ms).count(), 2)
+        r = self._round()
+        self.assertEqual((r["matches"][0]["team1"][0], r["matches"][1]["team2"][1]), (b, a))
+        self.assertEqual(self._slots(), self._expected_slots(r))
+
+        # 元に戻すと行も消える
+        self._sub(1, 1, 0, a)
+        self.assertFalse(Substitution.objects.filter(match_schedule=self.ms).exists())
+        self.assertEqual(self._round(), r0)
+
+    def test_outside_substitute_rests_old_player(self):
+        r0 = self.base[0]
+        a = r0["matches"][0]["team1"][0]
+        self._sub(1, 1, 0, self.outsider.id)
+
+        r = self._round()
+        self.assertEqual(r["matches"][0]["team1"][0], self.outsider.id)
+        self.assertEqual(r["rests"], list(r0["rests"]) + [a])
+        self.assertEqual(self._slots(), self._expected_slots(r))
+        # 対象試合のスコアは破棄、成績は代打反映後の対戦表から作り直した結果と一致（0件の行は除く）
+        self.assertFalse(MatchScore.objects.filter(match_schedule=self.ms, round_no=1, court_no=1).exists())
+        key = lambda: sorted(MemberMatchup.objects.filter(matches__gt=0).values_list("member_id", "other_id", "relation", "matches", "wins"))
+        incremental = key()
+        rebuild_club_matchups(self.club)
+        self.assertEqual(incremental, key())
+
+    def test_republish_drops_overlay(self):
+        self._sub(1, 1, 0, self.outsider.id)
+        MatchScore.objects.filter(match_schedule=self.ms).delete()
+        session = self.client.session
+        session[f"tennis_event_admin:{self.event.id}"] = True
+        session.save()
+        r = self.client.post(reverse("tennis:publish_schedule"), {
+            "event_id": self.event.id, "schedule_json": json.dumps(self.base),
+        })
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(Substitution.objects.filter(match_schedule=self.ms).exists())
+        self.assertEqual(self._round(), self.base[0])
+
+    def test_returns_only_affected_fragments(self):
+        r0 = self.base[0]
+        b = r0["matches"][1]["team2"][1]
+        data = self._sub(1, 1, 0, b).json()
+        self.assertEqual([m["court_no"] for m in data["matches"]], [1, 2])
+        self.assertIsNone(data["rests_html"])
+        self.assertIn('data-court-no="1"', data["matches"][0]["html"])
+        self.assertNotIn("tb-round-header", data["matches"][0]["html"])
+
+        # 外からの代打：対象試合と休憩行だけ
+        data = self._sub(2, 1, 0, self.outsider.id).json()
+        self.assertEqual([m["court_no"] for m in data["matches"]], [2])
+        self.assertIn("m10", data["matches"][0]["html"])
+        self.assertIn("tb-rest-row", data["rests_html"])
+
+    def test_rest_swaps_keep_slots_in_sync(self):
+        r0 = self.base[0]
+        a = r0["matches"][0]["team1"][0]
+        # 外から入れて、休憩に回った本人を戻す（置換は恒等に戻る）
+        self._sub(1, 1, 0, self.outsider.id)
+        self._sub(1, 1, 0, a)
+        self.assertFalse(Substitution.objects.filter(match_schedule=self.ms).exists())
+        self.assertEqual(self._slots(), self._expected_slots(self._round()))
+
+        # 元から休憩の人と入れ替え
+        self._sub(1, 2, 1, r0["rests"][0])
+        r = self._round()
+        self.assertEqual(r["rests"][0], r0["matches"][0]["team2"][1])
+        self.assertEqual(self._slots(), self._expected_slots(r))
+
+    def test_two_outsiders_and_swap_back_keep_slots_in_sync(self):
+        r0 = self.base[0]
+        a = r0["matches"][0]["team1"][0]
+        b = r0["matches"][1]["team2"][0]
+        member = Member.objects.create(club=self.club, display_name="m11", member_no=12, is_fixed=True)
+        outsider2 = EventParticipant.objects.create(
+            event=self.event, member=member, display_name="m11", attendance="yes",
+        )
+
+        self._sub(1, 1, 0, self.outsider.id)
+        self.assertEqual(self._slots(), self._expected_slots(self._round()))
+        self._sub(2, 2, 0, outsider2.id)
+        r = self._round()
+        self.assertEqual(r["rests"], list(r0["rests"]) + [a, b])
+        self.assertEqual(self._slots(), self._expected_slots(r))
+
+        # 1人目を戻す（2人目の外からの代打は残る）
+        self._sub(1, 1, 0, a)
+        r = self._round()
+        self.assertEqual(r["matches"][0]["team1"][0], a)
+        self.assertEqual(r["matches"][1]["team2"][0], outsider2.id)
+        self.assertEqual(self._slots(), self._expected_slots(r))
+
+        self._sub(2, 2, 0, b)
+        self.assertEqual(self._round(), r0)
+        self.assertEqual(self._slots(), self._expected_slots(r0))
+
+    def test_stale_old_ep_conflicts(self):
+        r0 = self.base[0]
+        r = self.client.post(self.url, {
+            "event_id": self.event.id, "round_no": 1, "court_no": 1, "team": 1, "slot_index": 0,
+            "new_ep_id": self.outsider.id, "old_ep_id": r0["matches"][0]["team1"][1],
+        })
+        self.assertEqual((r.status_code, r.json()["error"]), (409, "slot_changed"))
+        self.assertFalse(Substitution.objects.filter(match_schedule=self.ms).exists())
+
+
+def expected_slots(schedule):
+    """
+    v1 形の対戦表 → MatchSlot と同じ並びのタプル（round, court, team, slot_index, ep_id）
+    """
+    return sorted(
+        [
+            (r["round"], m["court"], t, i, p)
+            for r in schedule for m in r["matches"]
+            for t, k in ((1, "team1"), (2, "team2")) for i, p in enumerate(m[k])
+        ]
+        + [(r["round"], 0, 0, i, p) for r in schedule for i, p in enumerate(r["rests"])]
+    )
+
+
+class MatchSlotSyncTests(TestCase):
+    """
+    MatchSlot は公開 / 再公開 / 代打のたびに代打反映後の対戦表と同じ中身になる
+    """
+
+    def setUp(self):
+        self.club, members = make_club_with_members(10)
+        self.event, self.eps = make_event(self.club, members)
+        session = self.client.session
+        session[f"tennis_event_admin:{self.event.id}"] = True
+        session.save()
+
+    def _publish(self, schedule):
+        r = self.client.post(reverse("tennis:publish_schedule"), {
+            "event_id": self.event.id, "schedule_json": json.dumps(schedule), "force": "1",
+        })
+        self.assertEqual(r.status_code, 200)
+        return MatchSchedule.objects.get(event=self.event)
+
+    def _slots(self, ms):
+        return sorted(
+            MatchSlot.objects.filter(match_schedule=ms)
+            .values_list("round_no", "court_no", "team", "slot_index", "event_participant_id")
+        )
+
+    def test_publish_republish_and_substitute(self):
+        ep_ids = [ep.id for ep in self.eps]
+        ms = self._publish(generate_doubles_schedule(ep_ids[:9], 3, 2))
+        self.assertEqual(self._slots(ms), expected_slots(ms.schedule))
+        self.assertFalse(ms.has_legacy_players)
+
+        # 人数・面数の違う対戦表で出し直す（前の行は残らない）
+        ms = self._publish(generate_singles_schedule(ep_ids, 2, 3))
+        self.assertEqual(self._slots(ms), expected_slots(ms.schedule))
+
+        r1 = ms.schedule[0]
+        r = self.client.post(reverse("tennis:substitute_slot"), {
+            "event_id": self.event.id, "round_no": 1, "court_no": 1, "team": 1, "slot_index": 0,
+            "new_ep_id": r1["rests"][0],
+        })
+        self.assertEqual(r.status_code, 200)
+        ms = MatchSchedule.objects.get(pk=ms.pk)
+        self.assertEqual(self._slots(ms), expected_slots(effective_schedule(ms)))
+        self.assertNotEqual(effective_schedule(ms), ms.schedule)
+
+
+class MatchSlotBackfillMigrationTests(TransactionTestCase):
+    """
+    0010 の埋め戻し：その時点の schedule_json（v1）から MatchSlot を作る。名前文字列 / イベント外の ep は捨てる
+    """
+
+    migrate_from = [("tennis", "0009_matchslot")]
+    migrate_to = [("tennis", "0010_fill_match_slots")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        self.addCleanup(self._migrate_to_latest)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def _migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.latest)
+
+    def test_backfill_matches_schedule(self):
+        Club = self.apps.get_model("tennis", "Club")
+        Event = self.apps.get_model("tennis", "Event")
+        EP = self.apps.get_model("tennis", "EventParticipant")
+        MS = self.apps.get_model("tennis", "MatchSchedule")
+
+        club = Club.objects.create(name="club", public_token="p", admin_token="a")
+        event = Event.objects.create(club=club, date=dt.date(2026, 10, 1), title="練習")
+        other = Event.objects.create(club=club, date=dt.date(2026, 10, 2), title="練習")
+        ids = [EP.objects.create(event=event, display_name=f"p{i}").id for i in range(6)]
+        stranger = EP.objects.create(event=other, display_name="x").id
+
+        schedule = generate_doubles_schedule(ids[:5], 2, 1)
+        legacy = [{"round": 1, "matches": [
+            {"court": 1, "team1": [ids[0], "山田"], "team2": [str(ids[1]), stranger]},
+        ], "rests": [ids[2]]}]
+        ms = MS.objects.create(
+            event=event, schedule_json=schedule, game_type="doubles", court_count=1, round_count=2,
+            published=True,
+        )
+        ms_legacy = MS.objects.create(
+            event=other, schedule_json=legacy, game_type="doubles", court_count=1, round_count=1,
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        MatchSlot = executor.loader.project_state(self.migrate_to).apps.get_model("tennis", "MatchSlot")
+
+        def slots(ms_id):
+            return sorted(
+                MatchSlot.objects.filter(match_schedule_id=ms_id)
+                .values_list("round_no", "court_no", "team", "slot_index", "event_participant_id")
+            )
+
+        self.assertEqual(slots(ms.id), expected_slots(schedule))
+        # other イベントの対戦表：自イベントの ep（stranger）だけ残る
+        self.assertEqual(slots(ms_legacy.id), [(1, 1, 2, 1, stranger)])
+
+
+class ScheduleContentHashTests(TestCase):
+    """
+    対戦表 / ドラフトは書き込み時に content_hash / content_size を持ち、公開状態は hash で判定する
+    """
+
+    def setUp(self):
+        club, members = make_club_with_members(8)
+        self.event, self.eps = make_event(club, members)
+        self.ms = publish(self.event, self.eps, GameType.DOUBLES, rounds=2, courts=2)
+
+    def test_hash_follows_schedule_json(self):
+        # hash は保存形式（v2）のもの：v1 形の対戦表は encode_schedule を通して比べる
+        self.assertEqual(
+            (self.ms.content_hash, self.ms.content_size),
+            schedule_content_digest(encode_schedule(self.ms.schedule)),
+        )
+        self.assertNotEqual(self.ms.content_hash, schedule_content_digest(self.ms.schedule)[0])
+        schedule = list(reversed(self.ms.schedule))
+        self.ms.schedule = schedule
+        self.ms.save(update_fields=["schedule_json"])
+        ms = MatchSchedule.objects.get(pk=self.ms.pk)
+        self.assertEqual(ms.content_hash, schedule_content_digest(encode_schedule(schedule))[0])
+        self.assertEqual(ms.schedule, schedule)
+
+        draft = MatchScheduleDraft.objects.create(event=self.event, schedule=schedule)
+        self.assertEqual(draft.content_hash, ms.content_hash)
+
+    def test_publish_state_compares_digests(self):
+        same = json.loads(json.dumps(self.ms.schedule))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(_compute_publish_state(self.event, same), "published")
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("schedule_json", ctx.captured_queries[0]["sql"])
+
+        changed = json.loads(json.dumps(same))
+        changed[0]["rests"] = [self.eps[0].id]
+        self.assertEqual(_compute_publish_state(self.event, changed), "changed")
+
+
+class ScheduleCodecTests(TestCase):
+    """
+    v2（ラウンドごとの int 配列）で保存し、読む側には v1 形で返す。表せないものは v1 のまま
+    """
+
+    def test_generated_schedules_round_trip(self):
+        for schedule in (
+            generate_doubles_schedule(list(range(1, 12)), 6, 2),
+            generate_singles_schedule(list(range(1, 8)), 5, 3),
+            [{"round": 1, "matches": [], "rests": [1, 2, 3]}],  # 試合なし（全員休憩）
+        ):
+            stored = encode_schedule(schedule)
+            self.assertEqual(stored["v"], 2)
+            self.assertEqual(decode_schedule(stored), schedule)
+            self.assertLess(len(json.dumps(stored)), len(json.dumps(schedule)))
+
+    def test_unencodable_schedule_is_kept_as_v1(self):
+        legacy = [{"round": 1, "matches": [{"court": 1, "team1": ["山田"], "team2": ["田中"]}], "rests": []}]
+        self.assertIs(encode_schedule(legacy), legacy)
+        self.assertIs(decode_schedule(legacy), legacy)
+
+    def test_model_reads_decoded_schedule(self):
+        club, members = make_club_with_members(8)
+        event, eps = make_event(club, members)
+        ms = publish(event, eps, GameType.DOUBLES, rounds=2, courts=2)
+        stored = MatchSchedule.objects.get(pk=ms.pk)
+        self.assertEqual(stored.schedule_json["v"], 2)
+        self.assertEqual(stored.schedule, ms.schedule)
+        self.assertEqual(len(stored.schedule[0]["matches"]), 2)
+
+
+class ScheduleViewTests(TestCase):
+    """
+    表示用ビューモデル：名前解決済み・スコア反映済み・選手セルは ep ごとに共有
+    """
+
+    def test_build_resolves_names_and_scores(self):
+        schedule = [
+            {"round": 1, "matches": [{"court": 1, "team1": [1, 2], "team2": [3, 4]}], "rests": [5]},
+            {"round": 2, "matches": [{"court": 1, "team1": [1, 5], "team2": [3, "山田"]}], "rests": [2, 4]},
+        ]
+        name_map = {1: "a", 2: "b", 3: "c", 4: "d", "山田": "山田"}
+        view = build_schedule_view(schedule, name_map, {(1, 1): (6, 4)}, {(1, 1): 3})
+
+        m1, m2 = view[0].matches[0], view[1].matches[0]
+        self.assertEqual([p.name for p in m1.team1], ["a", "b"])
+        self.assertEqual((m1.court, m1.score1, m1.score2, m1.revision), ("1", "6", "4", "3"))
+        self.assertEqual((m2.score1, m2.score2, m2.revision), (None, None, "0"))
+        self.assertEqual([p.name for p in view[0].rests], ["5"])  # 名前表に無ければ ep_id
+        self.assertEqual([p.name for p in m2.team2], ["c", "山田"])
+        self.assertIs(m1.team1[0], m2.team1[0])
+
+    def test_schedule_block_renders_names(self):
+        club, members = make_club_with_members(8)
+        event, eps = make_event(club, members)
+        publish(event, eps, GameType.DOUBLES, rounds=2, courts=2)
+        with PLAIN_STATIC:
+            resp = Client().get(reverse("tennis:event_public", args=[club.public_token, event.id]))
+        self.assertEqual(resp.status_code, 200)
+        html = resp.content.decode()
+        self.assertIn(f'data-ep-id="{eps[0].id}">{eps[0].display_name}</div>', html)
+
+
+class ScheduleDraftStoreTests(TestCase):
+    """
+    生成したドラフトは（既定の）キャッシュに置き、DB に書くのは公開時だけ
+    - settings の既定のまま走らせる（ストアを差し替えるテストだけ override_settings）
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_draft_store.cache_clear()
+        self.addCleanup(get_draft_store.cache_clear)
+        self.club, members = make_club_with_members(10)
+        self.event, self.eps = make_event(self.club, members)
+        self.client = self._admin_client()
+
+    def _admin_client(self):
+        client = Client()
+        session = client.session
+        session[f"tennis_event_admin:{self.event.id}"] = True
+        session.save()
+        return client
+
+    def _generate(self, client=None):
+        r = (client or self.client).post(
+            reverse("tennis:ajax_generate_schedule", args=[self.event.id]),
+            {
+                "participant_ids": ",".join(str(ep.id) for ep in self.eps[:8]),
+                "game_type": GameType.DOUBLES, "num_rounds": 4, "num_courts": 2,
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def _publish(self, draft_generation, client=None):
+        return (client or self.client).post(reverse("tennis:publish_schedule"), {
+            "event_id": self.event.id, "draft_generation": draft_generation,
+        })
+
+    def test_publish_uses_cached_draft(self):
+        for _ in range(3):
+            data = self._generate()
+        self.assertFalse(MatchScheduleDraft.objects.exists())
+
+        self.assertEqual(self._publish(data["draft_generation"]).status_code, 200)
+        ms = MatchSchedule.objects.get(event=self.event)
+        self.assertEqual(ms.schedule, json.loads(data["schedule_json"]))
+        self.assertEqual(
+            set(EventParticipant.objects.filter(event=self.event, participates_match=True).values_list("id", flat=True)),
+            {ep.id for ep in self.eps[:8]},
+        )
+        # 公開したドラフトは破棄（もう一度は使えない）
+        self.assertEqual(self._publish(data["draft_generation"]).json()["error"], "no_draft")
+
+    def test_draft_is_per_admin_session(self):
+        data = self._generate()
+        r = self._publish(data["draft_generation"], client=self._admin_client())
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()["error"], "no_draft")
+
+    @override_settings(TENNIS_DRAFT_STORE_BACKEND="tennis.drafts.DbDraftStore")
+    def test_db_store_keeps_one_draft_per_event(self):
+        first = self._generate()
+        second = self._generate()
+        self.assertEqual(MatchScheduleDraft.objects.get(event=self.event).generation, second["draft_generation"])
+        self.assertEqual(self._publish(first["draft_generation"]).status_code, 400)
+        self.assertEqual(self._publish(second["draft_generation"]).status_code, 200)
+        self.assertFalse(MatchScheduleDraft.objects.exists())
+
+    def test_default_store_keeps_variants_without_db_writes(self):
+        self.assertIsInstance(get_draft_store(), CacheDraftStore)
+        with CaptureQueriesContext(connection) as ctx:
+            ids = [self._generate()["draft_generation"] for _ in range(3)]
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "tennis_matchscheduledraft" in q["sql"]])
+        r = self.client.get(reverse("tennis:schedule_drafts", args=[self.event.id]))
+        self.assertEqual([v["draft_id"] for v in r.json()["variants"]], ids)
+
+    def test_variants_are_bounded(self):
+        ids = [self._generate()["draft_generation"] for _ in range(MAX_DRAFT_VARIANTS + 2)]
+        r = self.client.get(reverse("tennis:schedule_drafts", args=[self.event.id]))
+        variants = r.json()["variants"]
+        self.assertEqual([v["draft_id"] for v in variants], ids[-MAX_DRAFT_VARIANTS:])
+        self.assertTrue(all(len(v["content_hash"]) == 40 and v["metrics"]["players"] == 8 for v in variants))
+        # 押し出された案は公開も表示もできない
+        self.assertEqual(self._publish_variant(ids[0]).status_code, 404)
+        r = self.client.get(reverse("tennis:schedule_draft", args=[self.event.id, ids[0]]))
+        self.assertEqual(r.status_code, 404)
+
+    def test_parallel_puts_keep_bounded_variants(self):
+        store = CacheDraftStore()
+        schedule = generate_doubles_schedule([ep.id for ep in self.eps[:8]], 4, 2)
+        drafts = [new_draft(schedule, {}) for _ in range(MAX_DRAFT_VARIANTS + 3)]
+        run_in_threads(len(drafts), lambda i: store.put(self.event.id, "owner", drafts[i]))
+
+        kept = store.list(self.event.id, "owner")
+        self.assertEqual(len(kept), MAX_DRAFT_VARIANTS)
+        self.assertEqual(len({d.draft_id for d in kept}), MAX_DRAFT_VARIANTS)
+        self.assertTrue(all(store.get(self.event.id, "owner", d.draft_id) == d for d in kept))
+
+        store.discard(self.event.id, "owner")
+        self.assertEqual(store.list(self.event.id, "owner"), [])
+
+    def _publish_variant(self, draft_id):
+        return self.client.post(reverse("tennis:publish_schedule_draft"), {
+            "event_id": self.event.id, "draft_id": draft_id,
+        })
+
+    def test_publish_variant_by_id(self):
+        variants = [self._generate() for _ in range(3)]
+        chosen = variants[0]["variants"][0]
+        self.assertIn(chosen["draft_id"], variants[-1]["variants_html"])
+
+        # 案の切り替え（再生成しない）
+        r = self.client.get(reverse("tennis:schedule_draft", args=[self.event.id, chosen["draft_id"]]))
+        self.assertEqual(r.json()["schedule_json"], variants[0]["schedule_json"])
+
+        self.assertEqual(self._publish_variant(chosen["draft_id"]).status_code, 200)
+        ms = MatchSchedule.objects.get(event=self.event)
+        self.assertEqual(ms.content_hash, chosen["content_hash"])
+        # 公開したらこのセッションの案はすべて破棄
+        r = self.client.get(reverse("tennis:schedule_drafts", args=[self.event.id]))
+        self.assertEqual(r.json()["variants"], [])
+
+    def test_fairness_metrics(self):
+        schedule = [
+            {"round": 1, "matches": [{"court": 1, "team1": [1, 2], "team2": [3, 4]}], "rests": [5]},
+            {"round": 2, "matches": [{"court": 1, "team1": [1, 2], "team2": [3, 5]}], "rests": [4]},
+            {"round": 3, "matches": [{"court": 1, "team1": [1, 3], "team2": [2, 5]}], "rests": [4]},
+        ]
+        self.assertEqual(schedule_fairness(schedule), {
+            "players": 5, "matches_min": 1, "matches_max": 3, "max_rest_streak": 2,
+            "repeat_partners": 1, "repeat_opponents": 4,
+        })
@@ -19,6 +19,17 @@ urlpatterns = [
         name="club_settings",
     ),
 
+    path("c/<str:club_public_token>/head_to_head/", views.club_head_to_head, name="club_head_to_head"),
+    path("c/<str:club_public_token>/attendance_stats/", views.club_attendance_stats, name="club_attendance_stats"),
+
+    # member profile
+    path("c/<str:club_public_token>/member/<int:member_id>/", views.member_profile, name="member_profile"),
+    path(
+        "c/<str:club_public_token>/admin/<str:club_admin_token>/member/<int:member_id>/",
+        views.member_profile,
+        name="member_profile_admin",
+    ),
+
     # event (token-based = club token)
     path(
         "c/<str:club_public_token>/event/<int:event_id>/",
@@ -30,6 +41,21 @@ urlpatterns = [
         views.event_view,
         name="event_admin",
     ),
+    path(
+        "c/<str:club_public_token>/event/<int:event_id>/state/",
+        views.event_state,
+        name="event_state",
+    ),
+    path(
+        "c/<str:club_public_token>/event/<int:event_id>/changes/",
+        views.event_changes,
+        name="event_changes",
+    ),
+    path(
+        "c/<str:club_public_token>/event/<int:event_id>/stream/",
+        views.event_stream,
+        name="event_stream",
+    ),
 
     # club flags (club-wide)
     path("api/club/add_flag/", views.club_add_flag, name="club_add_flag"),
@@ -51,6 +77,7 @@ urlpatterns = [
     path("api/event/set_participates_match/", views.set_participates_match, name="set_participates_match"),
     path("api/event/add_guest/", views.add_guest_participant, name="add_guest_participant"),
     path("api/event/set_flag_value/", views.set_participant_flag_value, name="set_participant_flag_value"),
+    path("api/event/bulk_update_participants/", views.bulk_update_participants, name="bulk_update_participants"),
 
     # schedule
     path(
@@ -58,12 +85,17 @@ urlpatterns = [
         views.ajax_generate_schedule,
         name="ajax_generate_schedule",
     ),
+    path("api/event/<int:event_id>/drafts/", views.schedule_drafts, name="schedule_drafts"),
+    path("api/event/<int:event_id>/drafts/<str:draft_id>/", views.schedule_draft, name="schedule_draft"),
     path("api/event/publish_schedule/", views.publish_schedule, name="publish_schedule"),
+    path("api/event/publish_draft/", views.publish_schedule_draft, name="publish_schedule_draft"),
     path("api/update_event/", views.ajax_update_event, name="ajax_update_event"),
 
 
     # score
     path("api/match/save_score/", views.save_match_score, name="save_match_score"),
+    path("api/match/save_scores/", views.save_match_scores, name="save_match_scores"),
+    path("api/match/sync_scores/", views.sync_match_scores, name="sync_match_scores"),
 
     path("api/club/add_member/", views.club_add_member, name="club_add_member"),
     path("api/club/rename_member/", views.club_rename_member, name="club_rename_member"),
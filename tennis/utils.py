@@ -280,3 +280,56 @@ def generate_doubles_schedule(ep_ids: List[int], num_rounds: int, num_courts: in
         schedule.append({"round": r, "matches": matches, "rests": rests})
 
     return schedule
+
+
+def schedule_fairness(schedule: List[Dict]) -> Dict[str, int]:
+    """
+    生成結果の公平さ指標（ドラフトの見比べ用。試合数の差・連続休憩・重複は小さいほど公平）
+
+    - players                   : 対戦表に出てくる人数
+    - matches_min / matches_max : 1人あたり試合数の最小 / 最大
+    - max_rest_streak           : 最長の連続休憩ラウンド数
+    - repeat_partners           : 同じペアの重複（2回目以降の回数の合計）
+    - repeat_opponents          : 同じ相手との対戦の重複（同上）
+    """
+    players = set()
+    match_count: Counter = Counter()
+    rest_streak: Counter = Counter()
+    partner_counts: Counter = Counter()
+    vs_counts: Counter = Counter()
+    max_rest_streak = 0
+
+    for r in schedule or []:
+        playing = set()
+        for m in r.get("matches") or []:
+            t1 = list(m.get("team1") or [])
+            t2 = list(m.get("team2") or [])
+            playing.update(t1)
+            playing.update(t2)
+            for team in (t1, t2):
+                for i, a in enumerate(team):
+                    for b in team[i + 1:]:
+                        partner_counts[frozenset((a, b))] += 1
+            for a in t1:
+                for b in t2:
+                    vs_counts[frozenset((a, b))] += 1
+
+        rests = list(r.get("rests") or [])
+        players.update(playing)
+        players.update(rests)
+        for p in playing:
+            match_count[p] += 1
+            rest_streak[p] = 0
+        for p in rests:
+            rest_streak[p] += 1
+            max_rest_streak = max(max_rest_streak, rest_streak[p])
+
+    counts = [match_count[p] for p in players]
+    return {
+        "players": len(players),
+        "matches_min": min(counts, default=0),
+        "matches_max": max(counts, default=0),
+        "max_rest_streak": max_rest_streak,
+        "repeat_partners": sum(c - 1 for c in partner_counts.values() if c > 1),
+        "repeat_opponents": sum(c - 1 for c in vs_counts.values() if c > 1),
+    }
@@ -0,0 +1,105 @@
+# tennis/versioning.py
+import datetime as dt
+import hashlib
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Max, Sum
+
+from .models import Club, Event
+
+
+# ============================================================
+# Version counters（Club / Event）
+# - 画面に効く書き込みの最後で +1 する（UPDATE 1本・行ロック不要）
+# - GET 側は数値を読むだけで「前回から変わったか」が分かる
+# ============================================================
+
+
+def bump_event_version(event_id: int, *, scores: bool = False) -> int:
+    """
+    +1 した後の version を返す（行の change_version に刻む値）
+    - 刻む行の書き込みと同じトランザクション内で呼ぶこと：
+      Event 行のロックでバージョン採番が直列化され、「version=V を読めたのに
+      V 以下の変更がまだ見えない」状態が起きない
+    - scores=True：スコアが変わった（score_version も同じ UPDATE で進める）
+    - UPDATE ... RETURNING の1文：Event 行ロックは呼び出し元のトランザクション終了まで続くので、
+      呼び出し元は他の行ロック / 集計を済ませてから最後に呼ぶ（ロックを持つ区間を短くする）
+    """
+    qn = connection.ops.quote_name
+    sets = [f"{qn('version')} = {qn('version')} + 1"]
+    if scores:
+        sets.append(f"{qn('score_version')} = {qn('score_version')} + 1")
+    sql = (
+        f"UPDATE {qn(Event._meta.db_table)} SET {', '.join(sets)} "
+        f"WHERE {qn('id')} = %s RETURNING {qn('version')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [event_id])
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump_club_version(club_id: int) -> None:
+    Club.objects.filter(pk=club_id).update(version=F("version") + 1)
+
+
+def _etag(*parts) -> str:
+    raw = "|".join(str(p) for p in (settings.PAGE_ETAG_SALT, *parts))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# ETag（テンプレート描画前に 304 を返すための指紋）
+# - None を返したら 304 判定はせず、通常どおり view に任せる（404/400 等）
+# ============================================================
+
+
+def event_page_etag(club_public_token: str, event_id: int, *, admin_token: str | None = None,
+                    admin_session: bool = False) -> str | None:
+    """
+    event ページ：Event.version + Club.version（名前変更/フラグ定義/固定化はクラブ側）を1クエリで
+    - admin_session：幹事セッション未確立なら別 ETag にして、view 側でセッションを立てさせる
+    """
+    row = (
+        Event.objects
+        .filter(id=int(event_id), club__public_token=club_public_token, club__is_active=True)
+        .values_list("version", "club__version", "club__admin_token")
+        .first()
+    )
+    if row is None:
+        return None
+    event_version, club_version, club_admin_token = row
+    if admin_token is not None and admin_token != club_admin_token:
+        return None
+    return _etag("event", event_id, event_version, club_version, admin_token is not None, admin_session)
+
+
+def club_home_etag(club_public_token: str, year: int, month: int, today, *,
+                   admin_token: str | None = None) -> str | None:
+    """
+    club_home：Club.version + 当月イベントの (件数, 最大id, version 合計/最大)
+    - 当月分は (club, date) の範囲集計1本。today はカレンダーの「今日」表示用
+    """
+    row = (
+        Club.objects
+        .filter(public_token=club_public_token, is_active=True)
+        .values_list("id", "version", "admin_token")
+        .first()
+    )
+    if row is None:
+        return None
+    club_id, club_version, club_admin_token = row
+    is_admin = bool(admin_token) and admin_token == club_admin_token
+
+    first = dt.date(year, month, 1)
+    next_first = (first + dt.timedelta(days=32)).replace(day=1)
+    agg = (
+        Event.objects
+        .filter(club_id=club_id, date__gte=first, date__lt=next_first)
+        .aggregate(n=Count("id"), last_id=Max("id"), v_sum=Sum("version"), v_max=Max("version"))
+    )
+    return _etag(
+        "club", club_id, club_version, is_admin, year, month, today,
+        agg["n"], agg["last_id"], agg["v_sum"], agg["v_max"],
+    )
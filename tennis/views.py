@@ -6,15 +6,61 @@ from collections import defaultdict
 from datetime import time
 
 from django.db import transaction, models
-from django.db.models import Max
+from django.db.models import (
+    Case, Count, F, FloatField, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, RowNumber, Trim
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.utils import timezone
-from django.views.decorators.http import require_POST, require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST, require_http_methods
 from django.template.loader import render_to_string
 
 from .utils import generate_doubles_schedule, generate_singles_schedule
+from .rollups import (
+    CREATED,
+    apply_matchup_deltas,
+    attendance_rate_rows,
+    discard_event_attendance,
+    discard_matchup_scores,
+    head_to_head_rows,
+    track_attendance,
+)
+from .fragments import cached_schedule_block
+from .participant_ops import (
+    GUARDED_OPS,
+    ParticipantOpError,
+    apply_attendance,
+    apply_participant_ops,
+    parse_participant_ops,
+    upsert_member_participants,
+    upsert_participant_flags,
+)
+from .pubsub import event_channel, get_broker, publish_event_change
+from .drafts import draft_owner, get_draft_store, new_draft
+from .schedule_codec import encode_schedule
+from .schedule_view import PlayerCells, build_match_view, build_round_view, build_schedule_view
+from .scoring import (
+    MAX_BATCH_SCORES,
+    ScoreWriteError,
+    apply_score_edits,
+    parse_score_ops,
+    parse_score_value,
+    sync_score_ops,
+)
+from .slots import load_round_slots, sync_match_slots
+from .substitutions import (
+    apply_overlay,
+    compose_swap,
+    effective_schedule,
+    load_round_overlay,
+    save_round_overlay,
+)
+from .snapshot import build_name_map, ep_display_name, load_event_snapshot
+from .versioning import bump_club_version, bump_event_version, club_home_etag, event_page_etag
 from .models import (
     Club,
     Event,
@@ -23,9 +69,13 @@ from .models import (
     ClubFlagDefinition,
     ParticipantFlag,
     MatchSchedule,
-    MatchScheduleDraft,
     MatchScore,
     GameType,
+    MatchupRelation,
+    MatchSlot,
+    ScoreSyncOp,
+    Substitution,
+    schedule_content_digest,
 )
 
 # ============================================================
@@ -46,7 +96,10 @@ def _admin_session_key(event_id: int) -> str:
 
 
 def _mark_event_admin_session(request, event_id: int) -> None:
-    request.session[_admin_session_key(event_id)] = True
+    key = _admin_session_key(event_id)
+    if request.session.get(key):
+        return  # 既に立っていればセッションを書き直さない（GET を読み取りのみに保つ）
+    request.session[key] = True
     # セッション保存を確実に
     request.session.modified = True
 
@@ -176,34 +229,45 @@ def _get_or_create_member_for_name(club: Club, name: str) -> Member | None:
 
 def _get_or_create_ep(event: Event, member: Member | None, display_name: str) -> EventParticipant:
     """
-    - memberあり: unique(event, member) を満たすよう get_or_create
+    - memberあり: unique(event, member) 上の upsert（作成 / 既存行を1文で返す。名前が違えば合わせる）
     - memberなし: display_name で都度作成（互換用）
     """
     display_name = (display_name or "").strip() or "Guest"
 
     if member is not None:
-        ep, _ = EventParticipant.objects.get_or_create(
-            event=event,
-            member=member,
-            defaults={"display_name": display_name},
-        )
-        if ep.display_name != display_name:
-            ep.display_name = display_name
-            ep.save(update_fields=["display_name", "updated_at"])
+        # 初回入力（未登録行）の同時タップ：1文 upsert で作成 or 既存行を返す
+        # 仮の version（0）で upsert → 作成 / 改名したときだけ Event.version を進めて刻む（EP → Event）
+        with transaction.atomic():
+            ep, created, renamed = upsert_member_participants(event, [(member.id, display_name)], 0)[member.id]
+            if created or renamed:
+                ep.change_version = bump_event_version(event.id)
+                EventParticipant.objects.filter(pk=ep.pk).update(change_version=ep.change_version)
+            if created:
+                # 出欠ロールアップ：EP ができた時点で「未設定」1件
+                track_attendance(event, [(member.id, CREATED, None)])
         return ep
 
-    return EventParticipant.objects.create(event=event, member=None, display_name=display_name)
+    with transaction.atomic():
+        return EventParticipant.objects.create(
+            event=event, member=None, display_name=display_name,
+            change_version=bump_event_version(event.id),
+        )
 
 
-def _build_score_map(match_schedule: MatchSchedule):
+def _build_score_map(match_schedule: MatchSchedule, revisions: dict | None = None):
+    """
+    revisions を渡すと (round, court) → revision も同じクエリで詰める（スコア入力欄の楽観的排他用）
+    """
     score_map = {}
     qs = MatchScore.objects.filter(match_schedule=match_schedule)
     for s in qs:
         score_map[(int(s.round_no), int(s.court_no))] = (s.side_a_score, s.side_b_score)
+        if revisions is not None:
+            revisions[(int(s.round_no), int(s.court_no))] = s.revision
     return score_map
 
 
-def _merge_scores_into_schedule(schedule_json, score_map):
+def _merge_scores_into_schedule(schedule_json, score_map, revisions: dict | None = None):
     if not schedule_json:
         return []
 
@@ -226,6 +290,7 @@ def _merge_scores_into_schedule(schedule_json, score_map):
                     "score2": s2,
                     "round_no": round_no,
                     "court_no": court_no,
+                    "revision": (revisions or {}).get((round_no, court_no), 0),
                 }
             )
         rests = list(r.get("rests") or [])
@@ -234,15 +299,23 @@ def _merge_scores_into_schedule(schedule_json, score_map):
 
 
 def _build_ep_name_map(event: Event) -> dict:
-    m = {}
-    for ep in EventParticipant.objects.filter(event=event).select_related("member").order_by("id"):
-        name = ep.member.display_name if ep.member_id and ep.member else (ep.display_name or "")
-        if ep.id is not None:
-            m[int(ep.id)] = name
-        if name:
-            m[str(name)] = name  # 互換キー
-    return m
+    return build_name_map(
+        EventParticipant.objects.filter(event=event).select_related("member").order_by("id")
+    )
+
 
+def _render_schedule_block(request, event: Event, ms: MatchSchedule, name_map: dict) -> str:
+    """
+    公開済み対戦表ブロックの描画（cached_schedule_block のミス時に呼ぶ）
+    """
+    revisions = {}
+    score_map = _build_score_map(ms, revisions)
+    ctx = {
+        "event": event,
+        "schedule": build_schedule_view(effective_schedule(ms), name_map, score_map, revisions),
+        "schedule_json": None,
+    }
+    return render_to_string("tennis/_schedule_block.html", ctx, request=request)
 
 
 def _next_member_no(club: Club) -> int:
@@ -264,17 +337,27 @@ def _norm_schedule_json(x):
     return x if x is not None else []
 
 
-def _compute_publish_state(event, schedule_from_generation=None):
+def _compute_publish_state(event, schedule_from_generation=None, content_hash=None):
+    """
+    公開版と同じ内容か：保存済みの content_hash どうしを比べる（公開版の JSON は読まない）
+    - content_hash: 生成側で計算済みなら渡す（Draft 保存時の hash）
+    """
     schedule = _norm_schedule_json(schedule_from_generation)
     if not schedule:
         return "no_schedule"
 
-    ms = MatchSchedule.objects.filter(event=event, published=True).first()
-    if not ms:
+    published_hash = (
+        MatchSchedule.objects
+        .filter(event=event, published=True)
+        .values_list("content_hash", flat=True)
+        .first()
+    )
+    if published_hash is None:
         return "ready"
 
-    published_schedule = _norm_schedule_json(ms.schedule_json)
-    if published_schedule == schedule:
+    if content_hash is None:
+        content_hash, _size = schedule_content_digest(encode_schedule(schedule))
+    if published_hash == content_hash:
         return "published"
     return "changed"
 
@@ -297,23 +380,22 @@ def _optional_admin_token_check(request, club: Club):
 # ============================================================
 
 
-def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
-    events = list(events_qs)
-    if not events:
-        return {"ranked": [], "others": []}
-
-    ms_by_event = {}
-    for ms in MatchSchedule.objects.filter(event__in=events, published=True, game_type=game_type):
-        ms_by_event[ms.event_id] = ms
+def _month_ranking_stats(schedules) -> dict:
+    """
+    [(MatchSchedule, 代打反映後の対戦表), ...] を JSON から数える
+    → {選手キー: {"name", "member_id", "matches", "wins", "losses", "draws", "gf", "ga"}}
+    - 選手キー: 固定メンバーは ("m", member_id)、ゲスト / 旧形式の名前は ("g", 名前)
+    """
+    stats = {}
+    schedules = [(ms, schedule) for ms, schedule in schedules if schedule]
+    if not schedules:
+        return stats
 
-    # 月の対象イベントに出てくるEPをまとめて引く（高速化）
+    # 対象の対戦表に出てくるEPをまとめて引く（高速化）
     # ※ schedule_json に入っているのが ep_id 前提
     ep_ids = set()
-    for ev in events:
-        ms = ms_by_event.get(ev.id)
-        if not ms or not ms.schedule_json:
-            continue
-        for r in (ms.schedule_json or []):
+    for _ms, schedule in schedules:
+        for r in schedule:
             for m in (r.get("matches") or []):
                 for p in (m.get("team1") or []):
                     if isinstance(p, int) or (isinstance(p, str) and p.isdigit()):
@@ -327,11 +409,13 @@ def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
         for ep in EventParticipant.objects.filter(id__in=list(ep_ids)).select_related("member")
     }
 
-    stats = {}
-
     def ensure(key, name):
         if key not in stats:
-            stats[key] = {"name": name, "matches": 0, "wins": 0, "losses": 0, "draws": 0, "gf": 0, "ga": 0}
+            stats[key] = {
+                "name": name,
+                "member_id": key[1] if key[0] == "m" else None,
+                "matches": 0, "wins": 0, "losses": 0, "draws": 0, "gf": 0, "ga": 0,
+            }
         return stats[key]
 
     def resolve_player_key_and_name(p):
@@ -348,8 +432,8 @@ def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
                     # 固定メンバー：member_idで集約
                     name = ep.member.display_name if ep.member else (ep.display_name or f"Member#{ep.member_id}")
                     return (("m", ep.member_id), name)
-                # ゲスト：表示名で集計
-                gname = (ep.display_name or f"Guest#{ep.id}").strip()
+                # ゲスト：表示名で集計（空白だけの名前は Guest#id：SQL 版の NullIf(Trim(...)) と同じ）
+                gname = (ep.display_name or "").strip() or f"Guest#{ep.id}"
                 return (("g", gname), gname)
 
             # EPが見つからない（保険）
@@ -359,14 +443,10 @@ def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
         name = str(p).strip()
         return (("g", name), name)
 
-    for ev in events:
-        ms = ms_by_event.get(ev.id)
-        if not ms or not ms.schedule_json:
-            continue
-
+    for ms, schedule in schedules:
         score_map = _build_score_map(ms)
 
-        for r in (ms.schedule_json or []):
+        for r in schedule:
             round_no = int(r.get("round") or 0)
             for m in (r.get("matches") or []):
                 court_no = int(m.get("court") or 0)
@@ -405,6 +485,16 @@ def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
                     else:
                         st["draws"] += 1
 
+    return stats
+
+
+def _rank_month_stats(stats: dict, min_matches: int) -> dict:
+    """
+    集計 → {"ranked": [...], "others": [...]}（Python 版。SQL 版の突き合わせ用オラクル）
+    - 並びは丸める前の率（勝数/試合数・取得/総ゲーム）：丸めの方式の違いで順位が動かない
+      （SQL 版の倍精度の割り算と同じ値になる）
+    - 同率の最後は name → member_id（ゲストは後ろ）で必ず順位を分ける
+    """
     rows = []
     for st in stats.values():
         m = st["matches"]
@@ -419,13 +509,160 @@ def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
     ranked = [r for r in rows if r["matches"] >= min_matches]
     others = [r for r in rows if r["matches"] < min_matches]
 
-    ranked.sort(key=lambda r: (-(r["win_pct"]), -(r["gp_pct"]), -(r["wins"]), -(r["diff"]), -(r["matches"]), r["name"]))
+    ranked.sort(key=lambda r: (
+        -(r["wins"] / r["matches"]),
+        -(r["gf"] / (r["gf"] + r["ga"]) if (r["gf"] + r["ga"]) else 0.0),
+        -(r["wins"]), -(r["diff"]), -(r["matches"]), r["name"],
+        r["member_id"] is None, r["member_id"] or 0,
+    ))
     for i, r in enumerate(ranked, 1):
         r["rank"] = i
 
     return {"ranked": ranked, "others": others}
 
 
+def build_month_ranking(events_qs, game_type: str, min_matches: int = 3):
+    events = list(events_qs)
+    if not events:
+        return {"ranked": [], "others": []}
+
+    # 代打はオーバーレイ（Substitution）なので、反映後の対戦表で集計する
+    schedules = [
+        (ms, effective_schedule(ms))
+        for ms in (
+            MatchSchedule.objects
+            .filter(event__in=events, published=True, game_type=game_type)
+            .prefetch_related("substitutions")
+        )
+    ]
+    return _rank_month_stats(_month_ranking_stats(schedules), min_matches)
+
+
+def build_month_ranking_sql(events_qs, game_type: str, min_matches: int = 3):
+    """
+    build_month_ranking と同じ結果を DB 側で計算する版（MatchSlot × MatchScore）
+    - 集計：選手キー（member_id / ゲスト名）ごとに SUM / COUNT
+    - 順位：ROW_NUMBER() OVER (PARTITION BY 規定試合数以上か ORDER BY 勝率, 取得率, wins, diff, matches, name, member_id)
+      率は丸める前の倍精度の割り算で並べる（ROUND の端数処理は DB ごとに違うので並びに使わない）
+      表示用の win_pct / gp_pct だけ Python の round で丸める
+    - MatchSlot に載らない選手が居る対戦表（has_legacy_players）がある月は Python 版で数える（旧データのみ）
+    - SQLite(3.25+) / Postgres 共通。Python 版はテストのオラクルとして残す
+    """
+    schedules = MatchSchedule.objects.filter(event__in=events_qs, published=True, game_type=game_type)
+    if schedules.filter(has_legacy_players=True).exists():
+        return build_month_ranking(events_qs, game_type, min_matches)
+
+    score = MatchScore.objects.filter(
+        match_schedule=OuterRef("match_schedule"),
+        round_no=OuterRef("round_no"),
+        court_no=OuterRef("court_no"),
+    )
+
+    ep_name = Coalesce(
+        NullIf(Trim("event_participant__display_name"), Value("")),
+        Concat(Value("Guest#"), Cast("event_participant_id", models.CharField())),
+    )
+
+    qs = (
+        MatchSlot.objects
+        .filter(match_schedule__in=schedules, team__in=(1, 2))
+        .annotate(
+            sa=Subquery(score.values("side_a_score")[:1]),
+            sb=Subquery(score.values("side_b_score")[:1]),
+        )
+        .filter(sa__isnull=False, sb__isnull=False)
+        .annotate(
+            gf_i=Case(When(team=1, then=F("sa")), default=F("sb")),
+            ga_i=Case(When(team=1, then=F("sb")), default=F("sa")),
+            # 固定メンバーは member_id、ゲストは表示名で集計（Python 版と同じキー）
+            player_key=Case(
+                When(
+                    event_participant__member__isnull=False,
+                    then=Concat(Value("m:"), Cast("event_participant__member_id", models.CharField())),
+                ),
+                default=Concat(Value("g:"), ep_name),
+                output_field=models.CharField(),
+            ),
+            player_name=Case(
+                When(
+                    event_participant__member__isnull=False,
+                    then=F("event_participant__member__display_name"),
+                ),
+                default=ep_name,
+                output_field=models.CharField(),
+            ),
+        )
+        .values("player_key")
+        .annotate(
+            name=Max("player_name"),
+            member_id=Max("event_participant__member_id"),
+            matches=Count("id"),
+            wins=Sum(Case(When(gf_i__gt=F("ga_i"), then=Value(1)), default=Value(0), output_field=IntegerField())),
+            losses=Sum(Case(When(gf_i__lt=F("ga_i"), then=Value(1)), default=Value(0), output_field=IntegerField())),
+            draws=Sum(Case(When(gf_i=F("ga_i"), then=Value(1)), default=Value(0), output_field=IntegerField())),
+            gf=Sum("gf_i"),
+            ga=Sum("ga_i"),
+        )
+        .annotate(
+            diff=F("gf") - F("ga"),
+            win_ratio=Cast(F("wins"), FloatField()) / Cast(F("matches"), FloatField()),
+            gp_ratio=Case(
+                When(
+                    Q(gf__gt=0) | Q(ga__gt=0),
+                    then=Cast(F("gf"), FloatField()) / Cast(F("gf") + F("ga"), FloatField()),
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+            is_ranked=Case(
+                When(matches__gte=min_matches, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        .annotate(
+            rank=Window(
+                expression=RowNumber(),
+                partition_by=[F("is_ranked")],
+                order_by=[
+                    F("win_ratio").desc(),
+                    F("gp_ratio").desc(),
+                    F("wins").desc(),
+                    F("diff").desc(),
+                    F("matches").desc(),
+                    F("name").asc(),
+                    F("member_id").asc(nulls_last=True),
+                ],
+            ),
+        )
+        .order_by("-is_ranked", "rank")
+    )
+
+    ranked, others = [], []
+    for row in qs:
+        m, w, gf, ga = int(row["matches"]), int(row["wins"]), int(row["gf"]), int(row["ga"])
+        st = {
+            "name": row["name"],
+            "member_id": row["member_id"],
+            "matches": m,
+            "wins": w,
+            "losses": int(row["losses"]),
+            "draws": int(row["draws"]),
+            "gf": gf,
+            "ga": ga,
+            "win_pct": round((w / m) * 100, 1) if m else 0.0,
+            "gp_pct": round((gf / (gf + ga)) * 100, 1) if (gf + ga) else 0.0,
+            "diff": int(row["diff"]),
+        }
+        if row["is_ranked"]:
+            st["rank"] = int(row["rank"])
+            ranked.append(st)
+        else:
+            others.append(st)
+
+    return {"ranked": ranked, "others": others}
+
+
 # ============================================================
 # Pages
 # ============================================================
@@ -524,6 +761,21 @@ def club_settings(request, club_public_token, club_admin_token):
     )
 
 
+def _club_home_month(request):
+    today = timezone.localdate()
+    year = _parse_int(request.GET.get("year"), default=today.year, min_v=2000, max_v=2100) or today.year
+    month = _parse_int(request.GET.get("month"), default=today.month, min_v=1, max_v=12) or today.month
+    return today, year, month
+
+
+def _club_home_etag(request, club_public_token, club_admin_token=None):
+    today, year, month = _club_home_month(request)
+    return club_home_etag(club_public_token, year, month, today, admin_token=club_admin_token)
+
+
+# ✅ 毎回再検証させ、変化が無ければ描画前に 304（ランキング集計もスキップ）
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_club_home_etag)
 def club_home(request, club_public_token, club_admin_token=None):
     """
     共通ホーム（メンバー/幹事）
@@ -538,9 +790,7 @@ def club_home(request, club_public_token, club_admin_token=None):
         is_admin = True
         admin_token = club.admin_token
 
-    today = timezone.localdate()
-    year = _parse_int(request.GET.get("year"), default=today.year, min_v=2000, max_v=2100) or today.year
-    month = _parse_int(request.GET.get("month"), default=today.month, min_v=1, max_v=12) or today.month
+    today, year, month = _club_home_month(request)
 
     first = dt.date(year, month, 1)
     next_month_date = (first + dt.timedelta(days=32)).replace(day=1)
@@ -553,8 +803,8 @@ def club_home(request, club_public_token, club_admin_token=None):
     month_weeks = _build_month_calendar(year, month, events_qs)
 
     # ランキング（ダブルス/シングルス）
-    ranking_doubles = build_month_ranking(events_qs, GameType.DOUBLES)
-    ranking_singles = build_month_ranking(events_qs, GameType.SINGLES)
+    ranking_doubles = build_month_ranking_sql(events_qs, GameType.DOUBLES)
+    ranking_singles = build_month_ranking_sql(events_qs, GameType.SINGLES)
 
     prev_month_date = (first - dt.timedelta(days=1)).replace(day=1)
     prev_year, prev_month = prev_month_date.year, prev_month_date.month
@@ -598,13 +848,284 @@ def club_home(request, club_public_token, club_admin_token=None):
     )
 
 
+# ============================================================
+# Head-to-head / Partner matrix
+# ============================================================
+
+
+@require_http_methods(["GET"])
+def club_head_to_head(request, club_public_token):
+    """
+    「Xと組んだ時 / Yと戦った時の成績」マトリクス
+    - MemberMatchup（スコア保存時に差分更新）を1クエリで引くだけ
+    - ?relation=partner|opponent（既定 opponent）, ?member_id=（1人分だけ）
+    """
+    club = get_object_or_404(Club, public_token=club_public_token, is_active=True)
+
+    relation = (request.GET.get("relation") or MatchupRelation.OPPONENT).strip()
+    if relation not in MatchupRelation.values:
+        return JsonResponse({"ok": False, "error": "bad_relation"}, status=400)
+
+    member_id = _parse_int(request.GET.get("member_id"))
+
+    members = {}
+    matrix = defaultdict(dict)
+    for row in head_to_head_rows(club, relation, member_id=member_id):
+        members[row["member_id"]] = row["member_name"]
+        members[row["other_id"]] = row["other_name"]
+        m = row["matches"]
+        gf = row["games_for"]
+        ga = row["games_against"]
+        matrix[str(row["member_id"])][str(row["other_id"])] = {
+            "matches": m,
+            "wins": row["wins"],
+            "losses": row["losses"],
+            "draws": row["draws"],
+            "gf": gf,
+            "ga": ga,
+            "win_pct": round((row["wins"] / m) * 100, 1) if m else 0.0,
+            "gp_pct": round((gf / (gf + ga)) * 100, 1) if (gf + ga) else 0.0,
+        }
+
+    return JsonResponse({
+        "ok": True,
+        "relation": relation,
+        "members": [{"id": k, "name": v} for k, v in members.items()],
+        "matrix": matrix,
+    })
+
+
+# ============================================================
+# Attendance analytics（member × 月ロールアップ）
+# ============================================================
+
+
+def _parse_yyyy_mm(s: str):
+    try:
+        return dt.datetime.strptime((s or "").strip(), "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+@require_http_methods(["GET"])
+def club_attendance_stats(request, club_public_token):
+    """
+    期間内の member ごとの出欠率（MemberAttendanceMonth を1クエリで集計）
+    - ?from=YYYY-MM&to=YYYY-MM（既定：今年1月〜今月）
+    - rate = yes / (yes + no + maybe + unset)
+    """
+    club = get_object_or_404(Club, public_token=club_public_token, is_active=True)
+
+    today = timezone.localdate()
+    first_month = _parse_yyyy_mm(request.GET.get("from")) or dt.date(today.year, 1, 1)
+    last_month = _parse_yyyy_mm(request.GET.get("to")) or today.replace(day=1)
+    if last_month < first_month:
+        return JsonResponse({"ok": False, "error": "bad_range"}, status=400)
+
+    members = []
+    for row in attendance_rate_rows(club, first_month, last_month):
+        total = row["yes_n"] + row["no_n"] + row["maybe_n"] + row["unset_n"]
+        members.append({
+            "member_id": row["member_id"],
+            "name": row["name"],
+            "is_fixed": row["is_fixed"],
+            "yes": row["yes_n"],
+            "no": row["no_n"],
+            "maybe": row["maybe_n"],
+            "unset": row["unset_n"],
+            "total": total,
+            "rate": round((row["yes_n"] / total) * 100, 1) if total else 0.0,
+        })
+
+    return JsonResponse({
+        "ok": True,
+        "from": first_month.strftime("%Y-%m"),
+        "to": last_month.strftime("%Y-%m"),
+        "members": members,
+    })
+
+
+# ============================================================
+# Member profile（出欠履歴 / 試合結果 / 推移）
+# ============================================================
+
+
+PROFILE_PAGE_SIZE = 20
+
+
+def _parse_profile_cursor(raw: str):
+    """
+    keyset cursor: "YYYY-MM-DD:event_id"（このイベントより古いものを返す）
+    """
+    raw = (raw or "").strip()
+    if not raw or ":" not in raw:
+        return None
+    d_str, _, id_str = raw.partition(":")
+    d = _parse_date_yyyy_mm_dd(d_str)
+    ev_id = _parse_int(id_str)
+    if not d or ev_id is None:
+        return None
+    return d, ev_id
+
+
+def _member_match_results(ep_ids):
+    """
+    EP ごとの試合結果（MatchSlot × MatchScore を1クエリで集計）
+    """
+    if not ep_ids:
+        return {}
+
+    score = MatchScore.objects.filter(
+        match_schedule=OuterRef("match_schedule"),
+        round_no=OuterRef("round_no"),
+        court_no=OuterRef("court_no"),
+    )
+    rows = (
+        MatchSlot.objects
+        .filter(event_participant_id__in=ep_ids, team__in=(1, 2), match_schedule__published=True)
+        .annotate(
+            sa=Subquery(score.values("side_a_score")[:1]),
+            sb=Subquery(score.values("side_b_score")[:1]),
+        )
+        .values("event_participant_id", "round_no", "court_no", "team", "sa", "sb")
+        .order_by("event_participant_id", "round_no")
+    )
+
+    out = defaultdict(lambda: {"matches": 0, "wins": 0, "losses": 0, "draws": 0, "gf": 0, "ga": 0, "games": []})
+    for r in rows:
+        st = out[r["event_participant_id"]]
+        gf, ga = (r["sa"], r["sb"]) if r["team"] == 1 else (r["sb"], r["sa"])
+        st["games"].append({"round": r["round_no"], "court": r["court_no"], "gf": gf, "ga": ga})
+        if gf is None or ga is None:
+            continue
+        st["matches"] += 1
+        st["gf"] += int(gf)
+        st["ga"] += int(ga)
+        if gf > ga:
+            st["wins"] += 1
+        elif gf < ga:
+            st["losses"] += 1
+        else:
+            st["draws"] += 1
+    return out
+
+
+@require_http_methods(["GET"])
+def member_profile(request, club_public_token, member_id, club_admin_token=None):
+    """
+    メンバー個人ページ（クラブトークン必須）
+    - (event_date, event_id) の keyset ページング：深い履歴でもページサイズ分しか読まない
+    - EventParticipant(member, event_date, event) インデックス前提（event_date は Event.date のコピー）
+    """
+    club = get_object_or_404(Club, public_token=club_public_token, is_active=True)
+
+    is_admin = False
+    if club_admin_token is not None:
+        if club.admin_token != club_admin_token:
+            return HttpResponseBadRequest("admin token mismatch")
+        is_admin = True
+
+    member = get_object_or_404(Member, id=int(member_id), club=club)
+
+    qs = (
+        EventParticipant.objects
+        .filter(member=member, event__club=club)
+        .select_related("event")
+        .order_by("-event_date", "-event_id")
+    )
+
+    cursor = _parse_profile_cursor(request.GET.get("before"))
+    if cursor:
+        d, ev_id = cursor
+        qs = qs.filter(Q(event_date__lt=d) | Q(event_date=d, event_id__lt=ev_id))
+
+    eps = list(qs[: PROFILE_PAGE_SIZE + 1])
+    has_next = len(eps) > PROFILE_PAGE_SIZE
+    eps = eps[:PROFILE_PAGE_SIZE]
+
+    results = _member_match_results([ep.id for ep in eps])
+
+    history = []
+    for ep in eps:
+        st = results.get(ep.id)
+        m = st["matches"] if st else 0
+        gf = st["gf"] if st else 0
+        ga = st["ga"] if st else 0
+        history.append({
+            "event": ep.event,
+            "attendance": ep.attendance or "",
+            "comment": ep.comment or "",
+            "matches": m,
+            "wins": st["wins"] if st else 0,
+            "losses": st["losses"] if st else 0,
+            "draws": st["draws"] if st else 0,
+            "gf": gf,
+            "ga": ga,
+            "win_pct": round((st["wins"] / m) * 100, 1) if m else None,
+            "gp_pct": round((gf / (gf + ga)) * 100, 1) if (gf + ga) else None,
+            "games": st["games"] if st else [],
+        })
+
+    # 推移（古い→新しい順。試合のあった回のみ）
+    trend = [
+        {"date": h["event"].date, "win_pct": h["win_pct"], "gp_pct": h["gp_pct"]}
+        for h in reversed(history)
+        if h["matches"]
+    ]
+
+    attendance_totals = dict(
+        EventParticipant.objects
+        .filter(member=member, event__club=club)
+        .values("attendance")
+        .annotate(n=Count("id"))
+        .values_list("attendance", "n")
+    )
+
+    next_cursor = ""
+    if has_next and eps:
+        last = eps[-1]
+        next_cursor = f"{last.event_date:%Y-%m-%d}:{last.event_id}"
+
+    return render(
+        request,
+        "tennis/member_profile.html",
+        {
+            "club": club,
+            "member": member,
+            "is_admin": is_admin,
+            "history": history,
+            "trend": trend,
+            "attendance_totals": {
+                "yes": attendance_totals.get("yes", 0),
+                "no": attendance_totals.get("no", 0),
+                "maybe": attendance_totals.get("maybe", 0),
+                "unset": attendance_totals.get(None, 0),
+            },
+            "next_cursor": next_cursor,
+            "is_first_page": cursor is None,
+            "show_topbar": True,
+        },
+    )
+
+
 # ============================================================
 # Event (統合ビュー) : 完成版 event_view
 # ============================================================
 
+def _event_view_etag(request, club_public_token, event_id, club_admin_token=None):
+    admin_session = club_admin_token is not None and _is_event_admin_session(request, int(event_id))
+    return event_page_etag(
+        club_public_token, event_id, admin_token=club_admin_token, admin_session=admin_session,
+    )
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_event_view_etag)
 def event_view(request, club_public_token, event_id, club_admin_token=None):
     club = get_object_or_404(Club, public_token=club_public_token, is_active=True)
-    event = get_object_or_404(Event, id=int(event_id), club=club)
+    event = get_object_or_404(
+        Event.objects.select_related("match_schedule"), id=int(event_id), club=club
+    )
 
     # ------------------------------------------------------------
     # admin 判定（token一致なら admin セッションを立てる）
@@ -616,174 +1137,358 @@ def event_view(request, club_public_token, event_id, club_admin_token=None):
         is_admin = True
         _mark_event_admin_session(request, event.id)
 
-    flags = list(
-        ClubFlagDefinition.objects.filter(club=club, is_active=True)
-        .order_by("display_order", "id")
-    )
+    # ------------------------------------------------------------
+    # 一括ロード（EP はここで1回だけ読む）
+    # - スコアは対戦表フラグメントのキャッシュミス時だけ読む
+    # ------------------------------------------------------------
+    snap = load_event_snapshot(event, with_scores=False)
+    ms = snap.match_schedule
+    flag_states_on, flag_states_val = snap.flag_states
+    name_map = snap.name_map
 
     # ------------------------------------------------------------
-    # 固定メンバー（デフォルト行）
+    # 対戦表表示用
     # ------------------------------------------------------------
-    members = list(
-        Member.objects.filter(club=club, is_fixed=True)
-        .order_by("member_no", "id")
-    )
-    member_ids = [m.id for m in members]
-
-    eps_by_member = {
-        ep.member_id: ep
-        for ep in (
-            EventParticipant.objects
-            .filter(event=event, member_id__in=member_ids)
-            .select_related("member")
+    if ms:
+        game_type = ms.game_type or GameType.DOUBLES
+        num_rounds = int(ms.round_count or 8)
+        num_courts = int(ms.court_count or 1)
+
+        match_count = snap.match_count
+        publish_state = "published"
+
+        schedule_for_view = None
+        schedule_json_for_publish = None
+        schedule_block_html = cached_schedule_block(
+            ms, name_map, "admin" if is_admin else "public",
+            lambda: _render_schedule_block(request, event, ms, name_map),
         )
+    else:
+        game_type = GameType.DOUBLES
+        num_rounds = 8
+
+        if is_admin:
+            match_count = snap.match_count
+        else:
+            match_count = 0
+
+        num_courts = 0 if match_count < 4 else 2
+        publish_state = "no_schedule"
+        schedule_for_view = []
+        schedule_json_for_publish = None
+        schedule_block_html = None
+
+    ctx = {
+        "club": club,
+        "event": event,
+        "is_admin": is_admin,
+        "flags": snap.flags,
+        "flag_input_mode": getattr(club, "flag_input_mode", "check"),
+        "flag_states_on": flag_states_on,
+        "flag_states_val": flag_states_val,
+
+        "fixed_rows": snap.fixed_rows,
+        "guest_rows": snap.guest_rows,
+        "guest_row_blank": {
+            "ep_id": "", "member_id": None, "display_name": "", "attendance": None,
+            "comment": "", "participates_match": False,
+        },
+        "max_flags": MAX_FLAGS,
+
+        "game_type": game_type,
+        "num_rounds": num_rounds,
+        "num_courts": num_courts,
+        "match_count": match_count,
+        "publish_state": publish_state,
+        "schedule": schedule_for_view,
+        "schedule_json": schedule_json_for_publish,
+        "schedule_block_html": schedule_block_html,
+
+        "show_controls": bool(is_admin),
+        "pill_game_type": game_type,
+        "pill_num_courts": num_courts,
+        "pill_num_rounds": num_rounds,
+        "pill_match_count": match_count,
+
+        # 代打候補：公開済み対戦表のときだけ渡す（public/admin共通）
+        "sub_candidates": snap.sub_candidates if ms else [],
+        "show_topbar": True,
     }
+    return render(request, "tennis/event.html", ctx)
 
-    # ------------------------------------------------------------
-    # フラグ状態
-    # ------------------------------------------------------------
-    pf_qs = ParticipantFlag.objects.filter(
-        event_participant__event=event,
-        flag_definition__club=club,
-    ).values("event_participant_id", "flag_definition_id", "is_on", "value")
 
-    flag_states_on = defaultdict(dict)
-    flag_states_val = defaultdict(dict)
+# ============================================================
+# Event state (JSON) : クライアント側描画 / 差分なし再取得用
+# ============================================================
 
-    for pf in pf_qs:
-        ep_id = pf["event_participant_id"]
-        fd_id = pf["flag_definition_id"]
-        flag_states_on[ep_id][fd_id] = bool(pf["is_on"])
-        flag_states_val[ep_id][fd_id] = pf["value"]  # None or int
 
+def _event_state_payload(snap) -> dict:
+    """
+    event_view と同じスナップショットから組む（HTML と同じ内容を JSON で）
+    - flags は既定値（OFF / 空）以外だけ載せる：{flag_id: true | 数値}
+    """
+    event = snap.event
+    ms = snap.match_schedule
+    flag_states_on, flag_states_val = snap.flag_states
+    digit_ids = {f.id for f in snap.flags if f.input_mode == "digit"}
+
+    def row_flags(ep_id):
+        if ep_id is None:
+            return {}
+        out = {}
+        for fd_id, on in flag_states_on.get(ep_id, {}).items():
+            if fd_id in digit_ids:
+                val = flag_states_val.get(ep_id, {}).get(fd_id)
+                if val is not None:
+                    out[str(fd_id)] = val
+            elif on:
+                out[str(fd_id)] = True
+        return out
 
-    # ------------------------------------------------------------
-    # 公開済み対戦表
-    # ------------------------------------------------------------
-    ms = MatchSchedule.objects.filter(event=event, published=True).first()
+    rows = []
+    for kind, src in (("fixed", snap.fixed_rows), ("guest", snap.guest_rows)):
+        for row in src:
+            rows.append({
+                "kind": kind,
+                "ep_id": row["ep_id"],
+                "member_id": row["member_id"],
+                "name": row["display_name"],
+                "attendance": row["attendance"] or "",
+                "comment": row["comment"],
+                "match": row["participates_match"],
+                "flags": row_flags(row["ep_id"]),
+            })
 
-    # A案：GETのたびに Draft 破棄（現行踏襲）
-    MatchScheduleDraft.objects.filter(event=event).delete()
+    schedule = None
+    if ms is not None:
+        schedule = {
+            "game_type": ms.game_type or GameType.DOUBLES,
+            "court_count": int(ms.court_count or 1),
+            "round_count": int(ms.round_count or 8),
+            "locked": bool(ms.locked),
+            "rounds": _merge_scores_into_schedule(effective_schedule(ms), snap.score_map, snap.score_revisions),
+        }
 
-    fixed_rows = []
-    for m in members:
-        ep = eps_by_member.get(m.id)
-        fixed_rows.append(
-            {
-                "member_id": m.id,
-                "ep_id": ep.id if ep else None,
-                "display_name": (
-                    ep.member.display_name
-                    if (ep and ep.member_id and ep.member)
-                    else (ep.display_name if ep else m.display_name)
-                ),
-                "attendance": ep.attendance if ep else None,
-                "comment": ep.comment if ep else "",
-                "participates_match": bool(ep.participates_match) if ep else False,
-            }
-        )
+    return {
+        "ok": True,
+        "version": event.version,
+        "club_version": event.club.version,
+        "event": {
+            "id": event.id,
+            "title": event.title or "",
+            "date": event.date.strftime("%Y-%m-%d"),
+            "place": event.place or "",
+            "cancelled": bool(event.cancelled),
+        },
+        "flags": [
+            {"id": f.id, "name": f.name, "input_mode": f.input_mode}
+            for f in snap.flags
+        ],
+        "rows": rows,
+        "match_count": snap.match_count,
+        "publish_state": "published" if ms is not None else "no_schedule",
+        "schedule": schedule,
+        # JSON のキーは文字列になるので ep_id だけに絞る（名前キーの互換分は不要）
+        "name_map": {str(k): v for k, v in snap.name_map.items() if isinstance(k, int)},
+        "sub_candidates": snap.sub_candidates if ms is not None else [],
+    }
 
-    # 固定メンバー以外はゲスト枠へ（非固定メンバー含む）
-    guest_eps = (
-        EventParticipant.objects.filter(event=event)
-        .exclude(member_id__in=member_ids)
-        .select_related("member")
-        .order_by("id")
+
+def _event_state_etag(request, club_public_token, event_id):
+    return event_page_etag(club_public_token, event_id)
+
+
+@require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_event_state_etag)
+def event_state(request, club_public_token, event_id):
+    """
+    イベント画面の状態を1本の JSON で返す（version 付き・変化が無ければ 304）
+    - event.js はゲスト追加後などにこれを引いて DOM を更新する（ページ再読込なし）
+    """
+    club = get_object_or_404(Club, public_token=club_public_token, is_active=True)
+    event = get_object_or_404(
+        Event.objects.select_related("club", "match_schedule"), id=int(event_id), club=club
     )
+    return JsonResponse(_event_state_payload(load_event_snapshot(event)))
 
-    guest_rows = [
-        {
-            "ep_id": ep.id,
-            "member_id": ep.member_id,  # None の可能性あり
-            "display_name": (ep.member.display_name if (ep.member_id and ep.member) else (ep.display_name or "")),
-            "attendance": ep.attendance,
-            "comment": ep.comment or "",
-            "participates_match": bool(ep.participates_match),
-        }
-        for ep in guest_eps
-    ]
 
-    # ------------------------------------------------------------
-    # 代打候補（仕様：attendance=yes のみ / participates_match は無視）
-    # 公開済み対戦表のときだけ渡す（public/admin共通）
-    # ------------------------------------------------------------
-    sub_candidates = []
-    if ms:  # published schedule exists
-        sub_candidates_qs = (
-            EventParticipant.objects
-            .filter(event=event, attendance="yes")
-            .select_related("member")
-            .order_by("id")
+# ============================================================
+# Event changes (JSON) : ?since=V の差分同期（ポーリング用）
+# ============================================================
+
+
+def _participant_delta_row(ep, fixed_member_ids) -> dict:
+    return {
+        "kind": "fixed" if ep.member_id in fixed_member_ids else "guest",
+        "ep_id": ep.id,
+        "member_id": ep.member_id,
+        "name": ep_display_name(ep),
+        "attendance": ep.attendance or "",
+        "comment": ep.comment or "",
+        "match": bool(ep.participates_match),
+    }
+
+
+@require_http_methods(["GET"])
+def event_changes(request, club_public_token, event_id):
+    """
+    前回同期（version=V）以降に変わった参加者 / フラグ / スコアだけ返す
+    - 変化なし：Event の PK 1本（version と club.version を読むだけ）
+    - club.version が違う（名前変更/フラグ定義変更 等）・since 不正 → full=true で全量
+    - 対戦表の公開/代打（schedule.change_version > V）は対戦表ごと全量で返す
+    ※ version を先に読み、その後で行を読む（後から commit された行は次回に回る）
+    """
+    row = (
+        Event.objects
+        .filter(id=int(event_id), club__public_token=club_public_token, club__is_active=True)
+        .values_list("version", "club__version")
+        .first()
+    )
+    if row is None:
+        return JsonResponse({"ok": False, "error": "not_found"}, status=404)
+    version, club_version = row
+
+    since = _parse_int(request.GET.get("since"), min_v=0)
+    client_club_version = _parse_int(request.GET.get("club_version"), min_v=0)
+
+    if since is not None and since == version and client_club_version == club_version:
+        return JsonResponse({"ok": True, "version": version, "club_version": club_version, "changed": False})
+
+    event = get_object_or_404(
+        Event.objects.select_related("club", "match_schedule"), id=int(event_id)
+    )
+
+    if since is None or since > version or client_club_version != club_version:
+        payload = _event_state_payload(load_event_snapshot(event))
+        payload.update({"version": version, "changed": True, "full": True})
+        return JsonResponse(payload)
+
+    participants = list(
+        EventParticipant.objects
+        .filter(event=event, change_version__gt=since)
+        .select_related("member")
+        .order_by("id")
+    )
+    fixed_member_ids = set()
+    if participants:
+        fixed_member_ids = set(
+            Member.objects.filter(club_id=event.club_id, is_fixed=True).values_list("id", flat=True)
         )
-        sub_candidates = [
-            {
-                "ep_id": ep.id,
-                "name": (ep.member.display_name if (ep.member_id and ep.member) else (ep.display_name or str(ep.id))),
-            }
-            for ep in sub_candidates_qs
-        ]
 
+    flags = list(
+        ParticipantFlag.objects
+        .filter(event_participant__event=event, change_version__gt=since)
+        .values("event_participant_id", "flag_definition_id", "is_on", "value")
+    )
 
-    # ------------------------------------------------------------
-    # 対戦表表示用
-    # ------------------------------------------------------------
-    if ms:
-        game_type = ms.game_type or GameType.DOUBLES
-        num_rounds = int(ms.round_count or 8)
-        num_courts = int(ms.court_count or 1)
+    try:
+        ms = event.match_schedule
+    except MatchSchedule.DoesNotExist:
+        ms = None
+    if ms is not None and not ms.published:
+        ms = None
 
-        match_count = EventParticipant.objects.filter(event=event, participates_match=True).count()
-        publish_state = "published"
+    schedule = None
+    scores = []
+    revisions = {}
+    if ms is not None and ms.change_version > since:
+        schedule = {
+            "game_type": ms.game_type or GameType.DOUBLES,
+            "court_count": int(ms.court_count or 1),
+            "round_count": int(ms.round_count or 8),
+            "locked": bool(ms.locked),
+            "rounds": _merge_scores_into_schedule(effective_schedule(ms), _build_score_map(ms, revisions), revisions),
+        }
+    elif ms is not None:
+        scores = [
+            {"round_no": r, "court_no": c, "a": a, "b": b, "revision": rev}
+            for r, c, a, b, rev in (
+                MatchScore.objects
+                .filter(match_schedule=ms, change_version__gt=since)
+                .values_list("round_no", "court_no", "side_a_score", "side_b_score", "revision")
+            )
+        ]
+
+    return JsonResponse({
+        "ok": True,
+        "version": version,
+        "club_version": club_version,
+        "changed": True,
+        "full": False,
+        "event": {
+            "id": event.id,
+            "title": event.title or "",
+            "date": event.date.strftime("%Y-%m-%d"),
+            "place": event.place or "",
+            "cancelled": bool(event.cancelled),
+        },
+        "participants": [_participant_delta_row(ep, fixed_member_ids) for ep in participants],
+        "flags": [
+            {
+                "ep_id": f["event_participant_id"],
+                "flag_id": f["flag_definition_id"],
+                "on": bool(f["is_on"]),
+                "value": f["value"],
+            }
+            for f in flags
+        ],
+        "publish_state": "published" if ms is not None else "no_schedule",
+        "schedule": schedule,
+        "scores": scores,
+    })
 
-        score_map = _build_score_map(ms)
-        schedule_for_view = _merge_scores_into_schedule(ms.schedule_json, score_map)
-        schedule_json_for_publish = None
-    else:
-        game_type = GameType.DOUBLES
-        num_rounds = 8
 
-        if is_admin:
-            match_count = EventParticipant.objects.filter(event=event, participates_match=True).count()
-        else:
-            match_count = 0
+# ============================================================
+# Event stream (SSE) : スコア/代打/出欠を commit 後に push（ASGI で動かす）
+# ============================================================
 
-        num_courts = 0 if match_count < 4 else 2
-        publish_state = "no_schedule"
-        schedule_for_view = []
-        schedule_json_for_publish = None
+SSE_HEARTBEAT_SECONDS = 25
 
-    ctx = {
-        "club": club,
-        "event": event,
-        "is_admin": is_admin,
-        "flags": flags,
-        "flag_input_mode": getattr(club, "flag_input_mode", "check"),
-        "flag_states_on": {k: dict(v) for k, v in flag_states_on.items()},
-        "flag_states_val": {k: dict(v) for k, v in flag_states_val.items()},
 
-        "fixed_rows": fixed_rows,
-        "guest_rows": guest_rows,
-        "max_flags": MAX_FLAGS,
+def _sse(kind: str, data: dict) -> str:
+    return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-        "game_type": game_type,
-        "num_rounds": num_rounds,
-        "num_courts": num_courts,
-        "match_count": match_count,
-        "publish_state": publish_state,
-        "schedule": schedule_for_view,
-        "schedule_json": schedule_json_for_publish,
 
-        "show_controls": bool(is_admin),
-        "pill_game_type": game_type,
-        "pill_num_courts": num_courts,
-        "pill_num_rounds": num_rounds,
-        "pill_match_count": match_count,
+async def event_stream(request, club_public_token, event_id):
+    """
+    text/event-stream。届いた通知は version 付きなので、クライアントは
+    changes?since=V で差分を取り直す（取りこぼしても次の通知/ポーリングで追いつく）
+    - 接続1本 = asyncio タスク1つ（スレッドを占有しない）。WSGI では使わないこと
+    """
+    if request.method != "GET":
+        return JsonResponse({"ok": False, "error": "method_not_allowed"}, status=405)
+    if not isinstance(request, ASGIRequest):
+        # WSGI（同期ワーカー）で開きっぱなしにするとワーカーを占有する → 204 で再接続させない
+        return HttpResponse(status=204)
+
+    # トークンを確かめてから購読する（不正なリクエストではブローカーに購読を作らない）
+    event_qs = Event.objects.filter(id=int(event_id), club__public_token=club_public_token, club__is_active=True)
+    if not await event_qs.aexists():
+        raise Http404("event not found")
+
+    # 購読してから version を読む（その間の変更は購読側に届く）
+    subscription = get_broker().subscribe(event_channel(event_id), heartbeat=SSE_HEARTBEAT_SECONDS)
+    version = await event_qs.values_list("version", flat=True).afirst()
+    if version is None:
+        await subscription.aclose()
+        raise Http404("event not found")
+
+    async def stream():
+        try:
+            yield f"retry: 3000\n{_sse('hello', {'version': version})}"
+            async for message in subscription:
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield _sse(message.get("type") or "change", message)
+        finally:
+            await subscription.aclose()
 
-        "ep_name_map": _build_ep_name_map(event),
-        "sub_candidates": sub_candidates,  # ✅ 追加（幹事のときだけ中身あり）
-        "show_topbar": True,
-    }
-    return render(request, "tennis/event.html", ctx)
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # プロキシでのバッファリング抑止
+    return response
 
 
 # ============================================================
@@ -835,6 +1540,7 @@ def club_add_flag(request):
         input_mode=input_mode,   # ★ここが肝
         is_active=True,
     )
+    bump_club_version(club.id)
 
     return JsonResponse({
         "ok": True,
@@ -874,6 +1580,7 @@ def club_delete_flag(request):
 
     flag.is_active = False
     flag.save(update_fields=["is_active", "updated_at"])
+    bump_club_version(club.id)
 
     return JsonResponse({"ok": True})
 
@@ -901,6 +1608,7 @@ def club_rename_flag(request):
 
     flag.name = name
     flag.save(update_fields=["name", "updated_at"])
+    bump_club_version(flag.club_id)
     return JsonResponse({"ok": True, "name": flag.name})
 
 
@@ -916,6 +1624,7 @@ def club_rename_club(request):
     club = get_object_or_404(Club, id=int(club_id), is_active=True)
     club.name = name
     club.save(update_fields=["name", "updated_at"])
+    bump_club_version(club.id)
     return JsonResponse({"ok": True, "name": club.name})
 
 
@@ -977,6 +1686,7 @@ def club_cancel_event(request):
     ev = get_object_or_404(Event, id=event_id)
     ev.cancelled = not bool(ev.cancelled)
     ev.save(update_fields=["cancelled", "updated_at"])
+    bump_event_version(ev.id)
     return JsonResponse({"ok": True, "cancelled": ev.cancelled})
 
 
@@ -987,7 +1697,13 @@ def club_delete_event(request):
         return JsonResponse({"error": "event_id required"}, status=400)
 
     ev = get_object_or_404(Event, id=event_id)
-    ev.delete()
+    with transaction.atomic():
+        ms = MatchSchedule.objects.filter(event=ev).first()
+        if ms:
+            discard_matchup_scores(ms, club_id=ev.club_id)
+        discard_event_attendance(ev)
+        ev.delete()
+        bump_club_version(ev.club_id)  # 月の件数が同じでも club_home の ETag を必ず変える
     return JsonResponse({"ok": True})
 
 
@@ -1053,24 +1769,18 @@ def update_attendance(request):
     else:
         return JsonResponse({"error": "missing_target"}, status=400)
 
-    old = ep.attendance or ""
-    new = attendance or ""
-
-    ep.attendance = new or None
-
-    # =========================
-    # A案：出欠が上位
-    # =========================
-    if new != "yes":
-        # no/maybe/空 は強制OFF
-        ep.participates_match = False
-    else:
-        # yes に変わった瞬間はデフォルトON
-        if old != "yes":
-            ep.participates_match = True
-        # old==yes の場合は participates_match を触らない（ユーザーのOFFを尊重）
+    with transaction.atomic():
+        # 同時押しでロールアップが二重に動かないよう行ロック
+        ep = EventParticipant.objects.select_for_update().get(pk=ep.pk)
+        before = ep.attendance
+        apply_attendance(ep, attendance)
+        ep.change_version = bump_event_version(event.id)
+        ep.save(update_fields=["attendance", "participates_match", "change_version", "updated_at"])
+        track_attendance(event, [(ep.member_id, before, ep.attendance)])
+        publish_event_change(
+            event.id, "attendance", ep.change_version, ep_id=ep.id, attendance=ep.attendance or "",
+        )
 
-    ep.save(update_fields=["attendance", "participates_match", "updated_at"])
     return JsonResponse({
         "ok": True,
         "attendance": ep.attendance or "",
@@ -1098,8 +1808,10 @@ def update_comment(request):
     else:
         return JsonResponse({"error": "missing_target"}, status=400)
 
-    ep.comment = comment
-    ep.save(update_fields=["comment", "updated_at"])
+    with transaction.atomic():
+        ep.comment = comment
+        ep.change_version = bump_event_version(event.id)
+        ep.save(update_fields=["comment", "change_version", "updated_at"])
     return JsonResponse({"ok": True, "ep_id": ep.id})
 
 
@@ -1141,8 +1853,10 @@ def set_participates_match(request):
         will_on = False
 
     if ep.participates_match != will_on:
-        ep.participates_match = will_on
-        ep.save(update_fields=["participates_match", "updated_at"])
+        with transaction.atomic():
+            ep.participates_match = will_on
+            ep.change_version = bump_event_version(event.id)
+            ep.save(update_fields=["participates_match", "change_version", "updated_at"])
 
     return JsonResponse({
         "ok": True,
@@ -1188,24 +1902,29 @@ def toggle_participant_flag(request):
     else:
         return JsonResponse({"ok": False, "error": "missing_target"}, status=400)
 
-    obj, _ = ParticipantFlag.objects.get_or_create(
-        event_participant=ep,
-        flag_definition=flagdef,
-    )
-
-    # ★必ず反映
-    if obj.is_on != is_on:
-        obj.is_on = is_on
-        try:
-            obj.save(update_fields=["is_on", "updated_at"])
-        except Exception:
-            obj.save()
+    # ★1文 upsert（並行トグルでも一意制約で落ちない）。既に同じ状態なら書かず、版も進めない
+    with transaction.atomic():
+        # 同じ EP への書き込みは EP 行ロックで直列に（ロック順は EP → Event）
+        ep = EventParticipant.objects.select_for_update().get(pk=ep.pk)
+        current = (
+            ParticipantFlag.objects
+            .filter(event_participant=ep, flag_definition=flagdef)
+            .values_list("is_on", flat=True)
+            .first()
+        )
+        if bool(current) != is_on:
+            upsert_participant_flags([
+                ParticipantFlag(
+                    event_participant=ep, flag_definition=flagdef,
+                    is_on=is_on, change_version=bump_event_version(event.id),
+                )
+            ], with_value=False)
 
     return JsonResponse({
         "ok": True,
         "ep_id": ep.id,
         "flag_id": flagdef.id,
-        "checked": bool(obj.is_on),
+        "checked": is_on,
     })
 
 
@@ -1226,6 +1945,7 @@ def club_set_flag_input_mode(request):
 
     club.flag_input_mode = mode
     club.save(update_fields=["flag_input_mode"])
+    bump_club_version(club.id)
     return JsonResponse({"ok": True, "mode": club.flag_input_mode})
 
 
@@ -1270,18 +1990,16 @@ def set_participant_flag_value(request):
         if next_val < 0 or next_val > 9:
             return JsonResponse({"ok": False, "error": "bad_value"}, status=400)
 
-    obj, _created = ParticipantFlag.objects.get_or_create(
+    # ★digitモードは value を保存。is_on も“連動”させておくと後が楽
+    obj = ParticipantFlag(
         event_participant=ep,
         flag_definition=flagdef,
+        value=next_val,
+        is_on=(next_val is not None),  # ←「数字が入っていればON扱い」
     )
-
-    # ★digitモードは value を保存。is_on も“連動”させておくと後が楽
-    obj.value = next_val
-    obj.is_on = (next_val is not None)  # ←「数字が入っていればON扱い」
-    try:
-        obj.save(update_fields=["value", "is_on", "updated_at"])
-    except Exception:
-        obj.save()
+    with transaction.atomic():
+        obj.change_version = bump_event_version(event.id)
+        upsert_participant_flags([obj], with_value=True)
 
     return JsonResponse({
         "ok": True,
@@ -1316,6 +2034,61 @@ def add_guest_participant(request):
     return JsonResponse({"ok": True, "ep_id": ep.id, "display_name": ep.display_name})
 
 
+@require_POST
+def bulk_update_participants(request):
+    """
+    出欠/試合参加/コメント/フラグをまとめて更新（ops は JSON 配列：participant_ops 参照）
+    - ガード・EP/フラグ定義の解決は1回だけ、書き込みは1トランザクション
+    - 1件でも不正なら何も書かず {"error", "index"} を返す
+    """
+    event_id = (request.POST.get("event_id") or "").strip()
+    if not event_id:
+        return JsonResponse({"ok": False, "error": "missing_event_id"}, status=400)
+    try:
+        raw = json.loads(request.POST.get("ops") or "")
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "bad_ops"}, status=400)
+
+    event = get_object_or_404(Event, id=int(event_id))
+
+    try:
+        ops = parse_participant_ops(raw)
+    except ParticipantOpError as e:
+        return JsonResponse({"ok": False, "error": e.code, "index": e.index}, status=400)
+
+    if any(op["op"] in GUARDED_OPS for op in ops):
+        blocked = _guard_participant_change(request, event, require_admin_when_published=True)
+        if blocked:
+            return blocked
+
+    try:
+        result = apply_participant_ops(event, ops)
+    except ParticipantOpError as e:
+        return JsonResponse({"ok": False, "error": e.code, "index": e.index}, status=400)
+
+    participants = result["participants"]
+    if result["version"] is not None:
+        publish_event_change(
+            event.id, "attendance", result["version"], ep_ids=[ep.id for ep in participants],
+        )
+
+    return JsonResponse({
+        "ok": True,
+        "version": result["version"],
+        "participants": [
+            {
+                "ep_id": ep.id,
+                "member_id": ep.member_id,
+                "attendance": ep.attendance or "",
+                "comment": ep.comment or "",
+                "match": bool(ep.participates_match),
+            }
+            for ep in participants
+        ],
+        "flags": result["flags"],
+    })
+
+
 # ============================================================
 # Schedule
 # ============================================================
@@ -1389,8 +2162,10 @@ def ajax_generate_schedule(request, event_id):
 
     # ============================================================
     # A案：Draft を公開元にするため「生成したら Draft を必ず保存」する
-    #  - publish_schedule は Draft が無いと no_draft で落ちる仕様
-    #  - GET(event_view)では Draft を消すので「生成→公開」は同一画面内で完結させる
+    #  - 生成ごとに generation（= draft_id）を振り直し、画面側に返す
+    #  - 公開時は generation 一致 & TTL 内の Draft だけ採用（GET では消さない＝ページ表示は読み取りのみ）
+    #  - 保存先はドラフトストア（既定の CacheDraftStore なら DB に書くのは公開時だけ。
+    #    DbDraftStore を明示指定したときは生成ごとに MatchScheduleDraft を上書き）
     # ============================================================
     # participant_ids を「公開時に participates_match を確定反映」するため params_json に入れる
     participant_ids = [int(x) for x in ep_ids]
@@ -1402,33 +2177,68 @@ def ajax_generate_schedule(request, event_id):
         "participant_ids": participant_ids,
     }
 
-    MatchScheduleDraft.objects.update_or_create(
-        event=event,
-        defaults={
-            "draft_json": schedule,
-            "params_json": params_json,
-        },
+    draft = new_draft(schedule, params_json)
+    draft_store = get_draft_store()
+    owner = draft_owner(request)
+    draft_store.put(event.id, owner, draft)
+
+    return _draft_response(request, event, draft, schedule, draft_store.list(event.id, owner))
+
+
+def _draft_variant_payload(draft) -> dict:
+    params = draft.params or {}
+    return {
+        "draft_id": draft.draft_id,
+        "content_hash": draft.content_hash,
+        "content_size": draft.content_size,
+        "game_type": params.get("game_type") or GameType.DOUBLES,
+        "num_courts": int(params.get("num_courts") or 0),
+        "num_rounds": int(params.get("num_rounds") or 0),
+        "match_count": len(params.get("participant_ids") or []),
+        "metrics": draft.metrics,
+    }
+
+
+def _render_draft_variants(request, event: Event, variants: list, current_id: str | None) -> str:
+    return render_to_string(
+        "tennis/_draft_variants.html",
+        {"event": event, "variants": variants, "current_id": current_id},
+        request=request,
     )
 
+
+def _draft_response(request, event: Event, draft, schedule: list, drafts: list) -> JsonResponse:
+    """
+    生成 / 案の切り替え 共通：draft を画面に出すための HTML / JSON
+    - drafts: このセッションが保持している案（古い順）。見比べ用の表にする
+    """
+    params = draft.params or {}
+    game_type = params.get("game_type") or GameType.DOUBLES
+    num_courts = int(params.get("num_courts") or 1)
+    num_rounds = int(params.get("num_rounds") or 1)
+    match_count = len(params.get("participant_ids") or [])
+
     # 表示用ctx（_schedule_block.html 側で pill を一致させる）
     ctx = {
         "event": event,
-        "schedule": schedule,
+        "schedule": build_schedule_view(schedule, _build_ep_name_map(event)),
         "schedule_json": schedule,  # publish 用（json_script化）
         "stats": None,
-        "ep_name_map": _build_ep_name_map(event),
 
         # ★pill一致
         "show_controls": True,
         "pill_game_type": game_type,
-        "pill_num_courts": int(num_courts),
-        "pill_num_rounds": int(num_rounds),
-        "pill_match_count": int(match_count),
-        "publish_state": _compute_publish_state(event, schedule_from_generation=schedule),
+        "pill_num_courts": num_courts,
+        "pill_num_rounds": num_rounds,
+        "pill_match_count": match_count,
+        "publish_state": _compute_publish_state(
+            event, schedule_from_generation=schedule, content_hash=draft.content_hash,
+        ),
     }
 
     schedule_html = render_to_string("tennis/_schedule_block.html", ctx, request=request)
     stats_html = render_to_string("tennis/_stats_block.html", ctx, request=request)
+    variants = [_draft_variant_payload(d) for d in drafts]
 
     return JsonResponse(
         {
@@ -1441,18 +2251,62 @@ def ajax_generate_schedule(request, event_id):
 
             # ★JSが pills を更新するために必要
             "game_type": game_type,
-            "num_courts": int(num_courts),
-            "num_rounds": int(num_rounds),
-            "match_count": int(match_count),
+            "num_courts": num_courts,
+            "num_rounds": num_rounds,
+            "match_count": match_count,
 
             # ★これが無いと「生成したのに公開できない」になる
             # publishSchedule() は current-schedule-json の中身（JSON）を送る設計なので、
             # 生成APIでも必ず返して、JS側で script#current-schedule-json に保存する。
             "schedule_json": json.dumps(schedule, ensure_ascii=False),
+            "draft_generation": draft.draft_id,
+
+            # 保持している案の見比べ（公平さ指標 / hash）
+            "variants": variants,
+            "variants_html": _render_draft_variants(request, event, variants, draft.draft_id),
         }
     )
 
 
+@require_http_methods(["GET"])
+def schedule_drafts(request, event_id):
+    """
+    このセッションが保持している案の一覧（古い順）。?current=draft_id で表示中の案に印を付ける
+    """
+    event = get_object_or_404(Event, id=int(event_id))
+
+    blocked = _guard_admin_only(request, event)
+    if blocked:
+        return blocked
+
+    drafts = get_draft_store().list(event.id, draft_owner(request))
+    variants = [_draft_variant_payload(d) for d in drafts]
+    return JsonResponse({
+        "ok": True,
+        "variants": variants,
+        "variants_html": _render_draft_variants(request, event, variants, request.GET.get("current")),
+    })
+
+
+@require_http_methods(["GET"])
+def schedule_draft(request, event_id, draft_id):
+    """
+    保持している案の1つを画面に出す（生成と同じ形で返す。再生成はしない）
+    """
+    event = get_object_or_404(Event, id=int(event_id))
+
+    blocked = _guard_admin_only(request, event)
+    if blocked:
+        return blocked
+
+    draft_store = get_draft_store()
+    owner = draft_owner(request)
+    draft = draft_store.get(event.id, owner, draft_id)
+    if draft is None:
+        return JsonResponse({"ok": False, "error": "no_draft"}, status=404)
+    return _draft_response(request, event, draft, draft.schedule, draft_store.list(event.id, owner))
+
+
 @require_POST
 def ajax_update_event(request):
     """
@@ -1520,6 +2374,7 @@ def ajax_update_event(request):
     if changed_fields:
         # updated_at は auto_now=True なので save() で更新される
         event.save(update_fields=changed_fields + ["updated_at"])
+        bump_event_version(event.id)
 
     # meta_text（event.html の表示用）
     meta_text = event.date.strftime("%Y-%m-%d")
@@ -1568,16 +2423,21 @@ def publish_schedule(request):
 
     # ============================================================
     # A案：基本は Draft を公開元にする
-    # ただし Draft が無い場合だけ POST schedule_json をフォールバック採用
-    # （リロードで Draft が破棄されても公開できるようにする）
+    # ただし Draft が無い / 画面の generation と違う / 期限切れ の場合は
+    # POST schedule_json をフォールバック採用（画面に見えている対戦表を公開する）
     # ============================================================
     schedule = None
+    schedule_hash = None
     params = {}
 
-    draft = MatchScheduleDraft.objects.filter(event=event).first()
-    if draft and draft.draft_json:
-        schedule = draft.draft_json
-        params = (draft.params_json or {}) if isinstance(draft.params_json, dict) else {}
+    draft_generation = (request.POST.get("draft_generation") or "").strip()
+    draft_store = get_draft_store()
+    owner = draft_owner(request)
+    draft = draft_store.get(event.id, owner, draft_generation)
+    if draft is not None:
+        schedule = draft.schedule
+        schedule_hash = draft.content_hash or None
+        params = draft.params
     else:
         raw = (request.POST.get("schedule_json") or "").strip()
         if not raw:
@@ -1593,6 +2453,18 @@ def publish_schedule(request):
         # フォールバック時は params が無いので最低限だけ推定（必要なら後で強化）
         params = {}
 
+    resp = _publish_schedule(event, schedule, schedule_hash, params, force)
+    if resp.status_code == 200:
+        # 公開したら Draft 破棄（A案維持）。commit 後に：失敗した公開はやり直せるよう残す
+        draft_store.discard(event.id, owner)
+    return resp
+
+
+def _publish_schedule(event, schedule, schedule_hash, params: dict, force: bool) -> JsonResponse:
+    """
+    公開本体（publish_schedule / publish_schedule_draft 共通）
+    - schedule_hash: 分かっていれば渡す（Draft の content_hash）。None なら計算する
+    """
     game_type = (params.get("game_type") or GameType.DOUBLES)
     court_count = params.get("num_courts", params.get("court_count", 1))
     round_count = params.get("num_rounds", params.get("round_count", (len(schedule) or 1)))
@@ -1615,7 +2487,7 @@ def publish_schedule(request):
             event=event,
             published=True,
             defaults={
-                "schedule_json": schedule,
+                "schedule": schedule,
                 "game_type": game_type,
                 "court_count": int(court_count),
                 "round_count": int(round_count),
@@ -1623,21 +2495,46 @@ def publish_schedule(request):
             },
         )
 
+        version = None
         if not created:
+            # ロック順は MatchSchedule → MatchScore → 集計 → Event（スコア保存/代打と同じ）
+            ms = MatchSchedule.objects.select_for_update().get(pk=ms.pk)
             if force:
+                scores = list(MatchScore.objects.select_for_update().filter(match_schedule=ms))
+                discard_matchup_scores(ms, scores, club_id=event.club_id)
+                version = bump_event_version(event.id, scores=True)
                 MatchScore.objects.filter(match_schedule=ms).delete()
                 ms.locked = False
 
-            ms.schedule_json = schedule
+            # 新しい対戦表には前の代打（オーバーレイ）/ オフライン同期の op ログを持ち越さない
+            # （古い op_id / ts が新しい対戦表への op を重複・stale 扱いにしないように）
+            Substitution.objects.filter(match_schedule=ms).delete()
+            ScoreSyncOp.objects.filter(match_schedule=ms).delete()
+
+            # 内容が同じなら対戦表本体は書き直さない（hash だけで判定）
+            if schedule_hash is None:
+                schedule_hash, _size = schedule_content_digest(encode_schedule(schedule))
+            content_changed = ms.content_hash != schedule_hash
+
+            ms.schedule = schedule
             ms.game_type = game_type
             ms.court_count = int(court_count)
             ms.round_count = int(round_count)
             ms.published = True
             ms.save(update_fields=[
-                "schedule_json","game_type","court_count","round_count",
+                *(["schedule_json"] if content_changed else []),
+                "game_type","court_count","round_count",
                 "published","locked","updated_at"
             ])
 
+        # 版の採番は対戦表行の後（スコア保存/代打と同じ MatchSchedule → Event のロック順）
+        if version is None:
+            version = bump_event_version(event.id)
+        MatchSchedule.objects.filter(pk=ms.pk).update(change_version=version)
+
+        # 正規化テーブルも同期（集計・履歴は MatchSlot から引く）
+        sync_match_slots(ms)
+
         # Draft participant_ids がある時だけ participates_match を反映
         pids = params.get("participant_ids") or []
         fixed_pids = []
@@ -1648,15 +2545,49 @@ def publish_schedule(request):
                 pass
 
         if fixed_pids:
-            EventParticipant.objects.filter(event=event).update(participates_match=False)
+            EventParticipant.objects.filter(event=event).update(
+                participates_match=False, change_version=version,
+            )
             EventParticipant.objects.filter(event=event, id__in=fixed_pids).update(participates_match=True)
 
-        # 公開したら Draft 破棄（A案維持）
-        MatchScheduleDraft.objects.filter(event=event).delete()
 
     return JsonResponse({"ok": True, "published": True, "locked": ms.locked})
 
 
+@require_POST
+def publish_schedule_draft(request):
+    """
+    保持している案（draft_id）をそのまま公開（画面の JSON へのフォールバックは無し）
+    """
+    event_id = request.POST.get("event_id")
+    if not event_id:
+        return JsonResponse({"ok": False, "error": "bad_event_id"}, status=400)
+
+    event = get_object_or_404(Event, id=int(event_id))
+
+    blocked = _guard_admin_only(request, event)
+    if blocked:
+        return blocked
+
+    deny = _optional_admin_token_check(request, event.club)
+    if deny:
+        return deny
+
+    draft_store = get_draft_store()
+    owner = draft_owner(request)
+    draft = draft_store.get(event.id, owner, (request.POST.get("draft_id") or "").strip())
+    if draft is None:
+        return JsonResponse({"ok": False, "error": "no_draft"}, status=404)
+
+    resp = _publish_schedule(
+        event, draft.schedule, draft.content_hash or None, draft.params,
+        force=request.POST.get("force") == "1",
+    )
+    if resp.status_code == 200:
+        draft_store.discard(event.id, owner)
+    return resp
+
+
 # ============================================================
 # Score
 # ============================================================
@@ -1691,16 +2622,19 @@ def save_match_score(request):
         return JsonResponse({"ok": False, "error": "bad_number"}, status=400)
 
     # 空欄は None（クリア）扱い
-    v = None
-    if value_raw is not None:
-        s = str(value_raw).strip()
-        if s != "":
-            try:
-                v = int(s)
-            except ValueError:
-                return JsonResponse({"ok": False, "error": "bad_score"}, status=400)
-            if v < 0 or v > 99:
-                return JsonResponse({"ok": False, "error": "out_of_range"}, status=400)
+    try:
+        v = parse_score_value(value_raw)
+    except ScoreWriteError as e:
+        return JsonResponse(e.payload(), status=e.status)
+
+    # 楽観的排他：クライアントが読んだ revision と、そのとき表示していた値（どちらも任意）
+    prev_raw = request.POST.get("prev")
+    edit = {
+        "round_no": round_no_i, "court_no": court_no_i, "side": side, "value": v,
+        "revision": _parse_int(request.POST.get("revision"), min_v=0),
+        "has_prev": prev_raw is not None,
+        "prev": _parse_int(prev_raw) if prev_raw is not None and str(prev_raw).strip() != "" else None,
+    }
 
     event = get_object_or_404(Event, pk=int(event_id))
 
@@ -1709,30 +2643,126 @@ def save_match_score(request):
     if not match_schedule:
         return JsonResponse({"ok": False, "error": "no_published_schedule"}, status=409)
 
-    with transaction.atomic():
-        # 対戦表行をロック（並行更新対策）
-        match_schedule = MatchSchedule.objects.select_for_update().get(pk=match_schedule.pk)
+    try:
+        result = apply_score_edits(event, match_schedule, [edit])
+    except ScoreWriteError as e:
+        payload = e.payload()
+        if e.code == "conflict":
+            # 1マス保存の互換形：{"revision", "a", "b"} を直下に
+            c = payload.pop("conflicts")[0]
+            payload.update(revision=c["revision"], a=c["a"], b=c["b"])
+        return JsonResponse(payload, status=e.status)
+
+    score_obj = result["scores"][0]
+    return JsonResponse({
+        "ok": True, "side": side, "value": v,
+        "revision": score_obj.revision, "a": score_obj.side_a_score, "b": score_obj.side_b_score,
+    })
 
-        score_obj, _created = MatchScore.objects.select_for_update().get_or_create(
-            match_schedule=match_schedule,
-            round_no=round_no_i,
-            court_no=court_no_i,
-            defaults={"side_a_score": None, "side_b_score": None},
-        )
 
-        if side == "a":
-            score_obj.side_a_score = v
-        else:
-            score_obj.side_b_score = v
+@require_POST
+def save_match_scores(request):
+    """
+    ラウンド（またはイベント全体）のスコアを一括保存
+    - scores: JSON 配列 [{"round_no", "court_no", "side", "value", ("revision", "prev")}, ...]
+    - 公開済み対戦表との照合・locked・版・成績インデックス・通知は1回ずつ
+    - 1件でも不正 / 食い違いがあれば何も書かない（{"error", "index"} / {"conflicts": [...]}）
+    """
+    event_id = (request.POST.get("event_id") or "").strip()
+    if not event_id:
+        return JsonResponse({"ok": False, "error": "missing_event_id"}, status=400)
+    try:
+        raw = json.loads(request.POST.get("scores") or "")
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "bad_scores"}, status=400)
+    if not isinstance(raw, list) or not raw:
+        return JsonResponse({"ok": False, "error": "bad_scores"}, status=400)
+    if len(raw) > MAX_BATCH_SCORES:
+        return JsonResponse({"ok": False, "error": "too_many_scores"}, status=400)
+
+    edits = []
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict) or item.get("side") not in ("a", "b"):
+            return JsonResponse({"ok": False, "error": "bad_request", "index": i}, status=400)
+        round_no = _parse_int(item.get("round_no"), min_v=1)
+        court_no = _parse_int(item.get("court_no"), min_v=1)
+        if round_no is None or court_no is None:
+            return JsonResponse({"ok": False, "error": "bad_number", "index": i}, status=400)
+        try:
+            value = parse_score_value(item.get("value"))
+            prev = parse_score_value(item.get("prev")) if "prev" in item else None
+        except ScoreWriteError as e:
+            return JsonResponse({"ok": False, "error": e.code, "index": i}, status=400)
+        edits.append({
+            "round_no": round_no, "court_no": court_no, "side": item["side"], "value": value,
+            "revision": _parse_int(item.get("revision"), min_v=0),
+            "has_prev": "prev" in item, "prev": prev,
+        })
+
+    event = get_object_or_404(Event, pk=int(event_id))
+    match_schedule = MatchSchedule.objects.filter(event=event, published=True).first()
+    if not match_schedule:
+        return JsonResponse({"ok": False, "error": "no_published_schedule"}, status=409)
+
+    try:
+        result = apply_score_edits(event, match_schedule, edits)
+    except ScoreWriteError as e:
+        return JsonResponse(e.payload(), status=e.status)
+
+    return JsonResponse({
+        "ok": True,
+        "version": result["version"],
+        "scores": [
+            {"round_no": s.round_no, "court_no": s.court_no,
+             "a": s.side_a_score, "b": s.side_b_score, "revision": s.revision}
+            for s in result["scores"]
+        ],
+    })
+
+
+@require_POST
+def sync_match_scores(request):
+    """
+    電波の悪いコートで貯めたスコア操作ログをまとめて同期（冪等）
+    - ops: JSON 配列 [{"op_id", "ts", "round_no", "court_no", "side", "value"}, ...]
+    - 同じ op_id の再送は読み飛ばす。マスごとに ts の後勝ち
+    - 結果として対戦表の全スコアを返す（クライアントはこれで表示を置き換える）
+    """
+    event_id = (request.POST.get("event_id") or "").strip()
+    if not event_id:
+        return JsonResponse({"ok": False, "error": "missing_event_id"}, status=400)
+    try:
+        raw = json.loads(request.POST.get("ops") or "")
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "bad_ops"}, status=400)
+    try:
+        ops = parse_score_ops(raw)
+    except ScoreWriteError as e:
+        return JsonResponse(e.payload(), status=e.status)
 
-        score_obj.save()  # updated_at 更新
+    event = get_object_or_404(Event, pk=int(event_id))
+    match_schedule = MatchSchedule.objects.filter(event=event, published=True).first()
+    if not match_schedule:
+        return JsonResponse({"ok": False, "error": "no_published_schedule"}, status=409)
 
-        # 1件でも入力されたら locked=True（以後 publish の挙動に使える）
-        if (not match_schedule.locked) and (v is not None):
-            match_schedule.locked = True
-            match_schedule.save(update_fields=["locked", "updated_at"])
+    try:
+        result = sync_score_ops(event, match_schedule, ops)
+    except ScoreWriteError as e:
+        return JsonResponse(e.payload(), status=e.status)
 
-    return JsonResponse({"ok": True, "side": side, "value": v})
+    return JsonResponse({
+        "ok": True,
+        "version": result["version"],
+        "applied": result["applied"],
+        "duplicate": result["duplicate"],
+        "stale": result["stale"],
+        "rejected": result["rejected"],
+        "scores": [
+            {"round_no": s.round_no, "court_no": s.court_no,
+             "a": s.side_a_score, "b": s.side_b_score, "revision": s.revision}
+            for s in result["scores"]
+        ],
+    })
 
 
 @require_POST
@@ -1758,6 +2788,7 @@ def club_add_member(request):
         display_name=name,
         is_fixed=False,                  # ★追加しただけでは固定にしない
     )
+    bump_club_version(club.id)
 
     return JsonResponse({"ok": True, "member": {
         "id": m.id,
@@ -1788,6 +2819,7 @@ def club_rename_member(request):
     m.display_name = name
     m.save(update_fields=["display_name", "updated_at"])
     EventParticipant.objects.filter(member=m).update(display_name=m.display_name)
+    bump_club_version(club.id)
     return JsonResponse({"ok": True, "member_id": m.id, "display_name": m.display_name})
 
 @require_POST
@@ -1807,6 +2839,7 @@ def club_toggle_member_fixed(request):
     m = get_object_or_404(Member, id=int(member_id), club=club)
     m.is_fixed = checked
     m.save(update_fields=["is_fixed", "updated_at"])
+    bump_club_version(club.id)
     return JsonResponse({"ok": True, "member_id": m.id, "is_fixed": m.is_fixed})
 
 
@@ -1817,7 +2850,8 @@ def club_toggle_member_fixed(request):
 # - 代打候補：attendance=yes（participates_matchは無視）
 # - 同一ラウンド内に new_ep がいる場合は必ずスワップ（重複防止）
 # - new_ep がラウンド内にいない場合：old_ep を rests に回す
-# - 履歴は残さない
+# - 公開済み schedule_json は書き換えない：ラウンドごとの置換（Substitution 行）を重ねて表示
+#   （元の対戦表はそのまま残るので、代打前後の比較もできる）
 # - スコアが入っていた場合：その試合のスコアは破棄
 # - rests を「全再計算」しない（他コートを壊さない）
 # - 一般画面でも操作可（admin_only ガード無し）
@@ -1863,6 +2897,7 @@ def substitute_slot(request):
         return JsonResponse({"ok": False, "error": "not_attendance_yes"}, status=409)
 
     with transaction.atomic():
+        # 対戦表行のロックは代打同士の直列化だけ（行そのものは書き換えない）
         ms = (
             MatchSchedule.objects
             .select_for_update()
@@ -1872,153 +2907,94 @@ def substitute_slot(request):
         if not ms:
             return JsonResponse({"ok": False, "error": "no_published_schedule"}, status=409)
 
-        sched = ms.schedule_json or []
-        if not isinstance(sched, list):
-            return JsonResponse({"ok": False, "error": "bad_schedule"}, status=500)
-
-        # --- 対象ラウンド
-        target_round = None
-        for r in sched:
-            if not isinstance(r, dict):
-                continue
-            try:
-                rr = int(r.get("round", -1))
-            except Exception:
-                continue
-            if rr == round_no_i:
-                target_round = r
-                break
-        if not target_round:
+        # --- 位置の解決：MatchSlot の位置索引（代打反映後の見え方）を1クエリ
+        slots = load_round_slots(ms, round_no_i)
+        if not slots.by_pos:
             return JsonResponse({"ok": False, "error": "no_round"}, status=404)
 
-        matches = target_round.get("matches") or []
-        if not isinstance(matches, list):
-            return JsonResponse({"ok": False, "error": "bad_matches"}, status=500)
-
-        # court_no は 1-based を前提に「-1 index」アクセス
-        if not (1 <= court_no_i <= len(matches)):
-            return JsonResponse({"ok": False, "error": "no_court"}, status=404)
-
-        m = matches[court_no_i - 1]
-        if not isinstance(m, dict):
-            return JsonResponse({"ok": False, "error": "bad_match"}, status=500)
-
-        team_key = "team1" if team_i == 1 else "team2"
-        if team_key not in m or not isinstance(m.get(team_key), list):
-            return JsonResponse({"ok": False, "error": "bad_team"}, status=500)
+        target = slots.by_pos.get((court_no_i, team_i, slot_index_i))
+        if target is None:
+            return JsonResponse({"ok": False, "error": "bad_slot"}, status=404)
+        old_ep_id = target.event_participant_id
 
-        if not (0 <= slot_index_i < len(m[team_key])):
-            return JsonResponse({"ok": False, "error": "bad_slot"}, status=400)
-
-        # old_ep_id
-        try:
-            old_ep_id = int(m[team_key][slot_index_i])
-        except Exception:
-            return JsonResponse({"ok": False, "error": "bad_old_ep_id"}, status=500)
+        # 画面で見ていた人と違う（他の端末が先に代打した）→ 取り直してもらう
+        expected_old = _parse_int(request.POST.get("old_ep_id"))
+        if expected_old is not None and expected_old != old_ep_id:
+            return JsonResponse({"ok": False, "error": "slot_changed"}, status=409)
 
         # 同一人物なら何もしない（スコア破棄もしない）
         if old_ep_id == new_ep_id_i:
-            score_map = _build_score_map(ms)
-            schedule_for_view = _merge_scores_into_schedule(ms.schedule_json, score_map)
-            ctx = {
-                "event": event,
-                "schedule": schedule_for_view,
-                "schedule_json": None,
-                "ep_name_map": _build_ep_name_map(event),
-                "show_controls": True,
-                "pill_game_type": ms.game_type or GameType.DOUBLES,
-                "pill_num_courts": int(ms.court_count or 1),
-                "pill_num_rounds": int(ms.round_count or 8),
-                "pill_match_count": int(
-                    EventParticipant.objects.filter(event=event, participates_match=True).count()
-                ),
-                "publish_state": "published",
-            }
-            schedule_html = render_to_string("tennis/_schedule_block.html", ctx, request=request)
-            return JsonResponse({"ok": True, "schedule_html": schedule_html})
-
-        # --- new_ep が同一ラウンド内のどこにいるか（重複防止）
-        # found_pos: ("match", match_index, "team1|team2", slot_index) or ("rest", rest_index)
-        found_pos = None
-
-        # matches 内
-        for mi, mm in enumerate(matches):
-            if not isinstance(mm, dict):
-                continue
-            for tk in ("team1", "team2"):
-                lst = mm.get(tk) or []
-                if not isinstance(lst, list):
-                    continue
-                for si, pid in enumerate(lst):
-                    try:
-                        if int(pid) == new_ep_id_i:
-                            found_pos = ("match", mi, tk, si)
-                            break
-                    except Exception:
-                        continue
-                if found_pos:
-                    break
-            if found_pos:
-                break
-
-        # rests 内
-        rests = target_round.get("rests") or []
-        if not isinstance(rests, list):
-            rests = []
-
-        if not found_pos:
-            for ri, pid in enumerate(rests):
-                try:
-                    if int(pid) == new_ep_id_i:
-                        found_pos = ("rest", ri)
-                        break
-                except Exception:
-                    continue
-
-        # --- 代打反映
-        if found_pos:
-            # 1) new_ep が同一ラウンド内に既にいる → 必ずスワップ
-            if found_pos[0] == "match":
-                _t, mi, tk, si = found_pos
-                if isinstance(matches[mi], dict) and isinstance(matches[mi].get(tk), list) and 0 <= si < len(matches[mi][tk]):
-                    matches[mi][tk][si] = old_ep_id
-                else:
-                    return JsonResponse({"ok": False, "error": "bad_found_pos"}, status=500)
-            else:
-                _t, ri = found_pos
-                if 0 <= ri < len(rests):
-                    rests[ri] = old_ep_id
-                else:
-                    return JsonResponse({"ok": False, "error": "bad_found_pos"}, status=500)
-
-            m[team_key][slot_index_i] = new_ep_id_i
-
-            # rests の中に new_ep が残っていたら除去（念のため）
-            rests = [x for x in rests if str(x) != str(new_ep_id_i)]
-
-        else:
-            # 2) new_ep がラウンド内に居ない → 置換 + old を rests へ
-            m[team_key][slot_index_i] = new_ep_id_i
-
-            # old_ep を rests へ（重複防止）
-            existing_rest_ints = []
-            for x in rests:
-                try:
-                    existing_rest_ints.append(int(x))
-                except Exception:
-                    continue
-            if old_ep_id not in existing_rest_ints:
+            return JsonResponse({"ok": True, "round_no": round_no_i, "matches": [], "rests_html": None})
+
+        # --- new_ep が同一ラウンドのどこにいるか（スワップ先の試合のスコアは残す）
+        found = slots.by_ep.get(new_ep_id_i)
+        swap_court = found.court_no if found and found.court_no not in (0, court_no_i) else None
+        affected_courts = [court_no_i] + ([swap_court] if swap_court else [])
+
+        def as_schedule(teams):
+            return [{
+                "round": round_no_i,
+                "matches": [{"court": c, "team1": t1, "team2": t2} for c, (t1, t2) in teams.items()],
+            }]
+
+        teams_before = {c: slots.teams(c) for c in affected_courts}
+        target.event_participant_id = new_ep_id_i
+        if found:
+            found.event_participant_id = old_ep_id
+        teams_after = {c: slots.teams(c) for c in affected_courts}
+
+        # ✅ 成績インデックス：差し替え前の組み合わせで差し引く
+        # - 対象試合：スコアは破棄されるので差し引くだけ
+        # - スワップ先の試合：スコアは残るので、差し替え後に組み合わせを変えて足し戻す
+        # ロック順は MatchSchedule → MatchScore → 集計 → Event（スコア保存と同じ）
+        affected_scores = list(
+            MatchScore.objects
+            .select_for_update()
+            .filter(match_schedule=ms, round_no=round_no_i, court_no__in=affected_courts)
+        )
+        discard_matchup_scores(ms, affected_scores, club_id=event.club_id, schedule=as_schedule(teams_before))
+
+        # --- 代打反映：置換に互換（old ⇔ new）を合成 → 変わった行だけ upsert
+        perm = load_round_overlay(ms, round_no_i)
+        new_perm = compose_swap(perm, old_ep_id, new_ep_id_i)
+        save_round_overlay(ms, round_no_i, perm, new_perm)
+
+        # 位置索引：試合どうしの入れ替え / 外からの代打は該当行だけ書き換え。
+        # 休憩にいた人との入れ替えは休憩の並びが変わりうるので、そのラウンドだけ作り直す
+        rests = None
+        if found is None or found.court_no != 0:
+            if found is None:
+                rests = slots.rests()
+                target_rest = MatchSlot(
+                    match_schedule=ms, round_no=round_no_i, court_no=0, team=0,
+                    slot_index=len(rests), event_participant_id=old_ep_id,
+                )
                 rests.append(old_ep_id)
+                MatchSlot.objects.bulk_create([target_rest])
+            MatchSlot.objects.bulk_update([s for s in (target, found) if s is not None], ["event_participant"])
+        else:
+            base_round = next(
+                (r for r in ms.schedule if isinstance(r, dict) and int(r.get("round") or 0) == round_no_i),
+                {"round": round_no_i},
+            )
+            effective_round = apply_overlay([base_round], {round_no_i: new_perm})[0]
+            sync_match_slots(ms, round_nos=[round_no_i], schedule=[effective_round])
+            rests = list(effective_round.get("rests") or [])
+
+        apply_matchup_deltas(
+            ms,
+            [
+                (sc.round_no, sc.court_no, None, (sc.side_a_score, sc.side_b_score))
+                for sc in affected_scores
+                if sc.court_no != court_no_i
+            ],
+            club_id=event.club_id,
+            schedule=as_schedule(teams_after),
+        )
 
-            # new_ep が rests にいた場合は除去（念のため）
-            rests = [x for x in rests if str(x) != str(new_ep_id_i)]
-
-        # 反映
-        target_round["matches"] = matches
-        target_round["rests"] = rests
-
-        ms.schedule_json = sched
-        ms.save(update_fields=["schedule_json", "updated_at"])
+        version = bump_event_version(event.id, scores=True)
+        ms.change_version = version
+        MatchSchedule.objects.filter(pk=ms.pk).update(change_version=version, updated_at=timezone.now())
 
         # ✅ 該当1試合のスコアは破棄（仕様確定）
         MatchScore.objects.filter(
@@ -2026,32 +3002,39 @@ def substitute_slot(request):
             round_no=round_no_i,
             court_no=court_no_i,
         ).delete()
+        publish_event_change(event.id, "substitute", ms.change_version, round_no=round_no_i)
 
     # =========================
-    # 返却HTML：公開済み対戦表を再描画
+    # 返却HTML：変わった試合（最大2つ）と休憩行だけ描画
     # =========================
-    ms2 = MatchSchedule.objects.filter(event=event, published=True).first()
-    if not ms2:
-        return JsonResponse({"ok": False, "error": "no_published_schedule"}, status=409)
-
-    score_map = _build_score_map(ms2)
-    schedule_for_view = _merge_scores_into_schedule(ms2.schedule_json, score_map)
-
-    ctx = {
-        "event": event,
-        "schedule": schedule_for_view,
-        "schedule_json": None,
-        "ep_name_map": _build_ep_name_map(event),
-        "show_controls": True,
-        "pill_game_type": ms2.game_type or GameType.DOUBLES,
-        "pill_num_courts": int(ms2.court_count or 1),
-        "pill_num_rounds": int(ms2.round_count or 8),
-        "pill_match_count": int(
-            EventParticipant.objects.filter(event=event, participates_match=True).count()
-        ),
-        "publish_state": "published",
-    }
+    kept = {sc.court_no: sc for sc in affected_scores if sc.court_no != court_no_i}
+    ep_ids = {p for t1, t2 in teams_after.values() for p in (*t1, *t2)} | set(rests or [])
+    name_map = build_name_map(
+        EventParticipant.objects.filter(id__in=ep_ids).select_related("member")
+    )
 
-    schedule_html = render_to_string("tennis/_schedule_block.html", ctx, request=request)
-    return JsonResponse({"ok": True, "schedule_html": schedule_html})
+    cells = PlayerCells(name_map)
+    matches = []
+    for c, (t1, t2) in teams_after.items():
+        sc = kept.get(c)
+        m = build_match_view(
+            cells, c, t1, t2,
+            (sc.side_a_score, sc.side_b_score) if sc else (None, None),
+            sc.revision if sc else 0,
+        )
+        matches.append({
+            "court_no": c,
+            "html": render_to_string(
+                "tennis/_schedule_match.html", {"m": m, "r_no": str(round_no_i)}, request=request,
+            ),
+        })
+
+    rests_html = None
+    if rests is not None:
+        rests_html = render_to_string(
+            "tennis/_schedule_rests.html",
+            {"round": build_round_view(round_no_i, [], cells.team(rests)), "r_no": str(round_no_i)},
+            request=request,
+        )
 
+    return JsonResponse({"ok": True, "round_no": round_no_i, "matches": matches, "rests_html": rests_html})
@@ -155,6 +155,15 @@ DATABASES = {
     )
 }
 
+# SQLite（ローカル / テスト）
+# - BEGIN IMMEDIATE：読んでから書くトランザクション同士が SHARED→RESERVED の昇格で
+#   即 "database is locked" にならず、busy timeout で順番待ちする
+# - テスト DB はファイルにする（インメモリ共有キャッシュはテーブルロックが即エラーになり、
+#   並行書き込みのテストが busy timeout で待てない）
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    DATABASES["default"].setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+    DATABASES["default"]["TEST"] = {"NAME": str(BASE_DIR / "test_db.sqlite3")}
+
 
 # ============================================================
 # Password validation
@@ -193,6 +202,30 @@ STORAGES = {
 # どうしても manifest 不整合を一時回避したい場合だけ True にする（基本は触らない）
 # WHITENOISE_MANIFEST_STRICT = env_bool("WHITENOISE_MANIFEST_STRICT", default=True)
 
+# ETag（304）用の塩：デプロイごとに変われば、テンプレート/静的ファイル更新後に古いページを返さない
+PAGE_ETAG_SALT = env_str("PAGE_ETAG_SALT", env_str("RAILWAY_DEPLOYMENT_ID", ""))
+
+# SSE（イベント画面のライブ更新）の pub/sub：
+# ★InProcessBroker はプロセス内だけで配る。ワーカー（プロセス）が複数だと、別ワーカーで保存した
+#   変更は SSE に届かない（ポーリングまで遅れる）→ 複数ワーカーなら EventVersionBroker（DB の version を監視）
+TENNIS_PUBSUB_BACKEND = env_str("TENNIS_PUBSUB_BACKEND", "tennis.pubsub.InProcessBroker")
+
+# キャッシュ：REDIS_URL があれば共有キャッシュ（redis パッケージが要る）
+# 無ければ Django 既定の locmem（プロセス内のみ・再起動で消える）
+REDIS_URL = env_str("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+
+# 生成中の対戦表ドラフト：既定はキャッシュ（公開まで DB に書かない・案を複数保持）
+# ★ワーカー複数 / 再起動をまたいで案を残したいなら REDIS_URL で共有キャッシュに
+#   （locmem のままだとプロセス内だけ）。DbDraftStore（イベントにつき最新1案を DB に保存）は明示指定のときだけ
+TENNIS_DRAFT_STORE_BACKEND = env_str("TENNIS_DRAFT_STORE_BACKEND", "tennis.drafts.CacheDraftStore")
+
 
 # ============================================================
 # Default primary key field type